@@ -0,0 +1,38 @@
+"""hot path indexes
+
+Revision ID: 3b9d2f6a1c47
+Revises: 766eff3e84c3
+Create Date: 2024-11-04 10:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d2f6a1c47'
+down_revision: Union[str, None] = '766eff3e84c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Connexion et vérification du token (users.name), inscription (users.email) :
+    # index uniques, la création échoue si la table contient déjà des doublons
+    op.create_index('ix_users_name', 'users', ['name'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    # Emprunt et retour par titre
+    op.create_index('ix_books_title', 'books', ['title'])
+    # Emprunts en cours d'un utilisateur, emprunt en cours d'un livre
+    op.create_index('ix_emprunts_user_returned', 'emprunts', ['user_id', 'returned'])
+    op.create_index('ix_emprunts_book_returned', 'emprunts', ['book_id', 'returned'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_emprunts_book_returned', table_name='emprunts')
+    op.drop_index('ix_emprunts_user_returned', table_name='emprunts')
+    op.drop_index('ix_books_title', table_name='books')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_name', table_name='users')
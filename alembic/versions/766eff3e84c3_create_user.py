@@ -17,10 +17,57 @@ down_revision: Union[str, None] = None
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+SEQUENCES = ('users_seq', 'books_seq', 'emprunts_seq')
+
 
 def upgrade() -> None:
-    pass
+    # Les bases créées par les anciennes révisions autogénérées ont déjà les tables : on ne crée que ce qui manque
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if bind.dialect.supports_sequences:
+        existing = set(inspector.get_sequence_names())
+        for name in SEQUENCES:
+            if name not in existing:
+                op.execute(sa.schema.CreateSequence(sa.Sequence(name)))
+
+    if not inspector.has_table('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), sa.Sequence('users_seq'), primary_key=True),
+            sa.Column('name', sa.String(50), nullable=False),
+            sa.Column('email', sa.String(50), nullable=False),
+            sa.Column('phone', sa.String(50), nullable=True),
+            sa.Column('password', sa.String(255), nullable=False),
+        )
+
+    if not inspector.has_table('books'):
+        op.create_table(
+            'books',
+            sa.Column('id', sa.Integer(), sa.Sequence('books_seq'), primary_key=True),
+            sa.Column('title', sa.String(50)),
+            sa.Column('author', sa.String(50)),
+            sa.Column('kind', sa.String(50)),
+            sa.Column('publication_date', sa.Date()),
+            sa.Column('availability', sa.Numeric(1)),
+        )
+
+    if not inspector.has_table('emprunts'):
+        op.create_table(
+            'emprunts',
+            sa.Column('id', sa.Integer(), sa.Sequence('emprunts_seq'), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('book_id', sa.Integer(), sa.ForeignKey('books.id'), nullable=False),
+            sa.Column('borrow_date', sa.Date()),
+            sa.Column('return_date', sa.Date(), nullable=False),
+            sa.Column('returned', sa.Numeric(1)),
+        )
 
 
 def downgrade() -> None:
-    pass
+    op.drop_table('emprunts')
+    op.drop_table('books')
+    op.drop_table('users')
+    if op.get_bind().dialect.supports_sequences:
+        for name in SEQUENCES:
+            op.execute(sa.schema.DropSequence(sa.Sequence(name)))
@@ -0,0 +1,33 @@
+"""emprunt status
+
+Revision ID: 9e4c7a2d5b18
+Revises: 3b9d2f6a1c47
+Create Date: 2024-11-18 09:41:27.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4c7a2d5b18'
+down_revision: Union[str, None] = '3b9d2f6a1c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # État de l'emprunt : active, overdue (scanner des retards) ou returned
+    with op.batch_alter_table('emprunts') as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(10), nullable=False, server_default='active'))
+    op.execute("UPDATE emprunts SET status = 'returned' WHERE returned = 1")
+    # Recherche des emprunts en retard : status = 'active' AND return_date < aujourd'hui
+    op.create_index('ix_emprunts_status_return_date', 'emprunts', ['status', 'return_date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_emprunts_status_return_date', table_name='emprunts')
+    with op.batch_alter_table('emprunts') as batch_op:
+        batch_op.drop_column('status')
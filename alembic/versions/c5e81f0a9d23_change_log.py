@@ -0,0 +1,39 @@
+"""change log
+
+Revision ID: c5e81f0a9d23
+Revises: 9e4c7a2d5b18
+Create Date: 2024-12-02 10:15:42.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e81f0a9d23'
+down_revision: Union[str, None] = '9e4c7a2d5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Journal des modifications lu par chaque worker pour invalider ses caches et index (mode multi-workers)
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(sa.Sequence('change_log_seq')))
+    op.create_table(
+        'change_log',
+        sa.Column('seq', sa.Integer(), sa.Sequence('change_log_seq'), primary_key=True),
+        sa.Column('entity', sa.String(10), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_change_log_created_at', 'change_log', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_change_log_created_at', table_name='change_log')
+    op.drop_table('change_log')
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(sa.Sequence('change_log_seq')))
@@ -0,0 +1,32 @@
+"""leases
+
+Revision ID: e7a94b3c2f10
+Revises: c5e81f0a9d23
+Create Date: 2024-12-09 09:41:27.503611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a94b3c2f10'
+down_revision: Union[str, None] = 'c5e81f0a9d23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Baux des tâches de fond exécutées par un seul processus (scanner des retards en mode multi-workers)
+    op.create_table(
+        'leases',
+        sa.Column('name', sa.String(50), primary_key=True),
+        sa.Column('holder', sa.String(100), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leases')
@@ -0,0 +1,97 @@
+'''
+API JSON versionnée (/api/v1) : catalogue, recherche et emprunts de l'utilisateur connecté.
+
+Les réponses ont la forme des schémas pydantic (BookPage, EmpruntCreated) mais sont construites
+directement depuis les lignes lues en base et sérialisées par orjson (ORJSONResponse) :
+pas de model_validate par ligne ni de validation du modèle de réponse par FastAPI.
+?fields=title,author limite les colonnes lues en base et les clés retournées.
+'''
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+import schema, crud, crud_async, profiling
+from auth import get_current_user
+
+router = APIRouter(prefix="/api/v1", tags=["api"], default_response_class=ORJSONResponse)
+
+def _json(content) -> ORJSONResponse:
+    # Sérialisation orjson comptée dans le profil de la requête
+    with profiling.section("serialization"):
+        return ORJSONResponse(content)
+
+def _fields(fields: Optional[str], allowed) -> tuple:
+    try:
+        return crud.parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/books", responses={200: {"model": schema.BookPage}})
+async def api_books(
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        sort: str = "id",
+        limit: Optional[int] = None,
+        fields: Optional[str] = None
+):
+    '''
+    Page du catalogue
+    :param after: curseur de la page suivante
+    :param before: curseur de la page précédente
+    :param sort: colonne de tri (id, title, author, publication_date)
+    :param limit: nombre de livres par page
+    :param fields: champs des livres, séparés par des virgules (tous par défaut)
+    :return: page de livres (forme de schema.BookPage)
+    '''
+    book_fields = _fields(fields, crud.BOOK_FIELDS)
+    try:
+        page = await crud_async.book_records_page(book_fields, after=after, before=before, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _json(page)
+
+@router.get("/books/search", responses={200: {"model": schema.BookPage}})
+async def api_search_books(
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        kind: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None,
+        facet_kind: Optional[str] = None,
+        facet_author: Optional[str] = None,
+        available: Optional[bool] = None
+):
+    '''
+    Recherche de livres par titre, auteur ou genre (mêmes critères que /search_books)
+    :param sort: tri des résultats (pertinence par défaut avec l'index de recherche)
+    :param fields: champs des livres, séparés par des virgules (tous par défaut)
+    :param facet_kind: genre exact (valeur de facette)
+    :param facet_author: auteur exact (valeur de facette)
+    :param available: livres disponibles ou non
+    :return: page de livres (forme de schema.BookPage), avec "facets" : {facette: [{"value", "count"}]}
+    '''
+    book_fields = _fields(fields, crud.BOOK_FIELDS)
+    try:
+        page = await crud_async.search_book_records_page(book_fields, title=title, author=author, kind=kind,
+                                                         after=after, before=before, sort=sort, limit=limit,
+                                                         facet_kind=facet_kind, facet_author=facet_author,
+                                                         available=available)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _json(page)
+
+@router.get("/users/me/loans")
+async def api_my_loans(
+        fields: Optional[str] = None,
+        current_user: schema.UserCreated = Depends(get_current_user),
+        db=Depends(crud_async.get_async_db)
+):
+    '''
+    Emprunts de l'utilisateur connecté (cookie access_token)
+    :param fields: champs des emprunts (id, borrow_date, return_date, returned, status, user, book)
+    :return: {"current": [...], "history": [...]}, emprunts de la forme de schema.EmpruntCreated
+    '''
+    loan_fields = _fields(fields, crud.LOAN_FIELDS)
+    return _json(await crud_async.loan_records(current_user, loan_fields, db))
@@ -0,0 +1,75 @@
+import schema, crud, crud_async, config
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Cookie, Depends
+from jose import JWTError, jwt
+from cache import TTLCache
+
+# Algorithme de signature des tokens (clé : config.SECRET_KEY)
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Tokens déjà décodés et vérifiés (token -> claims), jusqu'à leur expiration au plus tard
+token_cache = TTLCache(config.AUTH_CACHE_SIZE, config.AUTH_CACHE_TTL_SECONDS)
+
+# Création du token JWT
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, config.SECRET_KEY, algorithm=ALGORITHM)
+
+def token_claims(user) -> dict:
+    '''
+    Claims à placer dans le token d'un utilisateur
+    :param user: models.User ou schema UserCreated
+    :return: {"sub": nom} et, si JWT_USER_CLAIMS, l'id, l'email et le téléphone
+    '''
+    claims = {"sub": user.name}
+    if config.JWT_USER_CLAIMS:
+        claims.update({"uid": user.id, "email": user.email, "phone": user.phone})
+    return claims
+
+def decode_token(access_token: str) -> dict:
+    '''
+    Décode et vérifie un token (signature, expiration), avec cache
+    :return: claims du token
+    '''
+    claims = token_cache.get(access_token)
+    if claims is None:
+        try:
+            claims = jwt.decode(access_token, config.SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError as e:
+            raise HTTPException(status_code=401, detail=f"Token decoding error: {str(e)}")
+        token_cache.set(access_token, claims, expires_at=claims.get("exp"))
+    return claims
+
+# Obtenir l'utilisateur actuel
+async def get_current_user(access_token: str = Cookie(None), db=Depends(crud_async.get_async_db)) -> schema.UserCreated:
+    '''
+    Utilisateur authentifié par le cookie access_token.
+    La base n'est interrogée qu'en cas d'absence dans le cache des utilisateurs,
+    et jamais si le token porte déjà les claims de l'utilisateur ;
+    la requête éventuelle utilise la session de la requête (get_async_db).
+    '''
+    if access_token is None:
+        raise HTTPException(status_code=401, detail="Token is missing")
+    claims = decode_token(access_token)
+    username: str = claims.get("sub")
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid token: missing username")
+
+    if "uid" in claims:
+        return schema.UserCreated(id=claims["uid"], name=username, email=claims["email"], phone=claims.get("phone"))
+
+    user = crud.user_cache.get(username)
+    if user is None:
+        user_in_db = await crud_async.connexion(username, db)
+        if user_in_db is None:
+            raise HTTPException(status_code=401, detail="Invalid token: user not found")
+        user = schema.UserCreated.model_validate(user_in_db, from_attributes=True)
+        crud.user_cache.set(username, user, expires_at=claims.get("exp"))
+    return user
+
+def stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": crud.user_cache.stats()}
@@ -0,0 +1,164 @@
+'''
+Complétion par préfixe des titres et des auteurs, pour la barre de recherche (un appel par frappe).
+
+Chaque champ est un tableau trié de (clé normalisée, valeur affichée) : une recherche est un bisect
+suivi de la lecture des entrées qui commencent par le préfixe, sans requête en base.
+Une valeur est indexée sous sa forme normalisée complète et à partir de chacun de ses premiers mots
+("le petit prince" est trouvé par "pe" et par "pr"). Le nombre d'entrées est borné (max_entries).
+L'index est construit depuis la table books puis tenu à jour par crud._catalog_changed.
+'''
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from search import normalize
+
+# Champs complétés
+FIELDS = ("title", "author")
+
+def prefix_keys(value: str, max_words: int) -> List[str]:
+    '''
+    Clés d'indexation d'une valeur normalisée : la valeur entière puis la suite à partir des mots suivants
+    :param value: valeur normalisée ("le petit prince")
+    :param max_words: nombre maximal de clés par valeur
+    :return: liste de clés (["le petit prince", "petit prince", "prince"])
+    '''
+    words = value.split(" ")
+    return [" ".join(words[i:]) for i in range(min(len(words), max_words))]
+
+class PrefixIndex:
+    '''
+    Tableaux triés de clés normalisées par champ, avec le nombre de livres portant chaque valeur
+    '''
+
+    def __init__(self, max_entries: int, max_words: int = 3):
+        self.max_entries = max_entries
+        self.max_words = max_words
+        self._lock = threading.RLock()
+        self.ready = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._entries: Dict[str, List[Tuple[str, str]]] = {field: [] for field in FIELDS}
+        # (champ, valeur affichée) -> nombre de livres
+        self._counts: Dict[Tuple[str, str], int] = {}
+        # id du livre -> (titre, auteur) indexés
+        self._books: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def build(self, loader: Callable[[], Iterable]) -> None:
+        '''
+        Construit l'index (une seule fois) à partir des lignes (id, title, author)
+        '''
+        with self._lock:
+            if self.ready:
+                return
+            self._reset()
+            # Clés regroupées par position du mot : si la borne est atteinte, les valeurs entières
+            # de tous les champs passent avant les clés commençant à un mot suivant
+            layers: Dict[int, list] = {}
+            for book_id, title, author in loader():
+                self._books[book_id] = (title, author)
+                for field, value in zip(FIELDS, (title, author)):
+                    if value and self._count(field, value, 1) == 1:
+                        for position, key in enumerate(self._keys(value)):
+                            layers.setdefault(position, []).append((field, key, value))
+            for position in sorted(layers):
+                entries = layers.pop(position)
+                kept = entries[:max(0, self.max_entries - self.size)]
+                self.dropped += len(entries) - len(kept)
+                self.size += len(kept)
+                for field, key, value in kept:
+                    self._entries[field].append((key, value))
+            # Un tri par champ plutôt qu'une insertion par valeur
+            for entries in self._entries.values():
+                entries.sort()
+            self.ready = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self.ready = False
+
+    def add(self, book_id: int, title: Optional[str], author: Optional[str]) -> None:
+        '''
+        Ajoute ou remplace un livre (sans effet tant que l'index n'est pas construit)
+        '''
+        with self._lock:
+            if not self.ready:
+                return
+            self._remove(book_id)
+            self._books[book_id] = (title, author)
+            for field, value in zip(FIELDS, (title, author)):
+                if value and self._count(field, value, 1) == 1:
+                    for key in self._keys(value):
+                        if self.size >= self.max_entries:
+                            self.dropped += 1
+                            continue
+                        insort(self._entries[field], (key, value))
+                        self.size += 1
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            if self.ready:
+                self._remove(book_id)
+
+    def _keys(self, value: str) -> List[str]:
+        return prefix_keys(normalize(value), self.max_words)
+
+    def _count(self, field: str, value: str, delta: int) -> int:
+        count = self._counts.get((field, value), 0) + delta
+        if count > 0:
+            self._counts[(field, value)] = count
+        else:
+            self._counts.pop((field, value), None)
+        return count
+
+    def _remove(self, book_id: int) -> None:
+        values = self._books.pop(book_id, None)
+        if values is None:
+            return
+        for field, value in zip(FIELDS, values):
+            # Les clés d'une valeur disparaissent avec le dernier livre qui la porte
+            if not value or self._count(field, value, -1) > 0:
+                continue
+            entries = self._entries[field]
+            for key in self._keys(value):
+                i = bisect_left(entries, (key, value))
+                if i < len(entries) and entries[i] == (key, value):
+                    del entries[i]
+                    self.size -= 1
+
+    def complete(self, prefix: str, field: Optional[str] = None, limit: int = 10) -> List[dict]:
+        '''
+        Valeurs commençant par le préfixe (ou dont un mot commence par le préfixe), par ordre alphabétique
+        :param prefix: texte saisi
+        :param field: "title", "author" ou None pour les deux
+        :param limit: nombre maximal de valeurs par champ
+        :return: liste de {"field", "value", "count"}
+        '''
+        term = normalize(prefix)
+        if not term:
+            return []
+        results = []
+        with self._lock:
+            for name in (field,) if field else FIELDS:
+                entries = self._entries[name]
+                seen = set()
+                i = bisect_left(entries, (term,))
+                while i < len(entries) and len(seen) < limit:
+                    key, value = entries[i]
+                    if not key.startswith(term):
+                        break
+                    if value not in seen:
+                        seen.add(value)
+                        results.append({"field": name, "value": value, "count": self._counts.get((name, value), 0)})
+                    i += 1
+        return results
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "entries": self.size, "max_entries": self.max_entries,
+                "dropped": self.dropped, "values": len(self._counts)}
@@ -0,0 +1 @@
+# Benchmarks de l'application (à lancer depuis la racine du projet : python -m benchmarks.<module>)
@@ -0,0 +1,73 @@
+'''
+Suite de benchmarks : génération du jeu de données, scénarios de charge ASGI, microbenchmarks de crud,
+résultats JSON et comparaison avec une référence (code de sortie 1 en cas de régression).
+
+Usage :
+    python -m benchmarks dataset --database bench.db --books 1000000 --users 100000 --loans 5000000
+    python -m benchmarks load --database bench.db --requests 2000 --concurrency 50 --json load.json
+    python -m benchmarks micro --database bench.db --iterations 500 --json micro.json
+    python -m benchmarks all --database bench.db --json results.json --baseline baseline.json
+    python -m benchmarks compare results.json baseline.json
+'''
+import argparse, asyncio, sys
+from benchmarks import dataset, report
+
+def _common(parser) -> None:
+    parser.add_argument("--database", default="bench.db", help="base générée par la commande dataset")
+    parser.add_argument("--json", help="fichier où enregistrer les résultats")
+    parser.add_argument("--baseline", help="résultats de référence (JSON) : échec si régression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="écart toléré avec la référence (0.15 = 15 %%)")
+
+def parse_args(argv=None):
+    from benchmarks import scenarios, micro
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de l'application")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("dataset", help="génère la base SQLite de benchmark")
+    dataset.add_arguments(generate)
+
+    load = commands.add_parser("load", help="scénarios de charge sur main.app")
+    _common(load)
+    scenarios.add_arguments(load)
+
+    bench = commands.add_parser("micro", help="microbenchmarks des fonctions crud")
+    _common(bench)
+    micro.add_arguments(bench)
+
+    everything = commands.add_parser("all", help="scénarios de charge puis microbenchmarks")
+    _common(everything)
+    scenarios.add_arguments(everything)
+    everything.add_argument("--iterations", type=int, default=500)
+    everything.add_argument("--functions")
+    everything.add_argument("--cache", action="store_true")
+
+    compare = commands.add_parser("compare", help="compare deux fichiers de résultats")
+    compare.add_argument("results")
+    compare.add_argument("baseline")
+    compare.add_argument("--tolerance", type=float, default=0.15)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "dataset":
+        dataset.generate(args)
+        return 0
+    if args.command == "compare":
+        return 1 if report.check(report.load(args.results), args.baseline, args.tolerance) else 0
+
+    # L'application lit sa configuration à l'import : la base est choisie avant
+    data = dataset.configure(args.database)
+    from benchmarks import scenarios, micro
+    results = {}
+    if args.command in ("load", "all"):
+        results.update(asyncio.run(scenarios.run(args, data)))
+    if args.command in ("micro", "all"):
+        results.update(micro.run(args, data))
+    report.print_table(results)
+    if args.json:
+        report.save(args.json, results, command=args.command,
+                    dataset={key: data[key] for key in ("books", "users", "loans", "active", "seed", "bcrypt_rounds")})
+    return 1 if report.check(results, args.baseline, args.tolerance) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+'''
+Compare la sérialisation d'une liste de livres par l'API JSON (colonnes projetées, dictionnaires, orjson)
+au chemin des schémas pydantic (objets ORM, model_validate(from_attributes=True) par ligne, json),
+sur une base SQLite temporaire.
+
+Usage : python -m benchmarks.api_serialization --books 20000 --repeat 5
+'''
+import argparse, json, os, statistics, tempfile, time
+from datetime import date
+
+def seed(books: int) -> None:
+    import crud, models
+    models.Base.metadata.create_all(crud.engine)
+    with crud.Session() as session:
+        session.add_all(models.Book(title=f"Livre {i}", author=f"Auteur {i % 300}", kind="roman",
+                                    publication_date=date(1900 + i % 120, 1, 1), availability=i % 2)
+                        for i in range(books))
+        session.commit()
+
+def pydantic_path() -> bytes:
+    # Chemin actuel : objets ORM, un model_validate par ligne, puis sérialisation du modèle de réponse
+    from typing import List
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    import crud, models, schema
+    with crud.Session() as session:
+        books = [schema.BookCreated.model_validate(book, from_attributes=True) for book in session.scalars(select(models.Book))]
+    return json.dumps(TypeAdapter(List[schema.BookCreated]).dump_python(books, mode="json")).encode()
+
+def records_path(fields: tuple) -> bytes:
+    # API JSON : colonnes demandées seulement, dictionnaires, orjson
+    import orjson
+    from sqlalchemy import select
+    import crud
+    with crud.Session() as session:
+        rows = session.execute(select(*crud._book_projection(fields, "id"))).all()
+    return orjson.dumps([crud._book_record(row, fields) for row in rows])
+
+def measure(call, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(body)
+
+def main(args) -> None:
+    import crud
+    seed(args.books)
+    scenarios = {
+        "pydantic model_validate + json": pydantic_path,
+        "records + orjson": lambda: records_path(tuple(crud.BOOK_FIELDS)),
+        "records fields=id,title": lambda: records_path(("id", "title")),
+    }
+    baseline = None
+    for name, call in scenarios.items():
+        seconds, size = measure(call, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:32} {seconds * 1000:8.1f} ms  {size / 1024:8.0f} Ko  x{baseline / seconds:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sérialisation des listes de livres : pydantic contre API JSON")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'api.db')}"
+    os.environ.pop("SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    main(args)
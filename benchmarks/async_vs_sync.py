@@ -0,0 +1,68 @@
+'''
+Compare la couche crud synchrone (exécutée dans le threadpool, comme les routes "def")
+et la couche crud_async sous la même concurrence.
+
+Usage : python -m benchmarks.async_vs_sync --requests 2000 --concurrency 100 --username alice
+'''
+import argparse, asyncio, json, time
+import anyio
+import crud, crud_async
+from benchmarks.report import percentile
+
+async def run(call, requests: int, concurrency: int) -> dict:
+    '''
+    Lance `requests` appels avec au plus `concurrency` appels simultanés
+    :return: débit et latences (ms)
+    '''
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def scenarios(username: str) -> dict:
+    # Chaque scénario : (appel synchrone via le threadpool, appel asyncio)
+    return {
+        "books_page": (lambda: anyio.to_thread.run_sync(crud.books_page), crud_async.books_page),
+        "search_book_page": (lambda: anyio.to_thread.run_sync(lambda: crud.search_book_page(title="a")),
+                             lambda: crud_async.search_book_page(title="a")),
+        "connexion": (lambda: anyio.to_thread.run_sync(crud.connexion, username),
+                      lambda: crud_async.connexion(username)),
+    }
+
+async def main(args) -> dict:
+    results = {}
+    for name, (sync_call, async_call) in scenarios(args.username).items():
+        results[name] = {
+            "sync": await run(sync_call, args.requests, args.concurrency),
+            "async": await run(async_call, args.requests, args.concurrency),
+        }
+        print(f"{name:18} sync  {results[name]['sync']}")
+        print(f"{name:18} async {results[name]['async']}")
+    await crud_async.dispose_engine()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark crud synchrone vs crud_async")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--username", default="alice")
+    parser.add_argument("--json", help="fichier où enregistrer les résultats")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,99 @@
+'''
+Emprunts concurrents sur une base SQLite de test : vérifie qu'aucun livre n'est prêté deux fois
+et qu'aucun utilisateur ne dépasse MAX_ACTIVE_LOANS, et mesure le débit (crud synchrone et crud_async).
+
+Usage : python -m benchmarks.borrow_concurrency --books 200 --users 20 --attempts 2000 --concurrency 100
+'''
+import argparse, asyncio, json, os, random, tempfile, time
+from collections import Counter
+from datetime import date, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Emprunts concurrents (pas de double prêt, limite par utilisateur)")
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--attempts", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--database", help="fichier SQLite (créé dans un répertoire temporaire par défaut)")
+    parser.add_argument("--json", help="fichier où enregistrer les résultats")
+    return parser.parse_args()
+
+def seed(books: int, users: int) -> None:
+    import crud, models
+    models.Base.metadata.drop_all(crud.engine)
+    models.Base.metadata.create_all(crud.engine)
+    with crud.Session() as session:
+        session.add_all(models.User(name=f"user{i}", email=f"user{i}@example.com", password="-") for i in range(users))
+        session.add_all(models.Book(title=f"Livre {i}", author="Auteur", kind="roman", publication_date=date(2000, 1, 1), availability=1)
+                        for i in range(books))
+        session.commit()
+    crud._catalog_changed()
+
+def check() -> list:
+    '''
+    :return: liste des incohérences trouvées en base (vide si tout va bien)
+    '''
+    import crud, config, models
+    from sqlalchemy import select, func
+    problems = []
+    with crud.Session() as session:
+        active = models.Emprunt.returned == 0
+        for book_id, count in session.execute(select(models.Emprunt.book_id, func.count()).where(active).group_by(models.Emprunt.book_id)):
+            if count > 1:
+                problems.append(f"livre {book_id} prêté {count} fois")
+        for user_id, count in session.execute(select(models.Emprunt.user_id, func.count()).where(active).group_by(models.Emprunt.user_id)):
+            if count > config.MAX_ACTIVE_LOANS:
+                problems.append(f"utilisateur {user_id} : {count} emprunts en cours")
+        borrowed = set(session.scalars(select(models.Emprunt.book_id).where(active)))
+        unavailable = set(session.scalars(select(models.Book.id).where(models.Book.availability == 0)))
+        if borrowed != unavailable:
+            problems.append(f"disponibilité incohérente pour {len(borrowed ^ unavailable)} livres")
+    return problems
+
+async def run(borrow, args) -> dict:
+    '''
+    Lance args.attempts emprunts (utilisateur et livre tirés au hasard) avec au plus args.concurrency simultanés
+    :return: débit, issues des emprunts et incohérences
+    '''
+    seed(args.books, args.users)
+    rng = random.Random(0)
+    return_date = date.today() + timedelta(days=7)
+    attempts = [(rng.randint(1, args.users), rng.randint(1, args.books)) for _ in range(args.attempts)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    statuses = Counter()
+
+    async def one(user_id, book_id):
+        async with semaphore:
+            try:
+                result = await borrow(user_id, book_id, return_date)
+                statuses[result.status.value] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id, book_id) for user_id, book_id in attempts))
+    elapsed = time.perf_counter() - started
+    return {"borrows_per_s": round(args.attempts / elapsed, 1), "statuses": dict(statuses), "problems": check()}
+
+async def main(args) -> dict:
+    import anyio, crud, crud_async
+    results = {
+        "sync": await run(lambda *a: anyio.to_thread.run_sync(crud.borrow_book, *a), args),
+        "async": await run(crud_async.borrow_book, args),
+    }
+    for name, result in results.items():
+        print(f"{name:5} {result}")
+    await crud_async.dispose_engine()
+    return results
+
+if __name__ == "__main__":
+    args = parse_args()
+    database = args.database or os.path.join(tempfile.mkdtemp(), "borrow.db")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.pop("SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    results = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if any(result["problems"] for result in results.values()):
+        raise SystemExit(1)
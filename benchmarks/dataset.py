@@ -0,0 +1,164 @@
+'''
+Jeu de données de benchmark : base SQLite au schéma de models.py (à la place de la base Oracle),
+remplie par lots de livres, d'utilisateurs et d'emprunts, de façon reproductible (graine fixe).
+
+Les emprunts en cours portent sur des livres distincts, marqués indisponibles, et chaque utilisateur
+en a moins de MAX_ACTIVE_LOANS (il peut encore emprunter pendant les scénarios). Les autres sont retournés.
+Tous les utilisateurs (user0, user1, ...) ont le mot de passe PASSWORD. Les paramètres sont écrits
+dans <base>.json, lu par les scénarios.
+
+Usage : python -m benchmarks.dataset --database bench.db --books 1000000 --users 100000 --loans 5000000
+'''
+import argparse, json, os, random, time
+from datetime import date, timedelta
+from typing import Iterator, List
+
+PASSWORD = "benchmark-password"
+
+WORDS = ("amour", "nuit", "jardin", "mer", "guerre", "paix", "ombre", "lumière", "voyage", "secret", "roi", "ville",
+         "hiver", "été", "rivière", "montagne", "silence", "mémoire", "étoile", "forêt", "sable", "feu", "vent", "temps",
+         "maison", "chemin", "promesse", "miroir", "désert", "île", "royaume", "enfance", "dernier", "premier", "petit",
+         "grand", "noir", "blanc", "rouge", "bleu")
+FIRST_NAMES = ("Albert", "Marie", "Victor", "George", "Émile", "Simone", "Marguerite", "Jules", "Colette", "Honoré",
+               "Gustave", "Annie", "Patrick", "Françoise", "Romain", "Nathalie", "Boris", "Amélie", "Michel", "Leïla")
+LAST_NAMES = ("Camus", "Hugo", "Sand", "Zola", "Beauvoir", "Duras", "Verne", "Balzac", "Flaubert", "Ernaux",
+              "Modiano", "Sagan", "Gary", "Vian", "Nothomb", "Houellebecq", "Slimani", "Yourcenar", "Proust", "Gide")
+KINDS = ("roman", "essai", "poésie", "théâtre", "policier", "science-fiction", "biographie", "histoire",
+         "jeunesse", "bande dessinée", "conte", "philosophie")
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--database", default="bench.db", help="fichier SQLite (remplacé s'il existe)")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--loans", type=int, default=500000)
+    parser.add_argument("--active", type=int, help="emprunts en cours (2 %% des emprunts par défaut)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--bcrypt-rounds", type=int, help="coût bcrypt du mot de passe commun (BCRYPT_ROUNDS par défaut)")
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(connection, table, columns: tuple, rows: Iterator[tuple], batch_size: int, label: str) -> int:
+    # Une transaction par lot, executemany du driver sqlite3 sur des tuples (dates en texte ISO, comme SQLAlchemy)
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    started, count = time.perf_counter(), 0
+    for batch in _batches(rows, batch_size):
+        connection.executemany(sql, batch)
+        connection.commit()
+        count += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"{label:9} {count:>10} lignes en {elapsed:6.1f} s ({count / max(elapsed, 1e-9):,.0f}/s)")
+    return count
+
+def active_loans(args) -> int:
+    import config
+    wanted = args.loans // 50 if args.active is None else args.active
+    return max(0, min(wanted, args.loans, args.books // 5, args.users * (config.MAX_ACTIVE_LOANS - 1)))
+
+def generate(args) -> dict:
+    '''
+    Crée la base et la remplit
+    :return: paramètres du jeu de données (écrits dans <base>.json)
+    '''
+    import config, hashing, models
+    from sqlalchemy import create_engine, event
+
+    if os.path.exists(args.database):
+        os.remove(args.database)
+    engine = create_engine(f"sqlite:///{args.database}")
+
+    @event.listens_for(engine, "connect")
+    def _bulk_pragmas(dbapi_connection, connection_record):
+        # Chargement seulement : pas de journal ni de fsync
+        dbapi_connection.execute("PRAGMA journal_mode=OFF")
+        dbapi_connection.execute("PRAGMA synchronous=OFF")
+
+    models.Base.metadata.create_all(engine)
+    rng = random.Random(args.seed)
+    today = date.today()
+    active = active_loans(args)
+    # Livres empruntés en ce moment (distincts), répartis entre les utilisateurs
+    borrowed = rng.sample(range(1, args.books + 1), active)
+    borrowed_set = set(borrowed)
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(max(1, args.books // 20))]
+    rounds = args.bcrypt_rounds or config.BCRYPT_ROUNDS
+    password = hashing.make_context(rounds).hash(PASSWORD)
+
+    # Dates en texte ISO : 4000 jours possibles, convertis une seule fois
+    days = [(today - timedelta(days=n)).isoformat() for n in range(3700)]
+    ahead = {n: (today - timedelta(days=n) + timedelta(days=30)).isoformat() for n in range(41)}
+
+    def books():
+        for book_id in range(1, args.books + 1):
+            title = " ".join(rng.sample(WORDS, rng.randint(1, 3))).capitalize()
+            yield (book_id, f"{title} {book_id}"[:50], rng.choice(authors), rng.choice(KINDS),
+                   f"{rng.randint(1800, today.year)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                   0 if book_id in borrowed_set else 1)
+
+    def users():
+        for i in range(args.users):
+            yield i + 1, f"user{i}", f"user{i}@example.com", f"06{i:08d}", password
+
+    def loans():
+        for k, book_id in enumerate(borrowed):
+            borrowed_days = rng.randint(0, 40)
+            status = models.LOAN_OVERDUE if borrowed_days > 30 else models.LOAN_ACTIVE
+            yield k % args.users + 1, book_id, days[borrowed_days], ahead[borrowed_days], 0, status
+        for _ in range(args.loans - active):
+            borrowed_days = rng.randint(41, 3650)
+            yield (rng.randint(1, args.users), rng.randint(1, args.books), days[borrowed_days],
+                   days[borrowed_days - rng.randint(1, 30)], 1, models.LOAN_RETURNED)
+
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        _insert(connection, models.Book.__table__, ("id", "title", "author", "kind", "publication_date", "availability"),
+                books(), args.batch_size, "books")
+        _insert(connection, models.User.__table__, ("id", "name", "email", "phone", "password"), users(), args.batch_size, "users")
+        _insert(connection, models.Emprunt.__table__, ("user_id", "book_id", "borrow_date", "return_date", "returned", "status"),
+                loans(), args.batch_size, "emprunts")
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    engine.dispose()
+
+    dataset = {"database": args.database, "books": args.books, "users": args.users, "loans": args.loans,
+               "active": active, "seed": args.seed, "password": PASSWORD, "bcrypt_rounds": rounds,
+               "words": list(WORDS), "authors": sorted(set(authors))[:100]}
+    with open(f"{args.database}.json", "w") as f:
+        json.dump(dataset, f, indent=2)
+    print(f"base {args.database} générée en {time.perf_counter() - started:.1f} s")
+    return dataset
+
+def describe(database: str) -> dict:
+    '''
+    Paramètres d'une base générée (<base>.json)
+    '''
+    with open(f"{database}.json") as f:
+        return json.load(f)
+
+def configure(database: str) -> dict:
+    '''
+    Fait pointer l'application sur la base générée, avant le premier import de crud / main :
+    URL SQLite (synchrone et asyncio déduite) et coût bcrypt du mot de passe commun
+    :return: paramètres du jeu de données
+    '''
+    dataset = describe(database)
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.abspath(database)}"
+    os.environ.pop("SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    os.environ["BCRYPT_ROUNDS"] = str(dataset["bcrypt_rounds"])
+    return dataset
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une base SQLite de benchmark (livres, utilisateurs, emprunts)")
+    add_arguments(parser)
+    generate(parser.parse_args())
@@ -0,0 +1,116 @@
+'''
+Microbenchmarks des fonctions de crud.py sur la base générée (benchmarks.dataset) : chaque fonction est
+appelée en boucle avec des arguments tirés au hasard, hors de toute route HTTP.
+
+Le cache du catalogue est désactivé par défaut (--cache pour le garder) : on mesure la lecture en base.
+Les fonctions qui écrivent sont mesurées par paires qui remettent la base dans son état (emprunt puis retour,
+création puis suppression).
+
+Usage : python -m benchmarks micro --database bench.db --iterations 500 [--functions books_page,connexion]
+'''
+import itertools, random, secrets, time
+from datetime import date, timedelta
+from typing import Callable, Dict
+from benchmarks import report
+
+# Fonctions qui lisent toute une table : peu d'itérations
+HEAVY = {"all_books", "get_users"}
+
+def calls(data: dict, rng: random.Random) -> Dict[str, Callable[[], object]]:
+    '''
+    Nom -> appel sans argument (arguments tirés à chaque appel)
+    '''
+    import crud, models, schema
+    from sqlalchemy import func, select
+    book = lambda: rng.randint(1, data["books"])
+    username = lambda: f"user{rng.randrange(data['users'])}"
+    user_id = lambda: rng.randint(1, data["users"])
+    word = lambda: rng.choice(data["words"])
+    author = lambda: rng.choice(data["authors"])
+    return_date = date.today() + timedelta(days=14)
+    # Titres existants, pour les recherches exactes
+    with crud.Session() as session:
+        titles = session.scalars(select(models.Book.title).order_by(func.random()).limit(1000)).all()
+    # Utilisateur réservé aux paires emprunt / retour (créé au premier lancement)
+    borrower = (crud.create_user(schema.UserCreate(name="micro-borrower", email="micro-borrower@example.com", phone=None,
+                                                   password="micro-benchmark"))
+                or crud.connexion("micro-borrower"))
+    # Emprunts restés en cours après un lancement interrompu
+    for loan in crud.get_loan_by_user(borrower.id)[0]:
+        crud.return_book(borrower.id, loan.book_id)
+    # Noms uniques d'un lancement à l'autre pour create_user
+    run_id, counter = secrets.token_hex(4), itertools.count()
+
+    def borrow_and_return():
+        book_id = book()
+        if crud.borrow_book(borrower.id, book_id, return_date).status == schema.BorrowStatus.borrowed:
+            crud.return_book(borrower.id, book_id)
+
+    def create_update_delete():
+        created = crud.create_book(schema.BookCreate(title="Micro benchmark", author="Auteur", kind="roman",
+                                                     publication_date=date(2000, 1, 1)))
+        crud.update_book(created.id, "Micro benchmark 2", "Auteur", "essai", date(2001, 1, 1))
+        crud.delete_book(created.id)
+
+    def create_user():
+        n = f"{run_id}-{next(counter)}"
+        crud.create_user(schema.UserCreate(name=f"micro{n}", email=f"micro{n}@example.com", phone=None, password="micro-benchmark"))
+
+    return {
+        "books_page": lambda: crud.books_page(sort=rng.choice(tuple(crud.SORT_COLUMNS))),
+        "search_book": lambda: crud.search_book(title=word()),
+        "search_book_page": lambda: crud.search_book_page(title=word()),
+        "search_book_page_facets": lambda: crud.search_book_page(title=word(), available=True),
+        "get_book_by_id": lambda: crud.get_book_by_id(book()),
+        "get_book_by_title": lambda: crud.get_book_by_title(rng.choice(titles)),
+        "get_book_by_author": lambda: crud.get_book_by_author(author()),
+        "get_book_by_kind": lambda: crud.get_book_by_kind("roman"),
+        "connexion": lambda: crud.connexion(username()),
+        "active_loans_count": lambda: crud.active_loans_count(user_id()),
+        "get_emprunts_by_user": lambda: crud.get_emprunts_by_user(user_id()),
+        "get_loan_by_user": lambda: crud.get_loan_by_user(user_id()),
+        "borrow_book+return_book": borrow_and_return,
+        "create_book+update_book+delete_book": create_update_delete,
+        "create_user": create_user,
+        "all_books": crud.all_books,
+        "get_users": crud.get_users,
+    }
+
+def measure(call: Callable, iterations: int) -> dict:
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - call_started)
+    return report.summarize(latencies, time.perf_counter() - started, errors)
+
+def run(args, data: dict) -> Dict[str, dict]:
+    import config, crud
+    config.CATALOG_CACHE_ENABLED = args.cache
+    rng = random.Random(args.seed)
+    registry = calls(data, rng)
+    names = args.functions.split(",") if args.functions else list(registry)
+    unknown = set(names) - set(registry)
+    if unknown:
+        raise SystemExit(f"fonctions inconnues : {', '.join(sorted(unknown))}")
+    # Index de recherche construit avant la mesure
+    crud._load_search_index()
+    results = {}
+    for name in names:
+        iterations = max(3, args.iterations // 100) if name in HEAVY else args.iterations
+        measure(registry[name], min(args.warmup, iterations))
+        results[f"micro.{name}"] = measure(registry[name], iterations)
+        print(f"{name:40} {results[f'micro.{name}']}")
+    return results
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--iterations", type=int, default=500, help="appels mesurés par fonction")
+    parser.add_argument("--warmup", type=int, default=20, help="appels d'échauffement par fonction")
+    parser.add_argument("--functions", help="liste séparée par des virgules (toutes par défaut)")
+    parser.add_argument("--cache", action="store_true", help="garde le cache du catalogue")
+    parser.add_argument("--seed", type=int, default=0)
@@ -0,0 +1,11 @@
+'''
+Vérifie que les fonctions crud exécutent un nombre fixe de requêtes SQL, que l'utilisateur
+ait un emprunt ou beaucoup (pas de chargement paresseux N+1) : lance tests/test_query_counts.py.
+
+Usage : python -m benchmarks.query_counts
+'''
+import os, sys
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main(["-q", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "test_query_counts.py"), *sys.argv[1:]]))
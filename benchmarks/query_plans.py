@@ -0,0 +1,12 @@
+'''
+Plans d'exécution des requêtes crud sur une base SQLite créée par les migrations Alembic :
+chaque requête des chemins chauds doit passer par un index. Lance tests/test_query_plans.py,
+qui échoue si l'une d'elles parcourt une table entière.
+
+Usage : python -m benchmarks.query_plans [options pytest, ex. -v]
+'''
+import os, sys
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main(["-q", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "test_query_plans.py"), *sys.argv[1:]]))
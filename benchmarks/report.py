@@ -0,0 +1,95 @@
+'''
+Résultats des benchmarks : débit et percentiles, fichier JSON, comparaison avec une référence (baseline).
+
+Format d'un fichier de résultats :
+{"meta": {...}, "results": {"<suite>.<scénario>": {"requests", "errors", "per_s", "p50_ms", "p95_ms", "p99_ms", "mean_ms"}}}
+'''
+import json, os, platform, statistics, sys, time
+from typing import Dict, List, Optional
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> dict:
+    '''
+    :param latencies: durées des appels réussis (secondes)
+    :param elapsed: durée totale de la série (secondes)
+    :param errors: appels en erreur
+    :return: débit (appels/s) et latences en millisecondes
+    '''
+    ordered = sorted(latencies)
+    count = len(ordered) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "per_s": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+    }
+
+def meta(**extra) -> dict:
+    # Contexte de la mesure, pour savoir si deux fichiers sont comparables
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+            "platform": platform.platform(), "cpus": os.cpu_count(), **extra}
+
+def print_table(results: Dict[str, dict]) -> None:
+    print(f"{'scénario':40} {'appels':>8} {'err':>5} {'/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:40} {result['requests']:8} {result['errors']:5} {result['per_s']:9.1f} "
+              f"{result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f}")
+
+def save(path: str, results: Dict[str, dict], **extra) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": meta(**extra), "results": results}, f, indent=2)
+
+def load(path: str) -> Dict[str, dict]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float = 0.15,
+            min_delta_ms: float = 0.05) -> List[str]:
+    '''
+    Régressions par rapport à la référence : débit plus faible ou p95 plus élevé de plus de tolerance,
+    nouvelles erreurs. Les écarts de latence inférieurs à min_delta_ms (bruit de mesure) sont ignorés.
+    :return: liste des régressions (vide si aucune)
+    '''
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if reference["per_s"] and result["per_s"] < reference["per_s"] * (1 - tolerance):
+            regressions.append(f"{name} : débit {result['per_s']}/s au lieu de {reference['per_s']}/s")
+        if (reference["p95_ms"] and result["p95_ms"] > reference["p95_ms"] * (1 + tolerance)
+                and result["p95_ms"] - reference["p95_ms"] > min_delta_ms):
+            regressions.append(f"{name} : p95 {result['p95_ms']} ms au lieu de {reference['p95_ms']} ms")
+        if result["errors"] and not reference["errors"]:
+            regressions.append(f"{name} : {result['errors']} erreurs")
+    return regressions
+
+def print_comparison(results: Dict[str, dict], baseline: Dict[str, dict]) -> None:
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:40} (absent de la référence)")
+            continue
+        ratio = lambda new, old: f"{(new / old - 1) * 100:+6.1f}%" if old else "   n/a"
+        print(f"{name:40} débit {ratio(result['per_s'], reference['per_s'])}  p95 {ratio(result['p95_ms'], reference['p95_ms'])}"
+              f"  p99 {ratio(result['p99_ms'], reference['p99_ms'])}")
+
+def check(results: Dict[str, dict], baseline_path: Optional[str], tolerance: float) -> List[str]:
+    '''
+    Compare à la référence si elle est donnée, affiche l'écart et les régressions
+    :return: liste des régressions
+    '''
+    if not baseline_path:
+        return []
+    baseline = load(baseline_path)
+    print_comparison(results, baseline)
+    regressions = compare(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"RÉGRESSION {regression}")
+    return regressions
@@ -0,0 +1,147 @@
+'''
+Scénarios de charge dans le processus : main.app est appelée en ASGI (httpx.ASGITransport), par les vraies routes,
+middlewares compris, sans serveur ni réseau. Chaque utilisateur virtuel est un compte de la base générée
+(benchmarks.dataset), avec son cookie access_token.
+
+Scénarios : browse (pages du catalogue, en suivant le curseur), search, login (bcrypt compris),
+borrow, return, history (/users/{username}/emprunts).
+
+Usage : python -m benchmarks load --database bench.db --requests 2000 --concurrency 50 [--scenarios browse,search]
+'''
+import asyncio, random, re, time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+from benchmarks import report
+
+NEXT_CURSOR = re.compile(r'[?&]after=([^"&]+)')
+
+class VirtualUser:
+    '''
+    Compte utilisé par un utilisateur virtuel : cookie, livres empruntés, curseur de navigation
+    '''
+
+    def __init__(self, user_id: int, name: str, cookie: str, borrowed: List[int]):
+        self.id = user_id
+        self.name = name
+        self.headers = {"cookie": f"access_token={cookie}"}
+        self.borrowed = borrowed
+        self.cursor: Optional[str] = None
+
+async def browse(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    # Page suivante du catalogue (retour à la première page de temps en temps)
+    url = f"/?after={user.cursor}" if user.cursor and rng.random() < 0.8 else "/"
+    response = await client.get(url)
+    match = NEXT_CURSOR.search(response.text)
+    user.cursor = match.group(1) if match else None
+    return response.status_code
+
+async def search(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    params = {"title": rng.choice(data["words"])} if rng.random() < 0.7 else {"author": rng.choice(data["authors"]).split()[-1]}
+    return (await client.get("/search_books", params=params)).status_code
+
+async def login(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    response = await client.post("/login", data={"username": user.name, "password": data["password"]})
+    return response.status_code
+
+async def borrow(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    # Livre tiré au hasard : déjà emprunté (409) ou limite atteinte (400) sont des issues normales
+    book_id = rng.randint(1, data["books"])
+    response = await client.post(f"/emprunts/{book_id}", headers=user.headers,
+                                 data={"return_date": (date.today() + timedelta(days=14)).isoformat()})
+    if response.status_code == 303:
+        user.borrowed.append(book_id)
+    return response.status_code
+
+async def give_back(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    # Retour d'un livre emprunté par l'utilisateur ; sans emprunt en cours, emprunt préalable (compris dans la mesure)
+    for _ in range(10):
+        if user.borrowed:
+            break
+        # Livre tiré déjà emprunté par un autre : nouvel essai
+        await borrow(client, user, rng, data)
+    else:
+        return 404
+    book_id = user.borrowed.pop()
+    return (await client.post(f"/emprunts/{book_id}/retour", headers=user.headers)).status_code
+
+async def history(client, user: VirtualUser, rng: random.Random, data: dict) -> int:
+    return (await client.get(f"/users/{user.name}/emprunts", headers=user.headers)).status_code
+
+# Nom -> (étape, statuts attendus)
+SCENARIOS: Dict[str, tuple] = {
+    "browse": (browse, {200}),
+    "search": (search, {200}),
+    "login": (login, {303}),
+    "borrow": (borrow, {303, 400, 409}),
+    "return": (give_back, {303}),
+    "history": (history, {200}),
+}
+
+def virtual_users(data: dict, count: int) -> List[VirtualUser]:
+    '''
+    Comptes des utilisateurs virtuels (user0, user1, ...), token créé directement et emprunts en cours lus en base
+    '''
+    import auth, crud, models
+    from sqlalchemy import select
+    users = []
+    with crud.Session() as session:
+        for i in range(min(count, data["users"])):
+            user = crud.connexion(f"user{i}", session)
+            borrowed = list(session.scalars(select(models.Emprunt.book_id)
+                                            .where(models.Emprunt.user_id == user.id, models.Emprunt.returned == 0)))
+            users.append(VirtualUser(user.id, user.name, auth.create_access_token(data=auth.token_claims(user)), borrowed))
+    return users
+
+async def run_scenario(client, step: Callable, expected: set, users: List[VirtualUser], requests: int,
+                       data: dict, seed: int = 0) -> dict:
+    '''
+    requests étapes réparties entre les utilisateurs virtuels, qui tournent en parallèle
+    :return: résumé (débit, percentiles, erreurs)
+    '''
+    latencies, errors = [], 0
+    remaining = requests
+
+    async def worker(user: VirtualUser, rng: random.Random):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await step(client, user, rng, data)
+            except Exception:
+                status = None
+            if status in expected:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user, random.Random(seed + i)) for i, user in enumerate(users)))
+    return report.summarize(latencies, time.perf_counter() - started, errors)
+
+async def run(args, data: dict) -> Dict[str, dict]:
+    import httpx, main
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+    results = {}
+    # Démarrage de l'application (index, scanner des retards) comme sous uvicorn
+    async with main.app.router.lifespan_context(main.app):
+        users = virtual_users(data, args.concurrency)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in names:
+                step, expected = SCENARIOS[name]
+                # Échauffement (caches, index, pool de hachage) non mesuré
+                await run_scenario(client, step, expected, users, min(args.warmup, args.requests), data, args.seed)
+                results[f"load.{name}"] = await run_scenario(client, step, expected, users, args.requests, data, args.seed)
+                print(f"{name:8} {results[f'load.{name}']}")
+    return results
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--requests", type=int, default=1000, help="étapes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=20, help="utilisateurs virtuels simultanés")
+    parser.add_argument("--warmup", type=int, default=50, help="étapes d'échauffement par scénario")
+    parser.add_argument("--scenarios", help=f"liste séparée par des virgules ({','.join(SCENARIOS)})")
+    parser.add_argument("--seed", type=int, default=0)
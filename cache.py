@@ -0,0 +1,99 @@
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    '''
+    Cache LRU borné en nombre d'entrées (et en poids total si max_weight est donné,
+    le poids d'une valeur étant calculé par weigher), avec expiration par entrée.
+    Compte les hits, misses et évictions ; utilisable depuis plusieurs threads.
+    '''
+
+    def __init__(self, max_entries: int, ttl: float, max_weight: Optional[int] = None, weigher: Callable[[Any], int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda value: 1)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''
+        :return: la valeur en cache, ou default si absente ou expirée
+        '''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        '''
+        Ajoute une entrée ; elle expire après ttl secondes, et au plus tard à expires_at (timestamp epoch)
+        '''
+        now = time.monotonic()
+        expires = now + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            expires = min(expires, now + expires_at - time.time())
+        weight = self.weigher(value)
+        if expires <= now or self.max_entries <= 0 or (self.max_weight is not None and weight > self.max_weight):
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (expires, value, weight)
+            self.weight += weight
+            while len(self._entries) > self.max_entries or (self.max_weight is not None and self.weight > self.max_weight):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.weight -= evicted
+                self.evictions += 1
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def discard_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        '''
+        Retire les entrées pour lesquelles predicate(clé, valeur) est vrai
+        :return: nombre d'entrées retirées
+        '''
+        with self._lock:
+            keys = [key for key, (_, value, _) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                self._discard(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
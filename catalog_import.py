@@ -0,0 +1,198 @@
+'''
+Import de livres en masse depuis un fichier CSV ou JSON Lines.
+
+Le fichier est lu ligne à ligne, chaque ligne est validée par schema.BookCreate, puis les livres
+sont insérés par lots : une requête par lot pour écarter les titres déjà en base, un INSERT
+executemany, une transaction par lot.
+
+Usage : python -m catalog_import livres.csv [--format csv|jsonl] [--batch-size 1000]
+'''
+import argparse, csv, itertools, json, sys, time
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+import models, schema, config, crud
+
+FORMATS = ("csv", "jsonl")
+
+# Colonnes retournées par l'INSERT (pour mettre à jour l'index de recherche sans relire la table)
+RETURNED_COLUMNS = (models.Book.id, models.Book.title, models.Book.author, models.Book.kind,
+                    models.Book.publication_date, models.Book.availability)
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    '''
+    Déduit le format du nom de fichier ou du type de contenu
+    :return: "csv" ou "jsonl"
+    '''
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")) or (content_type or "").endswith(("ndjson", "jsonl", "json")):
+        return "jsonl"
+    if name.endswith(".csv") or (content_type or "").endswith("csv"):
+        return "csv"
+    raise ValueError("Format inconnu, utiliser csv ou jsonl")
+
+class UnreadableFile(ValueError):
+    '''
+    Fichier illisible à partir d'une ligne (encodage autre qu'UTF-8, CSV mal formé) : la lecture s'arrête
+    '''
+
+    def __init__(self, line: int, message: str):
+        super().__init__(message)
+        self.line = line
+
+def read_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    '''
+    Lit le fichier ligne à ligne sans le charger en mémoire
+    :param stream: fichier binaire (UTF-8, BOM accepté)
+    :param fmt: "csv" ou "jsonl"
+    :return: itérateur de (numéro de ligne, dictionnaire) ou (numéro de ligne, message d'erreur) ;
+             lève UnreadableFile si le fichier ne peut plus être lu
+    '''
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    lines = DecodedLines(stream)
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(lines)
+            for record in reader:
+                # Les cellules vides prennent la valeur par défaut du schéma
+                yield reader.line_num, {key: value for key, value in record.items() if key and value not in (None, "")}
+        else:
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield lines.line, f"JSON invalide : {e}"
+                    continue
+                yield lines.line, record if isinstance(record, dict) else "un objet JSON est attendu"
+    except UnicodeDecodeError as e:
+        raise UnreadableFile(lines.line, f"Fichier illisible (UTF-8 attendu) : {e.reason}")
+    except csv.Error as e:
+        raise UnreadableFile(lines.line, f"CSV invalide : {e}")
+
+class DecodedLines:
+    '''
+    Lignes d'un fichier binaire décodées une à une (UTF-8, BOM accepté) : une erreur d'encodage est rapportée
+    à sa ligne (line : numéro de la dernière ligne lue)
+    '''
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.line = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.stream:
+            self.line += 1
+            yield line.decode("utf-8-sig" if self.line == 1 else "utf-8")
+
+def validate(record) -> schema.BookCreate:
+    '''
+    :return: schema BookCreate ; lève ValueError avec un message lisible si la ligne est invalide
+    '''
+    if isinstance(record, str):
+        raise ValueError(record)
+    try:
+        return schema.BookCreate.model_validate(record)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+def _existing_titles(session, titles: List[str]) -> set:
+    # Une requête par paquet de titres (listes IN bornées pour Oracle)
+    existing = set()
+    for start in range(0, len(titles), crud.IN_CHUNK_SIZE):
+        chunk = titles[start:start + crud.IN_CHUNK_SIZE]
+        existing.update(session.scalars(select(models.Book.title).where(models.Book.title.in_(chunk))))
+    return existing
+
+def _insert_batch(batch: List[schema.BookCreate], report: schema.ImportReport) -> None:
+    # Écarte les doublons (dans le lot et en base) puis insère le reste en une transaction
+    unique = {}
+    for book in batch:
+        unique.setdefault(book.title, book)
+    report.duplicates += len(batch) - len(unique)
+
+    with crud.Session() as session:
+        existing = _existing_titles(session, list(unique))
+        rows = [book.model_dump() for title, book in unique.items() if title not in existing]
+        report.duplicates += len(existing)
+        created = []
+        if rows:
+            # INSERT sur la table (Core) : executemany sans la comptabilité par objet de l'ORM
+            result = session.execute(insert(models.Book.__table__).returning(*RETURNED_COLUMNS), rows)
+            created = [schema.BookCreated.model_validate(row._mapping) for row in result]
+            crud._record_changes(session, models.CHANGE_BOOK, [book.id for book in created])
+        session.commit()
+
+    report.inserted += len(created)
+    report.batches += 1
+    if created:
+        crud._catalog_changed(upserted=created)
+
+def import_batches(stream: BinaryIO, fmt: str, batch_size: Optional[int] = None) -> Iterator[schema.ImportReport]:
+    '''
+    Importe le fichier lot par lot
+    :param stream: fichier binaire CSV ou JSON Lines
+    :param fmt: "csv" ou "jsonl"
+    :param batch_size: lignes par lot (IMPORT_BATCH_SIZE par défaut)
+    :return: itérateur du bilan, mis à jour après chaque lot ; le dernier a done=True
+    '''
+    batch_size = max(1, batch_size or config.IMPORT_BATCH_SIZE)
+    report = schema.ImportReport()
+    started = time.perf_counter()
+    rows = read_rows(stream, fmt)
+    while True:
+        batch = []
+        read = 0
+        unreadable = None
+        try:
+            for line_number, record in itertools.islice(rows, batch_size):
+                read += 1
+                try:
+                    batch.append(validate(record))
+                except ValueError as e:
+                    report.failed += 1
+                    if len(report.errors) < config.IMPORT_MAX_ERRORS:
+                        report.errors.append(schema.ImportRowError(line=line_number, error=str(e)))
+        except UnreadableFile as e:
+            # Lignes lues avant l'erreur importées, puis bilan final avec l'erreur (toujours rapportée)
+            unreadable = e
+        report.rows += read
+        if batch:
+            _insert_batch(batch, report)
+        if unreadable is not None:
+            report.failed += 1
+            report.errors.append(schema.ImportRowError(line=unreadable.line, error=str(unreadable)))
+            break
+        if read == 0:
+            break
+        report.seconds = round(time.perf_counter() - started, 3)
+        yield report
+    report.seconds = round(time.perf_counter() - started, 3)
+    report.done = True
+    yield report
+
+def import_books(stream: BinaryIO, fmt: str, batch_size: Optional[int] = None,
+                 progress: Callable[[schema.ImportReport], None] = None) -> schema.ImportReport:
+    '''
+    Importe tout le fichier
+    :param progress: appelée avec le bilan après chaque lot
+    :return: schema ImportReport final
+    '''
+    for report in import_batches(stream, fmt, batch_size):
+        if progress is not None and not report.done:
+            progress(report)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import de livres en masse (CSV ou JSON Lines)")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=config.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = args.format or detect_format(args.file)
+    with open(args.file, "rb") as f:
+        report = import_books(f, fmt, args.batch_size, progress=lambda r: print(
+            f"{r.rows} lignes, {r.inserted} insérées, {r.duplicates} doublons, {r.failed} erreurs ({r.seconds} s)", file=sys.stderr))
+    print(report.model_dump_json(indent=2))
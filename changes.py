@@ -0,0 +1,200 @@
+'''
+Cohérence des caches entre workers (WORKERS > 1 ou CHANGE_LOG_ENABLED), sans service externe.
+
+Chaque modification d'un livre (création, mise à jour, suppression, emprunt, retour, import) ou d'un utilisateur
+ajoute une ligne à la table change_log dans sa propre transaction (crud._record_changes). Chaque worker lit,
+toutes les CHANGE_POLL_INTERVAL_SECONDS, les lignes qu'il n'a pas encore vues et les applique à sa mémoire :
+livres relus en base (nouvelle version du cache du catalogue, index de recherche et de complétion),
+utilisateurs retirés du cache d'authentification. Les caches d'un worker sont donc à jour au plus
+CHANGE_POLL_INTERVAL_SECONDS (plus la durée d'une lecture) après le commit d'un autre worker ; ses propres
+modifications sont appliquées tout de suite et sautées à la relecture (seq retournés par l'INSERT, crud.own_changes).
+
+La position dans le journal est partagée par les workers qui ont lu les mêmes lignes : elle sert de version
+du catalogue dans les ETag (conditional.py) à la place du compteur propre à chaque worker.
+
+Les numéros seq ne sont pas forcément validés dans l'ordre (sessions Oracle concurrentes) : un numéro sauté
+est relu pendant GAP_TIMEOUT_SECONDS au cas où sa transaction serait encore en cours. Les lignes plus anciennes
+que CHANGE_LOG_RETENTION_SECONDS sont purgées ; un worker qui n'a pas pu lire le journal pendant cette durée
+vide ses caches et index au lieu de rejouer les lignes.
+'''
+import asyncio, logging, threading, time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import delete, func, or_, select
+import config, crud, models
+
+logger = logging.getLogger(__name__)
+
+# Lignes lues par requête, numéros sautés suivis au plus et durée pendant laquelle ils sont relus
+BATCH_SIZE = 1000
+MAX_GAPS = crud.IN_CHUNK_SIZE
+GAP_TIMEOUT_SECONDS = 30.0
+
+class ChangeFeed:
+    '''
+    Lecture du journal change_log par un worker : position (dernier seq vu), numéros sautés, compteurs
+    '''
+
+    def __init__(self, interval: float, retention: float):
+        self.interval = interval
+        self.retention = retention
+        self.position: Optional[int] = None
+        # seq sauté -> instant où le trou a été vu
+        self._gaps: Dict[int, float] = {}
+        self._task = None
+        self._lock = threading.Lock()
+        self.polls = 0
+        self.applied = 0
+        self.skipped = 0
+        self.errors = 0
+        self.resets = 0
+        self.purged = 0
+        self.last_success = None
+        self.last_purge = 0.0
+        self.last_lag = 0.0
+
+    def prime(self) -> None:
+        '''
+        Part du dernier seq en base : à appeler avant de construire caches et index (démarrage)
+        '''
+        with crud.Session() as session:
+            self.position = session.scalar(select(func.coalesce(func.max(models.ChangeLog.seq), 0)))
+        self._gaps.clear()
+        self._forget_own()
+        self.last_success = time.monotonic()
+
+    def version(self) -> str:
+        '''
+        Version du catalogue commune aux workers : dernier seq lu, numéros sautés encore attendus et
+        modifications de ce worker pas encore relues (un seq n'est écrit que par un worker : sa version est alors unique)
+        '''
+        # Copie des seq du worker avant la position : une lecture concurrente ne peut que vieillir la version
+        own = list(crud.own_changes)
+        position, gaps = self.position, sorted(self._gaps)
+        pending = sorted(seq for seq in own if seq > position or seq in gaps)
+        version = str(position)
+        if gaps:
+            version += "-" + ",".join(map(str, gaps))
+        if pending:
+            version += "+" + ",".join(map(str, pending))
+        return version
+
+    def _forget_own(self) -> None:
+        # seq du worker déjà relus (ou abandonnés par un rollback) : plus attendus
+        crud.own_changes.difference_update([seq for seq in list(crud.own_changes) if seq <= self.position and seq not in self._gaps])
+
+    def _read(self, session) -> list:
+        condition = models.ChangeLog.seq > self.position
+        if self._gaps:
+            condition = or_(condition, models.ChangeLog.seq.in_(list(self._gaps)))
+        query = (select(models.ChangeLog.seq, models.ChangeLog.entity, models.ChangeLog.entity_id, models.ChangeLog.created_at)
+                 .where(condition).order_by(models.ChangeLog.seq).limit(BATCH_SIZE))
+        return session.execute(query).all()
+
+    def _advance(self, rows: list, now: float) -> None:
+        # Position au dernier seq lu ; les numéros sautés sont relus jusqu'à GAP_TIMEOUT_SECONDS
+        for row in rows:
+            if row.seq in self._gaps:
+                del self._gaps[row.seq]
+                continue
+            missing = row.seq - self.position - 1
+            if 0 < missing and len(self._gaps) + missing <= MAX_GAPS:
+                for seq in range(self.position + 1, row.seq):
+                    self._gaps[seq] = now
+            self.position = max(self.position, row.seq)
+        for seq, seen in list(self._gaps.items()):
+            if now - seen > GAP_TIMEOUT_SECONDS:
+                del self._gaps[seq]
+
+    def _apply(self, rows: list) -> int:
+        # Modifications de ce worker sautées : déjà appliquées à son commit
+        own = crud.own_changes
+        rows = [row for row in rows if row.seq not in own]
+        books = {row.entity_id for row in rows if row.entity == models.CHANGE_BOOK}
+        if books:
+            crud.refresh_books(books)
+        for user_id in {row.entity_id for row in rows if row.entity == models.CHANGE_USER}:
+            crud.invalidate_user(user_id)
+        return len(rows)
+
+    def _purge(self, session) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        self.purged += session.execute(delete(models.ChangeLog).where(models.ChangeLog.created_at < cutoff)).rowcount
+        session.commit()
+
+    def poll(self) -> int:
+        '''
+        Applique les modifications faites depuis le passage précédent (toutes, lot par lot)
+        :return: nombre de lignes appliquées
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if self.position is None or now - self.last_success > self.retention:
+                # Lignes peut-être déjà purgées : tout est rechargé à la demande
+                if self.position is not None:
+                    logger.warning("Journal des modifications non lu depuis %.0f s : caches et index vidés", now - self.last_success)
+                    crud.reset_caches()
+                    self.resets += 1
+                self.prime()
+                return 0
+            applied = 0
+            with crud.Session() as session:
+                while True:
+                    rows = self._read(session)
+                    if rows:
+                        count = self._apply(rows)
+                        self._advance(rows, now)
+                        self._forget_own()
+                        self.skipped += len(rows) - count
+                        applied += count
+                        self.last_lag = max(0.0, (datetime.utcnow() - rows[-1].created_at).total_seconds())
+                    if len(rows) < BATCH_SIZE:
+                        break
+                if now - self.last_purge > self.retention / 10:
+                    self._purge(session)
+                    self.last_purge = now
+            self.polls += 1
+            self.applied += applied
+            self.last_success = now
+            return applied
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception:
+                self.errors += 1
+                logger.exception("Lecture du journal des modifications")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": config.CHANGE_LOG_ENABLED,
+            "running": self._task is not None,
+            "interval_s": self.interval,
+            "position": self.position,
+            "gaps": len(self._gaps),
+            "polls": self.polls,
+            "applied": self.applied,
+            "skipped_own": self.skipped,
+            "own_pending": len(crud.own_changes),
+            "errors": self.errors,
+            "resets": self.resets,
+            "purged": self.purged,
+            "last_lag_s": round(self.last_lag, 3),
+        }
+
+feed = ChangeFeed(config.CHANGE_POLL_INTERVAL_SECONDS, config.CHANGE_LOG_RETENTION_SECONDS)
@@ -0,0 +1,122 @@
+'''
+Requêtes conditionnelles sur les pages du catalogue (ETag / Last-Modified / 304).
+
+L'ETag est calculé sans lecture en base : déploiement (config.DEPLOY_ID), version du catalogue, chemin et
+paramètres de l'URL et, pour les pages personnelles, utilisateur du token. Si le navigateur ou un proxy présente
+le même ETag (If-None-Match), la réponse est un 304 vide, avant toute requête SQL et tout rendu de template.
+
+La version est le compteur du worker (crud.catalog_version) ou, avec le journal des modifications (WORKERS > 1),
+sa position dans change_log (changes.feed.version) : deux workers à jour donnent le même ETag à une même page.
+'''
+import hashlib, time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import compile_path
+import changes, config, crud, auth
+
+def catalog_version() -> str:
+    '''
+    Version du catalogue dans les ETag : position dans change_log si le journal est lu, commune aux workers
+    '''
+    if config.CHANGE_LOG_ENABLED:
+        return changes.feed.version()
+    return str(crud.catalog_version)
+
+def catalog_etag(version: str, path: str, query: str, user: Optional[str] = None) -> str:
+    '''
+    :return: ETag faible de la page (même contenu, à l'octet près ou non, pour une même version)
+    '''
+    digest = hashlib.blake2b(f"{config.DEPLOY_ID}|{version}|{path}?{query}|{user or ''}".encode(), digest_size=10).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Comparaison faible (RFC 9110) : le préfixe W/ est ignoré
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def not_modified_since(if_modified_since: str, modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return modified <= since
+
+def _token_user(access_token: Optional[str]) -> Optional[str]:
+    # Utilisateur du token (cache des tokens décodés, sans requête SQL) ; None si absent ou invalide
+    if not access_token:
+        return None
+    try:
+        return auth.decode_token(access_token).get("sub")
+    except HTTPException:
+        return None
+
+class ConditionalPagesMiddleware:
+    '''
+    Middleware ASGI : ETag, Last-Modified et Cache-Control sur les pages du catalogue, 304 si la page n'a pas changé.
+    Les pages personnelles (servies seulement avec un token valide) sont privées et varient selon le cookie.
+    '''
+
+    def __init__(self, app, public: Iterable[str] = (), personal: Iterable[str] = (), max_age: Optional[int] = None):
+        self.app = app
+        self.pages = [(compile_path(path)[0], False) for path in public] + [(compile_path(path)[0], True) for path in personal]
+        self.max_age = config.HTTP_CACHE_MAX_AGE_SECONDS if max_age is None else max_age
+
+    def _page(self, path: str) -> Optional[bool]:
+        # True pour une page personnelle, False pour une page publique, None hors des pages du catalogue
+        for regex, personal in self.pages:
+            if regex.match(path):
+                return personal
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") or not config.HTTP_CACHE_ENABLED:
+            return await self.app(scope, receive, send)
+        personal = self._page(scope["path"])
+        if personal is None:
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        user = None
+        if personal:
+            user = _token_user(request.cookies.get("access_token"))
+            if user is None:
+                # Pas d'utilisateur : la route répond 401
+                return await self.app(scope, receive, send)
+
+        # Version lue avant la route : une page rendue pendant une modification porte l'ancienne version
+        version, modified = catalog_version(), crud.catalog_modified
+        headers = {
+            "ETag": catalog_etag(version, scope["path"], scope["query_string"].decode("latin-1"), user),
+            "Cache-Control": f"private, max-age={self.max_age}, must-revalidate" if personal
+                             else f"public, max-age={self.max_age}, must-revalidate",
+        }
+        if personal:
+            headers["Vary"] = "Cookie"
+        # Last-Modified à la seconde : envoyé seulement si aucune modification ne peut tomber dans la même seconde
+        last_modified = int(modified) + 1
+        if time.time() >= last_modified:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            fresh = etag_matches(if_none_match, headers["ETag"])
+        else:
+            # If-Modified-Since seulement sur les pages publiques : la date ne distingue pas les utilisateurs
+            if_modified_since = request.headers.get("if-modified-since")
+            fresh = not personal and if_modified_since is not None and not_modified_since(if_modified_since, modified)
+        if fresh:
+            return await Response(status_code=304, headers=headers)(scope, receive, send)
+
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                for key, value in headers.items():
+                    response_headers[key] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
@@ -0,0 +1,154 @@
+import os, secrets
+from dotenv import load_dotenv
+
+load_dotenv()  # take environment variables from .env (do not overver already defined vars)
+
+# Lecture typée des variables d'environnement
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Connexion à la base de données (engines créés au démarrage de l'application ou au premier usage, pas à l'import)
+SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
+# URL asyncio (déduite de SQLALCHEMY_DATABASE_URL si vide)
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv("SQLALCHEMY_ASYNC_DATABASE_URL")
+
+# Clé secrète utilisée pour signer les tokens
+SECRET_KEY = os.getenv("SECRET_KEY", "default_secret")
+
+# Déploiement dans les ETag (templates et version du catalogue propres à un démarrage) : tiré au hasard,
+# transmis par python main.py à ses workers ; à fixer pour plusieurs instances derrière un même cache
+DEPLOY_ID = os.getenv("DEPLOY_ID") or secrets.token_hex(4)
+
+# Serveur (python main.py) : processus uvicorn servant l'application
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = env_int("SERVER_PORT", 8000)
+WORKERS = env_int("WORKERS", 1)
+
+# Cohérence des caches entre workers : journal change_log écrit par chaque modification et lu par chaque worker
+CHANGE_LOG_ENABLED = env_bool("CHANGE_LOG_ENABLED", WORKERS > 1)
+CHANGE_POLL_INTERVAL_SECONDS = env_float("CHANGE_POLL_INTERVAL_SECONDS", 1.0)
+CHANGE_LOG_RETENTION_SECONDS = env_float("CHANGE_LOG_RETENTION_SECONDS", 3600)
+
+# Pagination du catalogue (nombre de livres par page)
+PAGE_SIZE_DEFAULT = env_int("PAGE_SIZE_DEFAULT", 20)
+PAGE_SIZE_MAX = env_int("PAGE_SIZE_MAX", 100)
+
+# Recherche par index de trigrammes en mémoire (sinon LIKE en base)
+SEARCH_INDEX_ENABLED = env_bool("SEARCH_INDEX_ENABLED", True)
+# Nombre de valeurs affichées par facette (genre, auteur) sur les résultats de recherche
+SEARCH_FACET_LIMIT = env_int("SEARCH_FACET_LIMIT", 20)
+
+# Hachage des mots de passe (pool de processus dédié)
+BCRYPT_ROUNDS = env_int("BCRYPT_ROUNDS", 12)
+# Par worker : les processus de hachage se partagent les CPU entre les WORKERS
+PASSWORD_HASH_WORKERS = env_int("PASSWORD_HASH_WORKERS", max(1, min(4, os.cpu_count() or 1) // WORKERS))
+PASSWORD_HASH_QUEUE_SIZE = env_int("PASSWORD_HASH_QUEUE_SIZE", 32)
+
+# Limitation des échecs de connexion (par IP et par nom d'utilisateur)
+LOGIN_MAX_FAILURES = env_int("LOGIN_MAX_FAILURES", 5)
+LOGIN_FAILURE_WINDOW_SECONDS = env_float("LOGIN_FAILURE_WINDOW_SECONDS", 300)
+
+# Cache des tokens décodés et des utilisateurs authentifiés
+AUTH_CACHE_SIZE = env_int("AUTH_CACHE_SIZE", 10000)
+AUTH_CACHE_TTL_SECONDS = env_float("AUTH_CACHE_TTL_SECONDS", 60)
+# Place l'id, l'email et le téléphone dans le token : la plupart des requêtes n'interrogent plus la base
+JWT_USER_CLAIMS = env_bool("JWT_USER_CLAIMS", False)
+
+# Cache des requêtes du catalogue (invalidé par version à chaque modification)
+CATALOG_CACHE_ENABLED = env_bool("CATALOG_CACHE_ENABLED", True)
+CATALOG_CACHE_MAX_ENTRIES = env_int("CATALOG_CACHE_MAX_ENTRIES", 2000)
+CATALOG_CACHE_MAX_ROWS = env_int("CATALOG_CACHE_MAX_ROWS", 100000)
+CATALOG_CACHE_TTL_SECONDS = env_float("CATALOG_CACHE_TTL_SECONDS", 300)
+
+# Nombre maximal d'emprunts en cours par utilisateur
+MAX_ACTIVE_LOANS = env_int("MAX_ACTIVE_LOANS", 6)
+
+# Pool de connexions SQLAlchemy
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env_float("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+# Connexions ouvertes au démarrage dans chaque pool (bornées à DB_POOL_SIZE, 0 : aucune)
+DB_POOL_PREWARM = env_int("DB_POOL_PREWARM", DB_POOL_SIZE)
+
+# Driver Oracle : pool de sessions oracledb.create_pool (à la place du pool SQLAlchemy) et options de fetch
+ORACLE_SESSION_POOL = env_bool("ORACLE_SESSION_POOL", False)
+ORACLE_POOL_MIN = env_int("ORACLE_POOL_MIN", 2)
+ORACLE_POOL_MAX = env_int("ORACLE_POOL_MAX", 10)
+ORACLE_POOL_INCREMENT = env_int("ORACLE_POOL_INCREMENT", 1)
+ORACLE_STMTCACHESIZE = env_int("ORACLE_STMTCACHESIZE", 50)
+ORACLE_ARRAYSIZE = env_int("ORACLE_ARRAYSIZE", 500)
+ORACLE_PREFETCHROWS = env_int("ORACLE_PREFETCHROWS", 20)
+
+# Import de livres en masse (lignes par lot, un lot = une transaction)
+IMPORT_BATCH_SIZE = env_int("IMPORT_BATCH_SIZE", 1000)
+IMPORT_MAX_ERRORS = env_int("IMPORT_MAX_ERRORS", 1000)
+
+# Export en flux (lignes lues et encodées à la fois)
+EXPORT_CHUNK_ROWS = env_int("EXPORT_CHUNK_ROWS", 1000)
+# Noms des utilisateurs autorisés à exporter tous les comptes et tous les emprunts (séparés par des virgules) ;
+# les autres n'exportent que leur propre compte et leurs emprunts
+EXPORT_ADMINS = {name.strip() for name in os.getenv("EXPORT_ADMINS", "").split(",") if name.strip()}
+
+# Scanner des emprunts en retard (tâche de fond, emprunts marqués par lots)
+OVERDUE_SCAN_ENABLED = env_bool("OVERDUE_SCAN_ENABLED", True)
+OVERDUE_SCAN_INTERVAL_SECONDS = env_float("OVERDUE_SCAN_INTERVAL_SECONDS", 300)
+OVERDUE_SCAN_BATCH_SIZE = env_int("OVERDUE_SCAN_BATCH_SIZE", 1000)
+
+# Rendu des pages du catalogue en flux (en-tête envoyé avant la lecture des livres)
+TEMPLATE_STREAMING = env_bool("TEMPLATE_STREAMING", True)
+TEMPLATE_STREAM_CHUNK_BYTES = env_int("TEMPLATE_STREAM_CHUNK_BYTES", 8192)
+
+# Requêtes conditionnelles sur les pages du catalogue (ETag / 304) et durée de fraîcheur annoncée aux caches
+HTTP_CACHE_ENABLED = env_bool("HTTP_CACHE_ENABLED", True)
+HTTP_CACHE_MAX_AGE_SECONDS = env_int("HTTP_CACHE_MAX_AGE_SECONDS", 0)
+
+# Fichiers statiques empreintés et précompressés (gzip, brotli si installé), construits au démarrage
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", "build/static")
+STATIC_PRECOMPRESS = env_bool("STATIC_PRECOMPRESS", True)
+
+# Complétion des titres et auteurs (/autocomplete) : entrées gardées en mémoire, clés par valeur, résultats par champ
+AUTOCOMPLETE_MAX_ENTRIES = env_int("AUTOCOMPLETE_MAX_ENTRIES", 300000)
+AUTOCOMPLETE_MAX_WORDS = env_int("AUTOCOMPLETE_MAX_WORDS", 3)
+AUTOCOMPLETE_LIMIT = env_int("AUTOCOMPLETE_LIMIT", 10)
+
+# Métriques Prometheus (/metrics) : requêtes HTTP par route, requêtes SQL par instruction normalisée
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+METRICS_MAX_STATEMENTS = env_int("METRICS_MAX_STATEMENTS", 500)
+
+# Profil des requêtes (en-tête Server-Timing, journal "profiling") : sur demande (en-tête) ou par échantillonnage
+PROFILING_ENABLED = env_bool("PROFILING_ENABLED", False)
+PROFILING_HEADER = os.getenv("PROFILING_HEADER", "X-Profile")
+PROFILING_SAMPLE_RATE = env_float("PROFILING_SAMPLE_RATE", 0.0)
+# Requêtes SQL journalisées au-delà de cette durée (0 : jamais) ; même instruction répétée au-delà du seuil : N+1
+SLOW_QUERY_MS = env_float("SLOW_QUERY_MS", 200)
+N_PLUS_ONE_THRESHOLD = env_int("N_PLUS_ONE_THRESHOLD", 10)
+
+# Démarrage : pools de connexions remplis, templates compilés, index construits et pool de hachage démarré
+# avant la première requête (sinon au premier usage)
+STARTUP_PREWARM = env_bool("STARTUP_PREWARM", True)
+
+def configure(**settings) -> None:
+    '''
+    Remplace des paramètres de ce module (create_app(settings)), par leur nom de variable d'environnement.
+    Les paramètres sont lus à l'usage ; ceux qui dimensionnent un cache ou un pool créé à l'import
+    (AUTH_CACHE_*, CATALOG_CACHE_*, BCRYPT_ROUNDS, PASSWORD_HASH_*, AUTOCOMPLETE_MAX_*) gardent leur valeur de départ.
+    :raise ValueError: nom de paramètre inconnu
+    '''
+    current = globals()
+    unknown = [name for name in settings if not name.isupper() or name not in current]
+    if unknown:
+        raise ValueError(f"Paramètres inconnus : {', '.join(sorted(unknown))}")
+    current.update(settings)
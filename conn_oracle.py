@@ -1,7 +1,5 @@
 import oracledb, os
-from dotenv import load_dotenv
-
-load_dotenv()  # take environment variables from .env (do not overver already defined vars)
+import config  # variables d'environnement du fichier .env
 
 # Connexion à la base de données Oracle
 conn = oracledb.connect(user=os.getenv('DATABASE_USER'),
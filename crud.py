@@ -1,42 +1,290 @@
-import os, models, schema
+import os, json, time, base64, binascii, functools, inspect, logging, threading, models, schema, config, search, autocomplete, database, profiling
+from contextlib import contextmanager
+from cache import TTLCache
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, select, func
+from sqlalchemy import create_engine, Column, Integer, String, select, insert, update, func, and_, or_, true
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker, joinedload
-from dotenv import load_dotenv
 from datetime import date
-from passlib.context import CryptContext
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-SQLALCHEMY_DATABASE_URL=os.getenv('SQLALCHEMY_DATABASE_URL')
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Engine synchrone, créé par get_engine (démarrage de l'application ou premier Session())
+_engine = None
+_engine_lock = threading.Lock()
 
-# Cryptage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_engine():
+    '''
+    Retourne l'engine synchrone, créé au premier appel : importer crud n'ouvre aucune connexion
+    et une URL invalide n'empêche pas l'import
+    '''
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not config.SQLALCHEMY_DATABASE_URL:
+                    raise RuntimeError("SQLALCHEMY_DATABASE_URL n'est pas défini")
+                engine = database.create_sync_engine(config.SQLALCHEMY_DATABASE_URL)
+                # Sessions liées avant la publication de l'engine (un autre thread peut l'utiliser aussitôt)
+                Session.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def dispose_engine() -> None:
+    '''
+    Ferme les connexions du pool (arrêt de l'application) ; l'engine suivant est créé avec la config du moment
+    '''
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+class _LazySessionmaker(sessionmaker):
+    # Crée l'engine au premier Session()
+    def __call__(self, **local_kw):
+        if _engine is None:
+            get_engine()
+        return super().__call__(**local_kw)
 
 # Gestion des sessions
-Session = sessionmaker(bind=engine)
+Session = _LazySessionmaker()
+
+def __getattr__(name: str):
+    # crud.engine : engine créé au premier accès
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_db():
+    '''
+    Dépendance FastAPI : une session par requête, partagée par les fonctions crud qui la reçoivent
+    (une seule connexion empruntée au pool pour toute la requête)
+    '''
+    with Session() as session:
+        yield session
+
+@contextmanager
+def _session_scope(session=None):
+    # Session de la requête si elle est fournie, sinon une session propre à l'appel
+    if session is not None:
+        yield session
+    else:
+        with Session() as session:
+            yield session
+
+# Colonnes autorisées pour le tri des pages de livres (pagination par curseur)
+SORT_COLUMNS = {
+    "id": models.Book.id,
+    "title": models.Book.title,
+    "author": models.Book.author,
+    "publication_date": models.Book.publication_date,
+}
+
+# Index de recherche en mémoire (titre, auteur, genre), construit au premier usage
+search_index = search.SearchIndex()
+
+# Complétion des titres et auteurs (tableaux triés en mémoire), construite au démarrage
+autocomplete_index = autocomplete.PrefixIndex(config.AUTOCOMPLETE_MAX_ENTRIES, config.AUTOCOMPLETE_MAX_WORDS)
+
+# Utilisateurs authentifiés (nom -> schema UserCreated), voir auth.get_current_user
+user_cache = TTLCache(config.AUTH_CACHE_SIZE, config.AUTH_CACHE_TTL_SECONDS)
+
+# Taille des listes IN (Oracle limite une liste à 1000 éléments)
+IN_CHUNK_SIZE = 500
+
+def _load_search_index() -> search.SearchIndex:
+    '''
+    Retourne l'index de recherche, construit depuis la table books s'il ne l'est pas encore
+    '''
+    if not search_index.ready:
+        with Session() as session:
+            columns = (models.Book.id, models.Book.title, models.Book.author, models.Book.kind, models.Book.publication_date,
+                       models.Book.availability)
+            search_index.build(lambda: session.execute(select(*columns).execution_options(yield_per=10000)))
+    return search_index
+
+def _load_autocomplete() -> autocomplete.PrefixIndex:
+    '''
+    Retourne l'index de complétion, construit depuis la table books s'il ne l'est pas encore
+    '''
+    if not autocomplete_index.ready:
+        with Session() as session:
+            columns = (models.Book.id, models.Book.title, models.Book.author)
+            autocomplete_index.build(lambda: session.execute(select(*columns).execution_options(yield_per=10000)))
+    return autocomplete_index
+
+# Version du catalogue : incrémentée à chaque modification, elle fait partie des clés du cache
+catalog_version = 0
+# Date de la dernière modification (démarrage du processus au départ), pour Last-Modified
+catalog_modified = time.time()
+_version_lock = threading.Lock()
+
+def _catalog_weight(value) -> int:
+    '''
+    Poids d'un résultat en cache : nombre de livres qu'il contient
+    '''
+    if isinstance(value, schema.BookPage):
+        return len(value.books) + 1
+    if isinstance(value, dict) and "books" in value:
+        return len(value["books"]) + 1
+    if isinstance(value, list):
+        return len(value) + 1
+    return 1
+
+# Résultats des requêtes du catalogue, bornés en nombre de livres (LRU) et en durée
+catalog_cache = TTLCache(config.CATALOG_CACHE_MAX_ENTRIES, config.CATALOG_CACHE_TTL_SECONDS,
+                         max_weight=config.CATALOG_CACHE_MAX_ROWS, weigher=_catalog_weight)
+_MISSING = object()
+
+def cached_catalog(name: str):
+    '''
+    Décorateur de lecture du catalogue (fonction ou coroutine) : le résultat est mis en cache
+    sous la clé (name, version du catalogue, arguments). crud et crud_async partagent les entrées
+    en utilisant le même name.
+    '''
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_for(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            # Version lue avant la requête : un résultat lu pendant une modification est rangé sous l'ancienne version
+            return (name, catalog_version, tuple(bound.arguments.items()))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not config.CATALOG_CACHE_ENABLED:
+                    return await func(*args, **kwargs)
+                key = key_for(args, kwargs)
+                value = catalog_cache.get(key, _MISSING)
+                if value is _MISSING:
+                    value = await func(*args, **kwargs)
+                    catalog_cache.set(key, value)
+                return value
+            # Clé du cache pour des arguments donnés (lectures en flux de crud_async)
+            async_wrapper.cache_key = lambda *args, **kwargs: key_for(args, kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.CATALOG_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = key_for(args, kwargs)
+            value = catalog_cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                catalog_cache.set(key, value)
+            return value
+        wrapper.cache_key = lambda *args, **kwargs: key_for(args, kwargs)
+        return wrapper
+    return decorator
+
+def catalog_stats() -> dict:
+    return {"version": catalog_version, **catalog_cache.stats()}
+
+def _catalog_changed(upserted: List[schema.BookCreated] = (), deleted: List[int] = (), availability: dict = None) -> None:
+    '''
+    Répercute une modification du catalogue (après commit) sur les structures en mémoire :
+    nouvelle version du catalogue (les résultats en cache deviennent inaccessibles) et index de recherche
+    :param upserted: livres créés ou modifiés
+    :param deleted: ids des livres supprimés
+    :param availability: disponibilité des livres empruntés ou rendus (id -> bool)
+    '''
+    global catalog_version, catalog_modified
+    with _version_lock:
+        catalog_version += 1
+        catalog_modified = time.time()
+    for book in upserted:
+        search_index.add(book.id, book.title, book.author, book.kind, book.publication_date, book.availability)
+        autocomplete_index.add(book.id, book.title, book.author)
+    for book_id in deleted:
+        search_index.remove(book_id)
+        autocomplete_index.remove(book_id)
+    for book_id, available in (availability or {}).items():
+        search_index.set_availability(book_id, available)
+
+# seq des lignes de change_log écrites par ce processus et pas encore relues par changes.feed :
+# le worker ne réapplique pas ses propres modifications et son ETag les distingue de celui des autres workers
+own_changes = set()
+
+def _insert_changes():
+    # INSERT (Core, executemany) qui retourne les seq attribués
+    return insert(models.ChangeLog.__table__).returning(models.ChangeLog.seq)
+
+def _change_rows(entity: str, ids) -> List[dict]:
+    # Lignes de change_log d'une modification (vide sans CHANGE_LOG_ENABLED)
+    if not config.CHANGE_LOG_ENABLED:
+        return []
+    return [{"entity": entity, "entity_id": entity_id} for entity_id in ids]
+
+def _record_changes(session, entity: str, ids) -> None:
+    '''
+    Inscrit la modification dans change_log, dans la transaction de session (juste avant son commit),
+    pour que les autres workers mettent à jour leurs caches et index (changes.py)
+    :param entity: models.CHANGE_BOOK ou models.CHANGE_USER
+    :param ids: ids modifiés
+    '''
+    rows = _change_rows(entity, ids)
+    if rows:
+        # Avant le commit : la ligne n'est pas encore visible de changes.feed
+        own_changes.update(session.scalars(_insert_changes(), rows))
+
+def refresh_books(book_ids) -> None:
+    '''
+    Relit des livres modifiés par un autre worker et les répercute comme une modification locale
+    (nouvelle version du catalogue, index de recherche et de complétion) ; un livre absent a été supprimé
+    :param book_ids: ids des livres modifiés
+    '''
+    book_ids = list(book_ids)
+    upserted = []
+    with Session() as session:
+        for start in range(0, len(book_ids), IN_CHUNK_SIZE):
+            books = session.scalars(select(models.Book).where(models.Book.id.in_(book_ids[start:start + IN_CHUNK_SIZE])))
+            upserted.extend(schema.BookCreated.model_validate(book, from_attributes=True) for book in books)
+    found = {book.id for book in upserted}
+    _catalog_changed(upserted=upserted, deleted=[book_id for book_id in book_ids if book_id not in found])
+
+def reset_caches() -> None:
+    '''
+    Vide le cache du catalogue, les index en mémoire (reconstruits au premier usage) et le cache des utilisateurs,
+    quand les modifications manquées ne peuvent plus être rejouées
+    '''
+    search_index.clear()
+    autocomplete_index.clear()
+    user_cache.clear()
+    _catalog_changed()
+
+def invalidate_user(user_id: int) -> None:
+    '''
+    Retire un utilisateur modifié du cache des utilisateurs authentifiés
+    '''
+    user_cache.discard_if(lambda username, user: user.id == user_id)
 
 # Ajout d'un nouvel utilisateur avec hashage de mot de passe
 def create_user(user: schema.UserCreate) -> schema.UserCreated:
     '''
     Crée un nouvel user
-    :param user: schema UserCreate
-    :return: schema UserCreate
+    :param user: schema UserCreate (mot de passe déjà haché)
+    :return: schema UserCreated
     '''
     with Session() as session:
-        # Vérification si l'utilisateur existe déjà dans la base de données par son email
-        user_in_db = session.query(models.User).filter(models.User.email == user.email).first()
+        # Vérification si l'utilisateur existe déjà dans la base de données par son nom ou son email
+        user_in_db = session.scalars(select(models.User.id).where(
+            or_(models.User.name == user.name, models.User.email == user.email)).limit(1)).first()
         if user_in_db:
             return None
 
-        # Hachage du mot de passe de l'utilisateur
-        hashed_password = pwd_context.hash(user.password)
-
         # Création du nouvel utilisateur avec les données fournies
         new_user = models.User(**user.model_dump())
         session.add(new_user)
-        session.commit()
+        try:
+            session.commit()
+        except IntegrityError:
+            # Inscription simultanée avec le même nom ou email (index uniques)
+            session.rollback()
+            return None
         session.refresh(new_user)
         return schema.UserCreated.model_validate(new_user, from_attributes=True)
 
@@ -53,10 +301,17 @@ def create_book(book: schema.BookCreate) -> schema.BookCreated:
             return None
         new_book = models.Book(**book.model_dump())
         session.add(new_book)
+        if config.CHANGE_LOG_ENABLED:
+            # id attribué par le flush, avant le commit
+            session.flush()
+            _record_changes(session, models.CHANGE_BOOK, [new_book.id])
         session.commit()
         session.refresh(new_book)
-        return schema.BookCreated.model_validate(new_book, from_attributes=True)
+        created = schema.BookCreated.model_validate(new_book, from_attributes=True)
+        _catalog_changed(upserted=[created])
+        return created
 
+@cached_catalog("all_books")
 def all_books() -> List[schema.BookCreated]:
     '''
     retourne tous les books
@@ -67,33 +322,212 @@ def all_books() -> List[schema.BookCreated]:
         books = session.query(models.Book).all()
         return [schema.BookCreated.model_validate(book, from_attributes=True) for book in books]
 
-def get_book_by_id(book_id) -> schema.BookCreated:
+def page_limit(limit: Optional[int]) -> int:
+    '''
+    Borne la taille de page demandée
+    :param limit: taille demandée (None ou <= 0 pour la valeur par défaut)
+    :return: taille comprise entre 1 et PAGE_SIZE_MAX
+    '''
+    if not limit or limit < 1:
+        return config.PAGE_SIZE_DEFAULT
+    return min(limit, config.PAGE_SIZE_MAX)
+
+def encode_cursor(book: schema.BookCreated, sort: str) -> str:
+    '''
+    Encode la position d'un livre (valeur de tri, id) en curseur opaque
+    :param book: dernier (ou premier) livre de la page
+    :param sort: colonne de tri
+    :return: curseur base64 utilisable dans une URL
+    '''
+    value = getattr(book, sort)
+    if isinstance(value, date):
+        value = value.isoformat()
+    return _pack([value, book.id])
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    '''
+    Décode un curseur produit par encode_cursor
+    :param cursor: curseur reçu dans l'URL
+    :param sort: colonne de tri
+    :return: tuple (valeur de tri, id)
+    '''
+    try:
+        value, book_id = _unpack(cursor)
+        if sort == "publication_date":
+            value = date.fromisoformat(value)
+        return value, int(book_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"Curseur de pagination invalide : {cursor}")
+
+def _pack(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _unpack(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise ValueError(f"Curseur de pagination invalide : {cursor}")
+    if not isinstance(values, list):
+        raise ValueError(f"Curseur de pagination invalide : {cursor}")
+    return values
+
+def _keyset(stmt, sort: str, after: Optional[str], before: Optional[str], limit: int):
+    '''
+    Applique le tri et le curseur à une requête sur models.Book.
+    Le filtre porte sur (colonne de tri, id) : le coût d'une page ne dépend pas de sa profondeur.
+    Une ligne de plus que la taille de page est lue pour savoir s'il reste des livres.
+    '''
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Tri inconnu : {sort}")
+    column = SORT_COLUMNS[sort]
+    backwards = before is not None
+    cursor = before if backwards else after
+
+    if cursor:
+        value, book_id = decode_cursor(cursor, sort)
+        if backwards:
+            condition = models.Book.id < book_id if sort == "id" else or_(column < value, and_(column == value, models.Book.id < book_id))
+        else:
+            condition = models.Book.id > book_id if sort == "id" else or_(column > value, and_(column == value, models.Book.id > book_id))
+        stmt = stmt.where(condition)
+
+    order = [column, models.Book.id] if sort != "id" else [models.Book.id]
+    if backwards:
+        order = [col.desc() for col in order]
+    return stmt.order_by(*order).limit(limit + 1)
+
+def _page_rows(rows, before: Optional[str], limit: int) -> tuple:
+    '''
+    Lignes lues par _keyset remises dans l'ordre d'affichage
+    :return: tuple (lignes de la page, il reste des livres au-delà dans le sens de lecture)
+    '''
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if before is not None:
+        rows.reverse()
+    return rows, has_more
+
+def _page_cursors(first, last, sort: str, after: Optional[str], before: Optional[str], has_more: bool) -> tuple:
+    '''
+    Curseurs d'une page non vide à partir de son premier et de son dernier livre (objet ou ligne)
+    :return: tuple (curseur suivant, curseur précédent)
+    '''
+    if before is not None:
+        return encode_cursor(last, sort), (encode_cursor(first, sort) if has_more else None)
+    return (encode_cursor(last, sort) if has_more else None), (encode_cursor(first, sort) if after else None)
+
+def _build_page(rows, sort: str, after: Optional[str], before: Optional[str], limit: int) -> schema.BookPage:
+    '''
+    Construit la page (livres + curseurs précédent/suivant) à partir des lignes lues par _keyset
+    '''
+    rows, has_more = _page_rows(rows, before, limit)
+    with profiling.section("serialization"):
+        books = [schema.BookCreated.model_validate(book, from_attributes=True) for book in rows]
+
+    next_cursor = prev_cursor = None
+    if books:
+        next_cursor, prev_cursor = _page_cursors(books[0], books[-1], sort, after, before, has_more)
+    return schema.BookPage(books=books, next_cursor=next_cursor, prev_cursor=prev_cursor, sort=sort, limit=limit)
+
+# Projection des livres pour l'API JSON : colonnes lues en base et clés du dictionnaire retourné.
+# Les dictionnaires ont la forme de schema.BookCreated, sans model_validate par ligne.
+BOOK_FIELDS = {
+    "id": models.Book.id,
+    "title": models.Book.title,
+    "author": models.Book.author,
+    "kind": models.Book.kind,
+    "publication_date": models.Book.publication_date,
+    "availability": models.Book.availability,
+}
+
+def parse_fields(fields: Optional[str], allowed) -> tuple:
+    '''
+    Champs demandés par ?fields=title,author (tous par défaut)
+    :param allowed: champs autorisés, dans l'ordre de la réponse
+    :return: tuple de noms de champs ; lève ValueError pour un champ inconnu
+    '''
+    if not fields:
+        return tuple(allowed)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Champ inconnu : {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field in requested)
+
+def _book_projection(fields: tuple, sort: str) -> list:
+    # Colonnes demandées, plus id et la colonne de tri pour les curseurs
+    names = set(fields) | {"id"}
+    if sort in SORT_COLUMNS:
+        names.add(sort)
+    return [column for name, column in BOOK_FIELDS.items() if name in names]
+
+def _book_record(row, fields: tuple) -> dict:
+    record = {field: getattr(row, field) for field in fields}
+    # Numeric(1) -> booléen, comme schema.BookCreated
+    if record.get("availability") is not None:
+        record["availability"] = bool(record["availability"])
+    return record
+
+def _build_records_page(rows, fields: tuple, sort: str, after: Optional[str], before: Optional[str], limit: int) -> dict:
+    '''
+    Équivalent de _build_page pour des lignes projetées : dictionnaire de la forme de schema.BookPage
+    '''
+    rows, has_more = _page_rows(rows, before, limit)
+    next_cursor = prev_cursor = None
+    if rows:
+        next_cursor, prev_cursor = _page_cursors(rows[0], rows[-1], sort, after, before, has_more)
+    with profiling.section("serialization"):
+        books = [_book_record(row, fields) for row in rows]
+    return {"books": books, "next_cursor": next_cursor, "prev_cursor": prev_cursor, "sort": sort, "limit": limit}
+
+@cached_catalog("books_page")
+def books_page(after: Optional[str] = None, before: Optional[str] = None, sort: str = "id", limit: Optional[int] = None) -> schema.BookPage:
+    '''
+    Retourne une page du catalogue (pagination par curseur)
+    :param after: curseur de la page suivante
+    :param before: curseur de la page précédente
+    :param sort: colonne de tri (id, title, author, publication_date)
+    :param limit: nombre de livres par page
+    :return: schema BookPage
+    '''
+    limit = page_limit(limit)
+    stmt = _keyset(select(models.Book), sort, after, before, limit)
+    with Session() as session:
+        rows = session.scalars(stmt).all()
+        return _build_page(rows, sort, after, before, limit)
+
+@cached_catalog("get_book_by_id")
+def get_book_by_id(book_id: int) -> Optional[schema.BookCreated]:
     '''
     retourne book de la base de données
     :param book_id: ID du book à modifier
-    :return: book
+    :return: schema BookCreated, None si absent
     '''
 
     with Session() as session:
-        book = session.query(models.Book).get(book_id)
-        return schema.BookCreated.model_validate(book, from_attributes=True)
+        book = session.get(models.Book, book_id)
+        return schema.BookCreated.model_validate(book, from_attributes=True) if book else None
 
+@cached_catalog("get_book_by_title")
 def get_book_by_title(book_title: str) ->schema.BookCreated:
     '''
     retouren book de la base de données
     :param book_title:  Title du book
-    :return: book
+    :return: book, None si aucun livre n'a ce titre
     '''
 
     with Session() as session:
         book = session.query(models.Book).filter(models.Book.title == book_title).first()
+        if book is None:
+            return None
         return schema.BookCreated.model_validate(book, from_attributes=True)
 
 def get_book_by_author(book_author: str) ->schema.BookCreated:
     '''
     retouren book de la base de données
     :param book_title:  Title du book
-    :return: book
+    :return: book, None si aucun livre n'a ce titre
     '''
 
     with Session() as session:
@@ -104,7 +538,7 @@ def get_book_by_kind(book_kind: str) ->schema.BookCreated:
     '''
     retouren book de la base de données
     :param book_title:  Title du book
-    :return: book
+    :return: book, None si aucun livre n'a ce titre
     '''
 
     with Session() as session:
@@ -112,61 +546,300 @@ def get_book_by_kind(book_kind: str) ->schema.BookCreated:
         if book:
             return schema.BookCreated.model_validate(book, from_attributes=True)
         else:
-            print(f"Aucun livre trouvé pour le genre : {book_kind}")
+            logger.debug("Aucun livre trouvé pour le genre : %s", book_kind)
             return None
 
-def get_emprunts_by_user(user_id: int) -> List[schema.EmpruntCreated]:
+# Relations chargées avec les emprunts (toutes celles que schema.EmpruntCreated sérialise) :
+# une seule requête avec jointures, quel que soit le nombre d'emprunts
+LOAN_LOADERS = (joinedload(models.Emprunt.user), joinedload(models.Emprunt.book))
+
+def _loans_of(user_id: int):
+    return (select(models.Emprunt)
+            .options(*LOAN_LOADERS)
+            .where(models.Emprunt.user_id == user_id)
+            .order_by(models.Emprunt.borrow_date.desc(), models.Emprunt.id.desc()))
+
+# Projection des emprunts pour l'API JSON (forme de schema.EmpruntCreated) ;
+# book n'ajoute la jointure sur books que s'il est demandé, user vient de l'utilisateur authentifié
+LOAN_FIELDS = {
+    "id": models.Emprunt.id,
+    "borrow_date": models.Emprunt.borrow_date,
+    "return_date": models.Emprunt.return_date,
+    "returned": models.Emprunt.returned,
+    "status": models.Emprunt.status,
+    "user": None,
+    "book": None,
+}
+
+def _loan_records_query(user_id: int, fields: tuple):
+    columns = [column for name, column in LOAN_FIELDS.items() if column is not None and (name in fields or name == "returned")]
+    stmt = select(*columns)
+    if "book" in fields:
+        stmt = stmt.add_columns(*(column.label(f"book_{name}") for name, column in BOOK_FIELDS.items()))
+        stmt = stmt.join(models.Book, models.Book.id == models.Emprunt.book_id)
+    return (stmt.where(models.Emprunt.user_id == user_id)
+            .order_by(models.Emprunt.borrow_date.desc(), models.Emprunt.id.desc()))
+
+def _loan_record(row, fields: tuple, user: Optional[dict]) -> dict:
+    record = {}
+    for field in fields:
+        if field == "book":
+            record["book"] = _book_record(_BookColumns(row), tuple(BOOK_FIELDS))
+        elif field == "user":
+            record["user"] = user
+        elif field == "returned":
+            record["returned"] = bool(row.returned) if row.returned is not None else None
+        else:
+            record[field] = getattr(row, field)
+    return record
+
+class _BookColumns:
+    # Vue des colonnes book_* d'une ligne d'emprunt sous les noms de BOOK_FIELDS
+    __slots__ = ("row",)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getattr__(self, name):
+        return getattr(self.row, f"book_{name}")
+
+def get_emprunts_by_user(user_id: int, session=None) -> List[schema.EmpruntCreated]:
     '''
-    Récupère tous les emprunts d'un utilisateur
+    Récupère tous les emprunts d'un utilisateur (du plus récent au plus ancien)
+    :param session: session de la requête (get_db), facultative
     '''
-    with Session() as session:
-        emprunts = session.query(models.Emprunt).filter(models.Emprunt.user_id == user_id).all()
-        return [schema.EmpruntCreated.model_validate(emprunt, from_attributes=True) for emprunt in emprunts]
+    with _session_scope(session) as session:
+        emprunts = session.scalars(_loans_of(user_id)).all()
+        with profiling.section("serialization"):
+            return [schema.EmpruntCreated.model_validate(emprunt, from_attributes=True) for emprunt in emprunts]
 
-def search_book(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None) -> List[schema.BookCreated]:
-    with Session() as session:
-        query = session.query(models.Book)
+def _search_criteria(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None) -> list:
+    '''
+    Construit les filtres de recherche sur le titre, l'auteur et le genre
+    '''
+    criteria = []
+    if title and title.strip():
+        criteria.append(func.lower(func.trim(models.Book.title)).like(f'%{title.strip().lower()}%'))
+
+    if author and author.strip():
+        criteria.append(func.lower(func.trim(models.Book.author)).like(f'%{author.strip().lower()}%'))
 
-        if title and title.strip():
-            query = query.filter(func.lower(func.trim(models.Book.title)).like(f'%{title.strip().lower()}%'))
+    if kind and kind.strip():
+        criteria.append(func.lower(func.trim(models.Book.kind)).like(f'%{kind.strip().lower()}%'))
+    return criteria
 
-        if author and author.strip():
-            query = query.filter(func.lower(func.trim(models.Book.author)).like(f'%{author.strip().lower()}%'))
+def _ids_chunks(book_ids: List[int]):
+    '''
+    Requêtes IN par paquets pour charger des livres par id
+    '''
+    for start in range(0, len(book_ids), IN_CHUNK_SIZE):
+        yield select(models.Book).where(models.Book.id.in_(book_ids[start:start + IN_CHUNK_SIZE]))
 
-        if kind and kind.strip():
-            query = query.filter(func.lower(func.trim(models.Book.kind)).like(f'%{kind.strip().lower()}%'))
+def _in_order(books, book_ids: List[int]) -> List[schema.BookCreated]:
+    found = {book.id: book for book in books}
+    with profiling.section("serialization"):
+        return [schema.BookCreated.model_validate(found[book_id], from_attributes=True) for book_id in book_ids if book_id in found]
 
-        # Exécuter la requête
-        books = query.all()
+def _books_by_ids(session, book_ids: List[int]) -> List[schema.BookCreated]:
+    '''
+    Charge des livres par id en conservant l'ordre donné
+    '''
+    books = [book for stmt in _ids_chunks(book_ids) for book in session.scalars(stmt)]
+    return _in_order(books, book_ids)
+
+@cached_catalog("search_book")
+def search_book(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None) -> List[schema.BookCreated]:
+    '''
+    Recherche des livres par titre, auteur et genre, sans tenir compte des accents,
+    les plus pertinents en premier (index en mémoire si SEARCH_INDEX_ENABLED)
+    :return: liste de schema BookCreated
+    '''
+    with Session() as session:
+        if config.SEARCH_INDEX_ENABLED:
+            entries = _load_search_index().search(title, author, kind)
+            books = _books_by_ids(session, [book_id for _, book_id in entries])
+        else:
+            query = session.query(models.Book).filter(*_search_criteria(title, author, kind))
+
+            # Exécuter la requête
+            books = [schema.BookCreated.model_validate(book, from_attributes=True) for book in query.all()]
 
         if not books:
-            print("Aucun livre trouvé avec les critères donnés.")
+            logger.debug("Aucun livre trouvé avec les critères donnés.")
             return []
 
-        return [schema.BookCreated.model_validate(book, from_attributes=True) for book in books]
+        return books
 
-def borrow_book(user_id: int, book_id: int, return_date: date):
+@cached_catalog("search_book_page")
+def search_book_page(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+                     after: Optional[str] = None, before: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                     facet_kind: Optional[str] = None, facet_author: Optional[str] = None, available: Optional[bool] = None) -> schema.BookPage:
     '''
-    Fonction pour qu'un utilisateur emprunte un livre
-    :param user_id: ID de l'utilisateur qui emprunte
-    :param book_id: ID du livre à emprunter
-    :return: l'emprunt créé ou un message d'erreur
+    Recherche paginée par curseur (mêmes critères que search_book)
+    :param after: curseur de la page suivante
+    :param before: curseur de la page précédente
+    :param sort: relevance (par défaut avec l'index), id, title, author ou publication_date
+    :param limit: nombre de livres par page
+    :param facet_kind: genre exact (valeur de facette)
+    :param facet_author: auteur exact (valeur de facette)
+    :param available: livres disponibles ou non
+    :return: schema BookPage, avec les comptes par facette si l'index est utilisé
     '''
+    limit = page_limit(limit)
+    filters = facet_filters(facet_kind, facet_author, available)
+    if config.SEARCH_INDEX_ENABLED:
+        return _search_index_page(title, author, kind, after, before, sort or "relevance", limit, filters)
+
+    sort = sort or "id"
+    stmt = _keyset(select(models.Book).where(*_search_criteria(title, author, kind), *_facet_criteria(filters)), sort, after, before, limit)
     with Session() as session:
-        # Vérifier si le livre existe et est disponible
-        book = session.query(models.Book).filter(models.Book.id == book_id).first()
+        rows = session.scalars(stmt).all()
+        return _build_page(rows, sort, after, before, limit)
 
-        # Créer l'emprunt avec la date d'emprunt actuelle
-        emprunt = models.Emprunt(user_id=user_id, book_id=book_id, borrow_date=date.today(), return_date=return_date)
-        session.add(emprunt)
+def facet_filters(facet_kind: Optional[str] = None, facet_author: Optional[str] = None, available: Optional[bool] = None) -> dict:
+    '''
+    Filtres de facettes renseignés, au format de SearchIndex.search
+    '''
+    filters = {"kind": facet_kind or None, "author": facet_author or None, "availability": available}
+    return {facet: value for facet, value in filters.items() if value is not None}
+
+def _facet_criteria(filters: dict) -> list:
+    # Filtres de facettes en SQL (recherche sans l'index, pas de comptes par facette)
+    criteria = []
+    if "kind" in filters:
+        criteria.append(func.lower(func.trim(models.Book.kind)) == filters["kind"].strip().lower())
+    if "author" in filters:
+        criteria.append(func.lower(func.trim(models.Book.author)) == filters["author"].strip().lower())
+    if "availability" in filters:
+        criteria.append(models.Book.availability == int(filters["availability"]))
+    return criteria
+
+def _facets(counts: dict) -> dict:
+    return {facet: [schema.FacetCount(value=value, count=count) for value, count in values] for facet, values in counts.items()}
+
+def _index_page_ids(title, author, kind, after, before, sort, limit, filters: Optional[dict] = None) -> tuple:
+    '''
+    Sélectionne dans l'index en mémoire les ids d'une page de résultats et compte les résultats par facette.
+    Le curseur est la clé de tri du premier ou dernier résultat de la page.
+    :return: tuple (ids de la page, curseur suivant, curseur précédent, {facette: [(valeur, nombre)]})
+    '''
+    after_key = _unpack(after) if after else None
+    before_key = _unpack(before) if before else None
+    try:
+        selected, has_more, counts = _load_search_index().search_page(title, author, kind, sort=sort, filters=filters,
+                                                                      after=after_key, before=before_key, limit=limit,
+                                                                      facet_limit=config.SEARCH_FACET_LIMIT)
+    except TypeError:
+        raise ValueError(f"Curseur de pagination invalide : {after or before}")
+
+    next_cursor = prev_cursor = None
+    if selected:
+        first, last = _pack(list(selected[0][0])), _pack(list(selected[-1][0]))
+        if before_key is not None:
+            next_cursor, prev_cursor = last, (first if has_more else None)
+        else:
+            next_cursor, prev_cursor = (last if has_more else None), (first if after_key is not None else None)
+    return [book_id for _, book_id in selected], next_cursor, prev_cursor, counts
 
-        # Marquer le livre comme indisponible
-        book.availability = False
+def _search_index_page(title, author, kind, after, before, sort, limit, filters: Optional[dict] = None) -> schema.BookPage:
+    '''
+    Page de résultats calculée dans l'index en mémoire : seuls les livres de la page sont lus en base.
+    '''
+    book_ids, next_cursor, prev_cursor, counts = _index_page_ids(title, author, kind, after, before, sort, limit, filters)
+    with Session() as session:
+        books = _books_by_ids(session, book_ids)
+    return schema.BookPage(books=books, next_cursor=next_cursor, prev_cursor=prev_cursor, sort=sort, limit=limit,
+                           facets=_facets(counts))
+
+# Requêtes de l'emprunt, partagées avec crud_async.
+# Ordre dans la transaction : réserver le livre (UPDATE conditionnel, prend le verrou d'écriture),
+# verrouiller l'utilisateur puis compter ses emprunts en cours, enfin insérer l'emprunt.
+
+def _claim_book(book_id: int):
+    # Ne modifie la ligne que si le livre est disponible : 0 ligne modifiée = déjà emprunté
+    return (update(models.Book)
+            .where(models.Book.id == book_id, models.Book.availability == 1)
+            .values(availability=0)
+            .execution_options(synchronize_session=False))
+
+def _lock_user(user_id: int):
+    # Sérialise les emprunts concurrents d'un même utilisateur (sans effet sous SQLite,
+    # où le verrou d'écriture pris par _claim_book suffit)
+    return select(models.User.id).where(models.User.id == user_id).with_for_update()
+
+def _active_loans(user_id: int):
+    return select(func.count(models.Emprunt.id)).where(models.Emprunt.user_id == user_id, models.Emprunt.returned == 0)
+
+def _insert_loan(user_id: int, book_id: int, return_date: date):
+    return (insert(models.Emprunt)
+            .values(user_id=user_id, book_id=book_id, borrow_date=date.today(), return_date=return_date, returned=0,
+                    status=models.LOAN_ACTIVE)
+            .returning(models.Emprunt.id))
+
+def _close_loan(user_id: int, book_id: int):
+    # Ne marque que l'emprunt en cours : 0 ligne modifiée = livre non emprunté par cet utilisateur
+    return (update(models.Emprunt)
+            .where(models.Emprunt.user_id == user_id, models.Emprunt.book_id == book_id, models.Emprunt.returned == 0)
+            .values(returned=1, status=models.LOAN_RETURNED)
+            .execution_options(synchronize_session=False))
+
+def _release_book(book_id: int):
+    return (update(models.Book)
+            .where(models.Book.id == book_id)
+            .values(availability=1)
+            .execution_options(synchronize_session=False))
+
+def _loan_ids(username: str, book_title: str):
+    # IDs de l'utilisateur et du livre en une requête (un exemplaire disponible en priorité)
+    return (select(models.User.id, models.Book.id)
+            .join(models.Book, true())
+            .where(models.User.name == username, models.Book.title == book_title)
+            .order_by(models.Book.availability.desc(), models.Book.id)
+            .limit(1))
+
+def active_loans_count(user_id: int, session=None) -> int:
+    '''
+    Nombre d'emprunts en cours (non retournés) d'un utilisateur
+    :param session: session de la requête (get_db), facultative
+    '''
+    with _session_scope(session) as session:
+        return session.scalar(_active_loans(user_id))
 
+def borrow_book(user_id: int, book_id: int, return_date: date, session=None) -> schema.BorrowResult:
+    '''
+    Fonction pour qu'un utilisateur emprunte un livre, en une seule transaction :
+    le livre n'est pris que s'il est disponible et la limite d'emprunts en cours est vérifiée
+    avant l'insertion, si bien que deux emprunts simultanés du même livre ne peuvent pas réussir tous les deux.
+    :param user_id: ID de l'utilisateur qui emprunte
+    :param book_id: ID du livre à emprunter
+    :param return_date: date de retour prévue
+    :param session: session de la requête (get_db), facultative ; la transaction est validée ici
+    :return: schema BorrowResult (statut, ID de l'emprunt créé)
+    '''
+    result = schema.BorrowResult(status=schema.BorrowStatus.borrowed, user_id=user_id, book_id=book_id)
+    with _session_scope(session) as session:
+        if session.execute(_claim_book(book_id)).rowcount == 0:
+            exists = session.get(models.Book, book_id) is not None
+            session.rollback()
+            result.status = schema.BorrowStatus.already_borrowed if exists else schema.BorrowStatus.not_found
+            return result
+
+        if session.execute(_lock_user(user_id)).first() is None:
+            session.rollback()
+            result.status = schema.BorrowStatus.not_found
+            return result
+
+        if session.scalar(_active_loans(user_id)) >= config.MAX_ACTIVE_LOANS:
+            session.rollback()
+            result.status = schema.BorrowStatus.limit_reached
+            return result
+
+        result.emprunt_id = session.scalar(_insert_loan(user_id, book_id, return_date))
+        _record_changes(session, models.CHANGE_BOOK, [book_id])
         session.commit()
-        session.refresh(emprunt)
 
-        return emprunt
+    _catalog_changed(availability={book_id: False})
+    return result
 
 
 
@@ -180,25 +853,22 @@ def get_users() -> [schema.UserCreated]:
         return [schema.UserCreated.model_validate(user, from_attributes=True) for user in users]
 
 # Connexion de l'utilisateur
-def connexion(username: str) -> models.User:
+def connexion(username: str, session=None) -> models.User:
     '''
     Récupère l'utilisateur de la base de données avec le nom d'utilisateur donné
+    :param session: session de la requête (get_db), facultative
     :return: User
     '''
-    with Session() as session:
+    with _session_scope(session) as session:
         user = session.query(models.User).filter(models.User.name == username).first()
         return user
 
-# Vérification du mot de passe
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 # Récupération de l'utilisateur
 def get_user(username: str):
     with Session() as session:
         return session.query(models.User).filter(models.User.name == username).first()
 
-def update_book(book_id: int, title: str, author: str, kind: str, publication_date: date) -> schema.BookCreated:
+def update_book(book_id: int, title: str, author: str, kind: str, publication_date: date) -> Optional[schema.BookCreated]:
     '''
     Met à jour un livre
     :param book_id: ID du book à modifier
@@ -206,10 +876,12 @@ def update_book(book_id: int, title: str, author: str, kind: str, publication_da
     :param author: Nouvel auteur
     :param kind: Nouveau genre
     :param publication_date: Nouvelle date de publication
-    :return: Book mis à jour
+    :return: Book mis à jour, None si le livre n'existe pas
     '''
     with Session() as session:
-        book = session.query(models.Book).filter(models.Book.id == book_id).first()
+        book = session.get(models.Book, book_id)
+        if book is None:
+            return None
 
         # Mise à jour des attributs
         book.title = title
@@ -218,60 +890,67 @@ def update_book(book_id: int, title: str, author: str, kind: str, publication_da
         book.publication_date = publication_date
 
         # Enregistrement des modifications
+        _record_changes(session, models.CHANGE_BOOK, [book_id])
         session.commit()
         session.refresh(book)
 
-        return schema.BookCreated.model_validate(book, from_attributes=True)
+        updated = schema.BookCreated.model_validate(book, from_attributes=True)
+        _catalog_changed(upserted=[updated])
+        return updated
 
 def delete_book(book_id: int) -> schema.BookCreated:
     '''
     Supprime un book
     :param book_id: ID du book à supprimer
-    :return: book supprimé
+    :return: book supprimé, None si le livre n'existe pas
     '''
     with Session() as session:
         book = session.query(models.Book).filter(models.Book.id == book_id).first()
+        if book is None:
+            return None
 
+        deleted = schema.BookCreated.model_validate(book, from_attributes=True)
 
         # Enregistrement des modifications
         session.delete(book)
+        _record_changes(session, models.CHANGE_BOOK, [book_id])
         session.commit()
 
-        return schema.BookCreated.model_validate(book, from_attributes=True)
+        _catalog_changed(deleted=[book_id])
+        return deleted
 
-def get_loan_by_user(user_id: int):
+def get_loan_by_user(user_id: int, session=None) -> tuple:
     '''
-
-    :param user_id:
-    :return:
+    Emprunts d'un utilisateur séparés en emprunts en cours et historique
+    :param user_id: ID de l'utilisateur
+    :param session: session de la requête (get_db), facultative
+    :return: tuple (emprunts en cours, emprunts retournés), listes de schema EmpruntCreated
     '''
-    with Session() as session:
-        emprunts = session.query(models.Emprunt).options(joinedload(models.Emprunt.book)).filter(models.Emprunt.user_id == user_id).all()
-        return emprunts
+    emprunts = get_emprunts_by_user(user_id, session)
+    current = [emprunt for emprunt in emprunts if not emprunt.returned]
+    history = [emprunt for emprunt in emprunts if emprunt.returned]
+    return current, history
 
-def return_book(user_id: int, book_id: int):
+def return_book(user_id: int, book_id: int, session=None) -> schema.BorrowResult:
     '''
-    Fonction pour retourner un livre emprunté.
+    Fonction pour retourner un livre emprunté, en une transaction :
+    l'emprunt en cours est clos puis le livre redevient disponible.
     :param user_id: ID de l'utilisateur qui retourne le livre
     :param book_id: ID du livre à retourner
-    :return: Dictionnaire avec le statut de l'opération
+    :param session: session de la requête (get_db), facultative ; la transaction est validée ici
+    :return: schema BorrowResult (statut returned, ou not_borrowed si aucun emprunt en cours)
     '''
-    with Session() as session:
-        # Trouver l'emprunt correspondant (non retourné)
-        emprunt = session.query(models.Emprunt).filter(
-            models.Emprunt.user_id == user_id,
-            models.Emprunt.book_id == book_id,
-            models.Emprunt.returned == False
-        ).first()
-
-        # Mettre à jour l'état de l'emprunt pour indiquer qu'il est retourné
-        emprunt.returned = True
+    result = schema.BorrowResult(status=schema.BorrowStatus.returned, user_id=user_id, book_id=book_id)
+    with _session_scope(session) as session:
+        if session.execute(_close_loan(user_id, book_id)).rowcount == 0:
+            session.rollback()
+            result.status = schema.BorrowStatus.not_borrowed
+            return result
 
         # Rendre le livre disponible à nouveau
-        book = session.query(models.Book).filter(models.Book.id == book_id).first()
-        if book:
-            book.availability = True
-
-        # Sauvegarder les modifications
+        session.execute(_release_book(book_id))
+        _record_changes(session, models.CHANGE_BOOK, [book_id])
         session.commit()
-        return {"message": "Livre retourné avec succès."}
\ No newline at end of file
+
+    _catalog_changed(availability={book_id: True})
+    return result
\ No newline at end of file
@@ -0,0 +1,453 @@
+import os, asyncio, threading, models, schema, crud, config, database, profiling
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from datetime import date
+
+# Drivers asyncio équivalents aux drivers synchrones
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "oracle": "oracle+oracledb_async",
+}
+
+def async_database_url(url: str) -> str:
+    '''
+    Déduit l'URL asyncio de l'URL synchrone (sqlite -> sqlite+aiosqlite, oracle -> oracle+oracledb_async)
+    :param url: SQLALCHEMY_DATABASE_URL
+    :return: URL utilisable par create_async_engine
+    '''
+    sync_url = make_url(url)
+    backend = sync_url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Pas de driver asyncio connu pour {backend}, définir SQLALCHEMY_ASYNC_DATABASE_URL")
+    return sync_url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Engine asyncio, créé par get_async_engine (démarrage de l'application ou premier AsyncSession())
+_async_engine = None
+_engine_lock = threading.Lock()
+
+def get_async_engine():
+    '''
+    Retourne l'engine asyncio, créé au premier appel (aucune connexion n'est ouverte à l'import)
+    '''
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                if not (config.SQLALCHEMY_ASYNC_DATABASE_URL or config.SQLALCHEMY_DATABASE_URL):
+                    raise RuntimeError("SQLALCHEMY_DATABASE_URL n'est pas défini")
+                url = config.SQLALCHEMY_ASYNC_DATABASE_URL or async_database_url(config.SQLALCHEMY_DATABASE_URL)
+                engine = database.create_async_engine_for(url)
+                AsyncSession.configure(bind=engine)
+                _async_engine = engine
+    return _async_engine
+
+async def dispose_engine() -> None:
+    '''
+    Ferme les connexions du pool asyncio (arrêt de l'application) ; l'engine suivant est créé avec la config du moment
+    '''
+    global _async_engine
+    engine, _async_engine = _async_engine, None
+    if engine is not None:
+        await engine.dispose()
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    # Crée l'engine au premier AsyncSession()
+    def __call__(self, **local_kw):
+        if _async_engine is None:
+            get_async_engine()
+        return super().__call__(**local_kw)
+
+# Gestion des sessions asyncio (les objets restent lisibles après commit)
+AsyncSession = _LazyAsyncSessionmaker(expire_on_commit=False)
+
+def __getattr__(name: str):
+    # crud_async.async_engine : engine créé au premier accès
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def get_async_db():
+    '''
+    Dépendance FastAPI : une session asyncio par requête, partagée par les fonctions qui la reçoivent.
+    La connexion n'est empruntée au pool qu'à la première requête SQL.
+    '''
+    async with AsyncSession() as session:
+        yield session
+
+@asynccontextmanager
+async def _session_scope(session=None):
+    # Session de la requête si elle est fournie, sinon une session propre à l'appel
+    if session is not None:
+        yield session
+    else:
+        async with AsyncSession() as session:
+            yield session
+
+# Les fonctions suivantes sont les équivalents asyncio de celles de crud.py :
+# mêmes requêtes, mêmes schémas retournés, sans occuper de thread pendant l'aller-retour en base.
+
+@crud.cached_catalog("all_books")
+async def all_books() -> List[schema.BookCreated]:
+    '''
+    retourne tous les books
+    :return: liste de schema BookCreated
+    '''
+    async with AsyncSession() as session:
+        books = (await session.scalars(select(models.Book))).all()
+        with profiling.section("serialization"):
+            return [schema.BookCreated.model_validate(book, from_attributes=True) for book in books]
+
+@crud.cached_catalog("books_page")
+async def books_page(after: Optional[str] = None, before: Optional[str] = None, sort: str = "id", limit: Optional[int] = None) -> schema.BookPage:
+    '''
+    Retourne une page du catalogue (voir crud.books_page)
+    :return: schema BookPage
+    '''
+    limit = crud.page_limit(limit)
+    stmt = crud._keyset(select(models.Book), sort, after, before, limit)
+    async with AsyncSession() as session:
+        rows = (await session.scalars(stmt)).all()
+        return crud._build_page(rows, sort, after, before, limit)
+
+async def _books_by_ids(session, book_ids: List[int]) -> List[schema.BookCreated]:
+    books = []
+    for stmt in crud._ids_chunks(book_ids):
+        books.extend((await session.scalars(stmt)).all())
+    return crud._in_order(books, book_ids)
+
+@crud.cached_catalog("search_book_page")
+async def search_book_page(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+                           after: Optional[str] = None, before: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                           facet_kind: Optional[str] = None, facet_author: Optional[str] = None, available: Optional[bool] = None) -> schema.BookPage:
+    '''
+    Recherche paginée par curseur, filtres et comptes par facette (voir crud.search_book_page)
+    :return: schema BookPage
+    '''
+    limit = crud.page_limit(limit)
+    filters = crud.facet_filters(facet_kind, facet_author, available)
+    if crud.config.SEARCH_INDEX_ENABLED:
+        sort = sort or "relevance"
+        # Recherche dans l'index (et sa première construction, qui lit toute la table) hors de la boucle d'événements
+        book_ids, next_cursor, prev_cursor, counts = await asyncio.to_thread(crud._index_page_ids, title, author, kind, after, before,
+                                                                             sort, limit, filters)
+        async with AsyncSession() as session:
+            books = await _books_by_ids(session, book_ids)
+        return schema.BookPage(books=books, next_cursor=next_cursor, prev_cursor=prev_cursor, sort=sort, limit=limit,
+                               facets=crud._facets(counts))
+
+    sort = sort or "id"
+    stmt = crud._keyset(select(models.Book).where(*crud._search_criteria(title, author, kind), *crud._facet_criteria(filters)),
+                        sort, after, before, limit)
+    async with AsyncSession() as session:
+        rows = (await session.scalars(stmt)).all()
+        return crud._build_page(rows, sort, after, before, limit)
+
+class LazyBookPage:
+    '''
+    Page du catalogue pour le rendu en flux (rendering.py) : les livres sont lus pendant que le template
+    parcourt `books`, ligne par ligne avec un curseur côté serveur. next_cursor et prev_cursor sont renseignés
+    une fois la liste parcourue (la pagination est incluse après la boucle des templates).
+    La page lue est ensuite rangée dans le cache du catalogue, comme par books_page / search_book_page.
+    '''
+
+    def __init__(self, stmt, sort: str, after: Optional[str], before: Optional[str], limit: int,
+                 book_ids: Optional[List[int]] = None, next_cursor: Optional[str] = None, prev_cursor: Optional[str] = None,
+                 facets: Optional[dict] = None, cache_key=None):
+        self.sort = sort
+        self.limit = limit
+        # Comptes par facette, connus avant la lecture (index de recherche)
+        self.facets = facets
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._stmt = stmt
+        self._after = after
+        self._before = before
+        self._book_ids = book_ids
+        self._cache_key = cache_key
+
+    @property
+    def books(self):
+        return self._books()
+
+    async def _books(self):
+        books = []
+        async with AsyncSession() as session:
+            result = await session.stream_scalars(self._stmt)
+            if self._book_ids is not None:
+                # Page de l'index de recherche : au plus limit livres, remis dans l'ordre de l'index
+                books = crud._in_order(await result.all(), self._book_ids)
+                for book in books:
+                    yield book
+            elif self._before is not None:
+                # Page précédente : lignes lues à l'envers, remises dans l'ordre avant l'affichage
+                page = crud._build_page(await result.all(), self.sort, self._after, self._before, self.limit)
+                books, self.next_cursor, self.prev_cursor = page.books, page.next_cursor, page.prev_cursor
+                for book in books:
+                    yield book
+            else:
+                has_more = False
+                async for row in result:
+                    # La ligne de plus lue par _keyset indique seulement qu'il reste des livres
+                    if len(books) == self.limit:
+                        has_more = True
+                        break
+                    with profiling.section("serialization"):
+                        book = schema.BookCreated.model_validate(row, from_attributes=True)
+                    books.append(book)
+                    yield book
+                await result.close()
+                if books:
+                    self.next_cursor, self.prev_cursor = crud._page_cursors(books[0], books[-1], self.sort, self._after, None, has_more)
+
+        if self._cache_key is not None and crud.config.CATALOG_CACHE_ENABLED:
+            crud.catalog_cache.set(self._cache_key, schema.BookPage(books=books, next_cursor=self.next_cursor, prev_cursor=self.prev_cursor,
+                                                                    sort=self.sort, limit=self.limit, facets=self.facets))
+
+def _cached_page(reader, *args, **kwargs):
+    # Page déjà en cache pour ces arguments (même clé que reader), sinon (None, clé)
+    if not crud.config.CATALOG_CACHE_ENABLED:
+        return None, None
+    key = reader.cache_key(*args, **kwargs)
+    return crud.catalog_cache.get(key, None), key
+
+async def books_page_stream(after: Optional[str] = None, before: Optional[str] = None, sort: str = "id", limit: Optional[int] = None):
+    '''
+    Page du catalogue pour le rendu en flux (voir books_page)
+    :return: schema BookPage si la page est en cache, sinon LazyBookPage ; lève ValueError avant toute lecture
+             si le tri ou le curseur est invalide
+    '''
+    page, key = _cached_page(books_page, after=after, before=before, sort=sort, limit=limit)
+    if page is not None:
+        return page
+    limit = crud.page_limit(limit)
+    stmt = crud._keyset(select(models.Book), sort, after, before, limit)
+    return LazyBookPage(stmt, sort, after, before, limit, cache_key=key)
+
+async def search_book_page_stream(title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+                                  after: Optional[str] = None, before: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                                  facet_kind: Optional[str] = None, facet_author: Optional[str] = None, available: Optional[bool] = None):
+    '''
+    Recherche paginée pour le rendu en flux (voir search_book_page)
+    :return: schema BookPage si la page est en cache, sinon LazyBookPage ; lève ValueError avant toute lecture
+    '''
+    page, key = _cached_page(search_book_page, title=title, author=author, kind=kind, after=after, before=before, sort=sort, limit=limit,
+                             facet_kind=facet_kind, facet_author=facet_author, available=available)
+    if page is not None:
+        return page
+    limit = crud.page_limit(limit)
+    filters = crud.facet_filters(facet_kind, facet_author, available)
+    if crud.config.SEARCH_INDEX_ENABLED:
+        sort = sort or "relevance"
+        # Ids, curseurs et facettes calculés dans l'index en mémoire, dans un thread ; seuls les livres de la page sont lus en base
+        book_ids, next_cursor, prev_cursor, counts = await asyncio.to_thread(crud._index_page_ids, title, author, kind, after, before,
+                                                                             sort, limit, filters)
+        stmt = select(models.Book).where(models.Book.id.in_(book_ids))
+        return LazyBookPage(stmt, sort, after, before, limit, book_ids=book_ids, next_cursor=next_cursor,
+                            prev_cursor=prev_cursor, facets=crud._facets(counts), cache_key=key)
+
+    sort = sort or "id"
+    stmt = crud._keyset(select(models.Book).where(*crud._search_criteria(title, author, kind), *crud._facet_criteria(filters)),
+                        sort, after, before, limit)
+    return LazyBookPage(stmt, sort, after, before, limit, cache_key=key)
+
+# Lectures de l'API JSON : colonnes projetées (fields), dictionnaires de la forme des schémas, sans objets ORM
+
+@crud.cached_catalog("book_records_page")
+async def book_records_page(fields: tuple, after: Optional[str] = None, before: Optional[str] = None,
+                            sort: str = "id", limit: Optional[int] = None) -> dict:
+    '''
+    Page du catalogue réduite aux champs demandés (voir books_page)
+    :param fields: champs des livres (crud.parse_fields)
+    :return: dictionnaire de la forme de schema.BookPage
+    '''
+    limit = crud.page_limit(limit)
+    stmt = crud._keyset(select(*crud._book_projection(fields, sort)), sort, after, before, limit)
+    async with AsyncSession() as session:
+        rows = (await session.execute(stmt)).all()
+    return crud._build_records_page(rows, fields, sort, after, before, limit)
+
+@crud.cached_catalog("search_book_records_page")
+async def search_book_records_page(fields: tuple, title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+                                   after: Optional[str] = None, before: Optional[str] = None, sort: Optional[str] = None,
+                                   limit: Optional[int] = None, facet_kind: Optional[str] = None, facet_author: Optional[str] = None,
+                                   available: Optional[bool] = None) -> dict:
+    '''
+    Recherche paginée réduite aux champs demandés (voir search_book_page)
+    :return: dictionnaire de la forme de schema.BookPage
+    '''
+    limit = crud.page_limit(limit)
+    filters = crud.facet_filters(facet_kind, facet_author, available)
+    if crud.config.SEARCH_INDEX_ENABLED:
+        sort = sort or "relevance"
+        book_ids, next_cursor, prev_cursor, counts = await asyncio.to_thread(crud._index_page_ids, title, author, kind, after, before,
+                                                                             sort, limit, filters)
+        columns = crud._book_projection(fields, sort)
+        found = {}
+        async with AsyncSession() as session:
+            for start in range(0, len(book_ids), crud.IN_CHUNK_SIZE):
+                chunk = book_ids[start:start + crud.IN_CHUNK_SIZE]
+                found.update((row.id, row) for row in await session.execute(select(*columns).where(models.Book.id.in_(chunk))))
+        books = [crud._book_record(found[book_id], fields) for book_id in book_ids if book_id in found]
+        return {"books": books, "next_cursor": next_cursor, "prev_cursor": prev_cursor, "sort": sort, "limit": limit,
+                "facets": {facet: [{"value": value, "count": count} for value, count in values] for facet, values in counts.items()}}
+
+    sort = sort or "id"
+    stmt = crud._keyset(select(*crud._book_projection(fields, sort)).where(*crud._search_criteria(title, author, kind), *crud._facet_criteria(filters)),
+                        sort, after, before, limit)
+    async with AsyncSession() as session:
+        rows = (await session.execute(stmt)).all()
+    return crud._build_records_page(rows, fields, sort, after, before, limit)
+
+async def loan_records(user: schema.UserCreated, fields: tuple, session=None) -> dict:
+    '''
+    Emprunts d'un utilisateur réduits aux champs demandés, séparés comme crud.get_loan_by_user
+    :param user: utilisateur authentifié (champ user des emprunts)
+    :param fields: champs des emprunts (crud.parse_fields sur crud.LOAN_FIELDS)
+    :param session: session de la requête (get_async_db), facultative
+    :return: dictionnaire {"current": [...], "history": [...]}
+    '''
+    owner = user.model_dump() if "user" in fields else None
+    current, history = [], []
+    async with _session_scope(session) as session:
+        rows = await session.execute(crud._loan_records_query(user.id, fields))
+        with profiling.section("serialization"):
+            for row in rows:
+                (history if row.returned else current).append(crud._loan_record(row, fields, owner))
+    return {"current": current, "history": history}
+
+@crud.cached_catalog("get_book_by_title")
+async def get_book_by_title(book_title: str) -> schema.BookCreated:
+    '''
+    retourne book de la base de données
+    :param book_title:  Title du book
+    :return: book, None si aucun livre n'a ce titre
+    '''
+    async with AsyncSession() as session:
+        book = (await session.scalars(select(models.Book).where(models.Book.title == book_title).limit(1))).first()
+        if book is None:
+            return None
+        return schema.BookCreated.model_validate(book, from_attributes=True)
+
+@crud.cached_catalog("get_book_by_id")
+async def get_book_by_id(book_id: int) -> Optional[schema.BookCreated]:
+    '''
+    retourne book de la base de données
+    :param book_id: ID du book
+    :return: schema BookCreated, None si absent
+    '''
+    async with AsyncSession() as session:
+        book = await session.get(models.Book, book_id)
+        return schema.BookCreated.model_validate(book, from_attributes=True) if book else None
+
+async def connexion(username: str, session=None) -> models.User:
+    '''
+    Récupère l'utilisateur de la base de données avec le nom d'utilisateur donné
+    :param session: session de la requête (get_async_db), facultative
+    :return: User
+    '''
+    async with _session_scope(session) as session:
+        return (await session.scalars(select(models.User).where(models.User.name == username).limit(1))).first()
+
+async def _record_changes(session, entity: str, ids) -> None:
+    # crud._record_changes sur une session asyncio
+    rows = crud._change_rows(entity, ids)
+    if rows:
+        crud.own_changes.update(await session.scalars(crud._insert_changes(), rows))
+
+async def _borrow(session, user_id: int, book_id: int, return_date: date) -> schema.BorrowResult:
+    # Même transaction que crud.borrow_book : réservation conditionnelle, limite, insertion
+    result = schema.BorrowResult(status=schema.BorrowStatus.borrowed, user_id=user_id, book_id=book_id)
+    if (await session.execute(crud._claim_book(book_id))).rowcount == 0:
+        exists = await session.get(models.Book, book_id) is not None
+        await session.rollback()
+        result.status = schema.BorrowStatus.already_borrowed if exists else schema.BorrowStatus.not_found
+        return result
+
+    if (await session.execute(crud._lock_user(user_id))).first() is None:
+        await session.rollback()
+        result.status = schema.BorrowStatus.not_found
+        return result
+
+    if await session.scalar(crud._active_loans(user_id)) >= crud.config.MAX_ACTIVE_LOANS:
+        await session.rollback()
+        result.status = schema.BorrowStatus.limit_reached
+        return result
+
+    result.emprunt_id = await session.scalar(crud._insert_loan(user_id, book_id, return_date))
+    await _record_changes(session, models.CHANGE_BOOK, [book_id])
+    await session.commit()
+    crud._catalog_changed(availability={book_id: False})
+    return result
+
+async def active_loans_count(user_id: int, session=None) -> int:
+    '''
+    Nombre d'emprunts en cours (non retournés) d'un utilisateur
+    :param session: session de la requête (get_async_db), facultative
+    '''
+    async with _session_scope(session) as session:
+        return await session.scalar(crud._active_loans(user_id))
+
+async def borrow_book(user_id: int, book_id: int, return_date: date, session=None) -> schema.BorrowResult:
+    '''
+    Fonction pour qu'un utilisateur emprunte un livre (voir crud.borrow_book)
+    :param user_id: ID de l'utilisateur qui emprunte
+    :param book_id: ID du livre à emprunter
+    :param return_date: date de retour prévue
+    :param session: session de la requête (get_async_db), facultative ; la transaction est validée ici
+    :return: schema BorrowResult
+    '''
+    async with _session_scope(session) as session:
+        return await _borrow(session, user_id, book_id, return_date)
+
+async def borrow_book_by_title(username: str, book_title: str, return_date: date) -> schema.BorrowResult:
+    '''
+    Emprunt à partir du nom d'utilisateur et du titre : la résolution des IDs et l'emprunt
+    se font dans la même session
+    :param username: nom de l'utilisateur qui emprunte
+    :param book_title: titre du livre à emprunter
+    :param return_date: date de retour prévue
+    :return: schema BorrowResult
+    '''
+    async with AsyncSession() as session:
+        ids = (await session.execute(crud._loan_ids(username, book_title))).first()
+        if ids is None:
+            return schema.BorrowResult(status=schema.BorrowStatus.not_found)
+        return await _borrow(session, ids[0], ids[1], return_date)
+
+async def return_book(user_id: int, book_id: int, session=None) -> schema.BorrowResult:
+    '''
+    Fonction pour retourner un livre emprunté (voir crud.return_book)
+    :param user_id: ID de l'utilisateur qui retourne le livre
+    :param book_id: ID du livre à retourner
+    :param session: session de la requête (get_async_db), facultative ; la transaction est validée ici
+    :return: schema BorrowResult (statut returned, ou not_borrowed si aucun emprunt en cours)
+    '''
+    result = schema.BorrowResult(status=schema.BorrowStatus.returned, user_id=user_id, book_id=book_id)
+    async with _session_scope(session) as session:
+        if (await session.execute(crud._close_loan(user_id, book_id))).rowcount == 0:
+            await session.rollback()
+            result.status = schema.BorrowStatus.not_borrowed
+            return result
+
+        # Rendre le livre disponible à nouveau
+        await session.execute(crud._release_book(book_id))
+        await _record_changes(session, models.CHANGE_BOOK, [book_id])
+        await session.commit()
+
+    crud._catalog_changed(availability={book_id: True})
+    return result
+
+async def update_user_password(user_id: int, hashed_password: str) -> None:
+    '''
+    Remplace le hachage du mot de passe d'un utilisateur (rehachage à la connexion)
+    :param user_id: ID de l'utilisateur
+    :param hashed_password: nouveau hachage
+    '''
+    async with AsyncSession() as session:
+        await session.execute(update(models.User).where(models.User.id == user_id).values(password=hashed_password))
+        await _record_changes(session, models.CHANGE_USER, [user_id])
+        await session.commit()
+    crud.invalidate_user(user_id)
@@ -0,0 +1,274 @@
+import os, threading, time
+from collections import deque
+from contextlib import AsyncExitStack, ExitStack, contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+import config, metrics, profiling
+
+class PoolTelemetry:
+    '''
+    Compteurs d'un pool de connexions : attente pour obtenir une connexion (checkout),
+    connexions ouvertes, checkouts, timeouts. Les gauges (en cours d'utilisation,
+    overflow) sont lues sur le pool au moment de la consultation.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=2048)
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            count = len(waits)
+        percentile = lambda q: round(waits[min(count - 1, int(q * count))] * 1000, 3) if waits else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "timeouts": self.timeouts,
+            "wait_total_ms": round(self.wait_total * 1000, 3),
+            "wait_p50_ms": percentile(0.50),
+            "wait_p99_ms": percentile(0.99),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+class _TimedPool:
+    '''
+    Mesure le temps passé à obtenir une connexion du pool (attente + ouverture éventuelle)
+    '''
+    telemetry = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record_wait(time.perf_counter() - started, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+# Engines suivis (nom -> (engine, compteurs)), pour les statistiques
+engines = {}
+_oracle_pools = {}
+
+def pool_options() -> dict:
+    '''
+    Options de pool de create_engine lues dans l'environnement
+    '''
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+def _configure_oracle_driver() -> None:
+    '''
+    Options du driver oracledb : cache de requêtes préparées, taille des lots de fetch et de prefetch
+    '''
+    import oracledb
+    oracledb.defaults.stmtcachesize = config.ORACLE_STMTCACHESIZE
+    oracledb.defaults.arraysize = config.ORACLE_ARRAYSIZE
+    oracledb.defaults.prefetchrows = config.ORACLE_PREFETCHROWS
+
+def oracle_pool():
+    '''
+    Pool de sessions oracledb (oracledb.create_pool), créé une seule fois
+    '''
+    if "default" not in _oracle_pools:
+        import oracledb
+        _configure_oracle_driver()
+        _oracle_pools["default"] = oracledb.create_pool(
+            user=os.getenv('DATABASE_USER'),
+            password=os.getenv('DATABASE_PASSWORD'),
+            dsn=os.getenv('DATABASE_DSN'),
+            min=config.ORACLE_POOL_MIN,
+            max=config.ORACLE_POOL_MAX,
+            increment=config.ORACLE_POOL_INCREMENT,
+            timeout=config.DB_POOL_RECYCLE,
+            ping_interval=0 if config.DB_POOL_PRE_PING else -1,
+        )
+    return _oracle_pools["default"]
+
+def _instrument(name: str, engine, telemetry: PoolTelemetry):
+    '''
+    Branche les compteurs sur l'engine (synchrone ou asyncio) et l'enregistre pour pool_stats
+    '''
+    sync_engine = getattr(engine, "sync_engine", engine)
+    sync_engine.pool.telemetry = telemetry
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        telemetry.checkouts += 1
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        telemetry.connects += 1
+
+    # Nombre et durée des requêtes SQL (/metrics)
+    metrics.instrument_engine(sync_engine, name)
+    # Temps SQL du profil de requête et journal des requêtes lentes
+    profiling.instrument_engine(sync_engine)
+    engines[name] = (engine, telemetry)
+    return engine
+
+def create_sync_engine(url: str, name: str = "sync"):
+    '''
+    Crée l'engine synchrone avec le pool configuré.
+    Pour Oracle avec ORACLE_SESSION_POOL, les connexions viennent d'un pool de sessions
+    oracledb (SQLAlchemy ne fait alors plus de pooling).
+    '''
+    sa_url = make_url(url)
+    telemetry = PoolTelemetry()
+    backend = sa_url.get_backend_name()
+
+    if backend == "oracle" and config.ORACLE_SESSION_POOL:
+        session_pool = oracle_pool()
+
+        def acquire():
+            started = time.perf_counter()
+            try:
+                return session_pool.acquire()
+            finally:
+                telemetry.record_wait(time.perf_counter() - started)
+
+        engine = create_engine("oracle+oracledb://", creator=acquire, poolclass=NullPool)
+        return _instrument(name, engine, telemetry)
+
+    if backend == "oracle":
+        _configure_oracle_driver()
+    if backend == "sqlite" and sa_url.database in (None, "", ":memory:"):
+        # Base en mémoire : un pool de connexions n'aurait pas de sens
+        return _instrument(name, create_engine(url), telemetry)
+
+    engine = create_engine(url, poolclass=TimedQueuePool, **pool_options())
+    return _instrument(name, engine, telemetry)
+
+def create_async_engine_for(url: str, name: str = "async"):
+    '''
+    Crée l'engine asyncio avec le même dimensionnement de pool que l'engine synchrone
+    '''
+    telemetry = PoolTelemetry()
+    if make_url(url).get_backend_name() == "oracle":
+        _configure_oracle_driver()
+    engine = create_async_engine(url, poolclass=TimedAsyncQueuePool, **pool_options())
+    return _instrument(name, engine, telemetry)
+
+def _prewarm_count(engine, connections: int) -> int:
+    # Au plus la taille du pool : une connexion d'overflow serait fermée dès son retour
+    pool = getattr(engine, "sync_engine", engine).pool
+    if isinstance(pool, QueuePool):
+        return max(0, min(connections, pool.size()))
+    # Pas de pool (sessions Oracle, SQLite en mémoire) : une connexion vérifie seulement la base
+    return min(connections, 1)
+
+def prewarm_pool(engine, connections: int) -> int:
+    '''
+    Ouvre des connexions ensemble puis les rend au pool : les premières requêtes n'attendent pas leur ouverture
+    :param connections: connexions voulues (bornées à la taille du pool)
+    :return: connexions ouvertes
+    '''
+    count = _prewarm_count(engine, connections)
+    with ExitStack() as stack:
+        for _ in range(count):
+            stack.enter_context(engine.connect())
+    return count
+
+async def prewarm_async_pool(engine, connections: int) -> int:
+    '''
+    prewarm_pool pour un engine asyncio
+    '''
+    count = _prewarm_count(engine, connections)
+    async with AsyncExitStack() as stack:
+        for _ in range(count):
+            await stack.enter_async_context(engine.connect())
+    return count
+
+def pool_stats() -> dict:
+    '''
+    Gauges et compteurs de chaque pool : taille, connexions utilisées, overflow, attente au checkout
+    '''
+    stats = {}
+    for name, (engine, telemetry) in engines.items():
+        pool = getattr(engine, "sync_engine", engine).pool
+        entry = {"pool": type(pool).__name__, **telemetry.stats()}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "in_use": pool.checkedout(),
+                "overflow": max(0, pool.overflow()),
+            })
+        elif "default" in _oracle_pools and isinstance(pool, NullPool):
+            session_pool = _oracle_pools["default"]
+            entry.update({"size": session_pool.opened, "in_use": session_pool.busy, "max": session_pool.max})
+        stats[name] = entry
+    return stats
+
+class QueryCount:
+    '''
+    Requêtes SQL exécutées dans un bloc count_queries
+    '''
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+@contextmanager
+def count_queries(engine, expected: int = None):
+    '''
+    Compte les requêtes SQL exécutées sur l'engine (synchrone ou asyncio) pendant le bloc.
+    Si expected est donné, lève AssertionError à la sortie quand le nombre diffère
+    (pour vérifier qu'une fonction crud fait un nombre fixe de requêtes, sans N+1).
+    :param engine: engine surveillé
+    :param expected: nombre de requêtes attendu
+    :return: QueryCount (count, statements)
+    '''
+    sync_engine = getattr(engine, "sync_engine", engine)
+    queries = QueryCount()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.statements.append(statement)
+        queries.parameters.append(None if executemany else parameters)
+
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    if expected is not None and queries.count != expected:
+        raise AssertionError(f"{queries.count} requêtes SQL au lieu de {expected} :\n" + "\n".join(queries.statements))
@@ -0,0 +1,133 @@
+'''
+Export en flux des livres, des utilisateurs (sans le hachage du mot de passe) et des emprunts,
+en CSV ou NDJSON, éventuellement compressé en gzip. Utilisateurs et emprunts sont limités au compte
+du demandeur, sauf pour les administrateurs de l'export (EXPORT_ADMINS).
+
+Les lignes sont lues par paquets avec un curseur côté serveur (yield_per) et encodées paquet par paquet :
+la mémoire utilisée ne dépend pas de la taille de la table.
+'''
+import csv, io, json, zlib
+from datetime import date
+from typing import Iterator, Optional
+from sqlalchemy import select
+import models, config, crud
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Colonnes exportées par entité, colonne de date filtrée par date_from / date_to
+# et colonne de l'utilisateur propriétaire des lignes (données personnelles)
+ENTITIES = {
+    "books": {
+        "columns": (models.Book.id, models.Book.title, models.Book.author, models.Book.kind,
+                    models.Book.publication_date, models.Book.availability),
+        "date": models.Book.publication_date,
+        "owner": None,
+    },
+    "users": {
+        "columns": (models.User.id, models.User.name, models.User.email, models.User.phone),
+        "date": None,
+        "owner": models.User.id,
+    },
+    "emprunts": {
+        "columns": (models.Emprunt.id, models.Emprunt.user_id, models.Emprunt.book_id, models.Emprunt.borrow_date,
+                    models.Emprunt.return_date, models.Emprunt.returned),
+        "date": models.Emprunt.borrow_date,
+        "owner": models.Emprunt.user_id,
+    },
+}
+
+# Colonnes Numeric(1) exportées comme booléens
+BOOLEAN_COLUMNS = {"availability", "returned"}
+
+def is_export_admin(user) -> bool:
+    '''
+    Utilisateur autorisé à exporter les données personnelles de tous les comptes (EXPORT_ADMINS)
+    '''
+    return user.name in config.EXPORT_ADMINS
+
+def export_query(entity: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 available: Optional[bool] = None, returned: Optional[bool] = None, user_id: Optional[int] = None):
+    '''
+    Requête d'export d'une entité avec ses filtres
+    :param entity: "books", "users" ou "emprunts"
+    :param date_from: date minimale (publication pour les livres, emprunt pour les emprunts)
+    :param date_to: date maximale
+    :param available: livres disponibles ou non
+    :param returned: emprunts retournés ou non
+    :param user_id: limite utilisateurs et emprunts à ce compte (None : tous les comptes)
+    :return: requête select ; lève ValueError si l'entité ou un filtre ne s'applique pas
+    '''
+    if entity not in ENTITIES:
+        raise ValueError(f"Entité inconnue : {entity}")
+    spec = ENTITIES[entity]
+    stmt = select(*spec["columns"]).order_by(spec["columns"][0])
+    if user_id is not None and spec["owner"] is not None:
+        stmt = stmt.where(spec["owner"] == user_id)
+
+    if date_from is not None or date_to is not None:
+        if spec["date"] is None:
+            raise ValueError(f"Pas de filtre de date pour {entity}")
+        if date_from is not None:
+            stmt = stmt.where(spec["date"] >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(spec["date"] <= date_to)
+    if available is not None:
+        if entity != "books":
+            raise ValueError("Le filtre available ne s'applique qu'aux livres")
+        stmt = stmt.where(models.Book.availability == int(available))
+    if returned is not None:
+        if entity != "emprunts":
+            raise ValueError("Le filtre returned ne s'applique qu'aux emprunts")
+        stmt = stmt.where(models.Emprunt.returned == int(returned))
+    return stmt
+
+def _records(keys: list, rows) -> Iterator[dict]:
+    for row in rows:
+        record = dict(zip(keys, row))
+        for key in BOOLEAN_COLUMNS.intersection(record):
+            if record[key] is not None:
+                record[key] = bool(record[key])
+        yield record
+
+def _encode_csv(keys: list, rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(keys)
+    writer.writerows([record[key] for key in keys] for record in _records(keys, rows))
+    return buffer.getvalue().encode()
+
+def _encode_ndjson(keys: list, rows, header: bool) -> bytes:
+    return "".join(json.dumps(record, default=str, ensure_ascii=False) + "\n" for record in _records(keys, rows)).encode()
+
+def stream_export(stmt, fmt: str, compress: bool = False, chunk_rows: Optional[int] = None) -> Iterator[bytes]:
+    '''
+    Exécute la requête avec un curseur côté serveur et encode le résultat paquet par paquet
+    :param stmt: requête de export_query
+    :param fmt: "csv" ou "ndjson"
+    :param compress: compresse le flux en gzip
+    :param chunk_rows: lignes lues et encodées à la fois (EXPORT_CHUNK_ROWS par défaut)
+    :return: itérateur de morceaux d'octets
+    '''
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 : en-tête gzip
+    keys = [column.key for column in stmt.selected_columns]
+
+    with crud.engine.connect() as connection:
+        result = connection.execution_options(yield_per=chunk_rows or config.EXPORT_CHUNK_ROWS).execute(stmt)
+        header = True
+        for rows in result.partitions():
+            chunk = encode(keys, rows, header)
+            header = False
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if header and fmt == "csv":
+            # Aucune ligne : l'en-tête seul
+            chunk = encode(keys, [], True)
+            yield compressor.compress(chunk) if compressor is not None else chunk
+    if compressor is not None:
+        yield compressor.flush()
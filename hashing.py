@@ -0,0 +1,182 @@
+import asyncio, multiprocessing, threading, time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+import config
+
+class HashingPoolSaturated(Exception):
+    '''
+    Levée quand la file d'attente du pool de hachage est pleine (la requête doit être rejetée)
+    '''
+
+def make_context(rounds: int) -> CryptContext:
+    '''
+    Contexte bcrypt avec le coût donné ; les hachages d'un coût différent sont signalés comme à refaire
+    '''
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+# Contexte partagé par toute l'application (même coût que les workers)
+pwd_context = make_context(config.BCRYPT_ROUNDS)
+
+# Contexte des processus workers, initialisé par _init_worker
+_worker_context = None
+
+def _init_worker(rounds: int) -> None:
+    global _worker_context
+    _worker_context = make_context(rounds)
+
+def _hash(password: str) -> str:
+    return _worker_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return _worker_context.verify_and_update(password, hashed_password)
+
+class HashingPool:
+    '''
+    Pool de processus dédié au hachage et à la vérification bcrypt.
+    Les appels en cours et en attente sont bornés à workers + queue_size : au-delà,
+    HashingPoolSaturated est levée immédiatement au lieu d'allonger la file.
+    Avec workers=0 le hachage se fait dans un thread (développement, tests).
+    '''
+
+    def __init__(self, workers: int, queue_size: int, rounds: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._latencies = deque(maxlen=1024)
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self.workers == 0:
+            if _worker_context is None:
+                _init_worker(self.rounds)
+            return None  # exécuteur par défaut de la boucle (threads)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.rounds,),
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= max(self.workers, 1) + self.queue_size:
+                self.rejected += 1
+                raise HashingPoolSaturated()
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # Un worker est mort : le pool sera recréé au prochain appel
+            self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._latencies.append(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        '''
+        Hache un mot de passe dans le pool
+        :return: hachage bcrypt
+        '''
+        return await self._submit(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        '''
+        Vérifie un mot de passe dans le pool
+        :return: tuple (mot de passe correct, nouveau hachage si l'ancien est à refaire sinon None)
+        '''
+        return await self._submit(_verify_and_update, password, hashed_password)
+
+    def warm_up(self) -> None:
+        '''
+        Démarre les processus workers avant le premier appel
+        '''
+        executor = self._get_executor()
+        if executor is not None:
+            for future in [executor.submit(_hash, "warm-up") for _ in range(self.workers)]:
+                future.result()
+
+    def stats(self) -> dict:
+        '''
+        File d'attente et latences (ms) du pool
+        '''
+        with self._lock:
+            latencies = sorted(self._latencies)
+            pending = self._pending
+        percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else 0.0
+        return {
+            "workers": self.workers,
+            "in_flight": pending,
+            "queue_depth": max(0, pending - max(self.workers, 1)),
+            "queue_size": self.queue_size,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+class LoginThrottle:
+    '''
+    Limite les échecs de connexion par clé (adresse IP, nom d'utilisateur) sur une fenêtre glissante.
+    Le nombre de clés suivies est borné : les plus anciennes sont oubliées en premier.
+    '''
+
+    def __init__(self, max_failures: int, window_seconds: float, max_keys: int = 100000):
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._failures = OrderedDict()
+
+    def retry_after(self, *keys: str) -> float:
+        '''
+        :return: secondes à attendre avant une nouvelle tentative (0 si autorisée)
+        '''
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in keys:
+                failures = self._failures.get(key)
+                if not failures:
+                    continue
+                while failures and failures[0] <= now - self.window_seconds:
+                    failures.popleft()
+                if len(failures) >= self.max_failures:
+                    wait = max(wait, failures[0] + self.window_seconds - now)
+        return wait
+
+    def failure(self, *keys: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                failures = self._failures.setdefault(key, deque(maxlen=self.max_failures))
+                failures.append(now)
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def reset(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+pool = HashingPool(config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_QUEUE_SIZE, config.BCRYPT_ROUNDS)
+login_throttle = LoginThrottle(config.LOGIN_MAX_FAILURES, config.LOGIN_FAILURE_WINDOW_SECONDS)
@@ -1,97 +1,96 @@
 from typing import Union, Optional, List
+from contextlib import asynccontextmanager
 from datetime import datetime, date, timedelta
-from fastapi import FastAPI, Request, Form, Depends,HTTPException, Cookie
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, FastAPI, Request, Form, Depends,HTTPException, Cookie, UploadFile, File
+from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse, Response, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from hashing import HashingPoolSaturated
+from auth import ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from pydantic import ValidationError
-from passlib.context import CryptContext
-from dotenv import load_dotenv
 from schema import UserLogin
-import os,schema, uvicorn, crud
+import io, os, math, time, asyncio, logging, models, schema, uvicorn, crud, crud_async, config, hashing, auth, database, catalog_import, export, overdue, rendering, conditional, static_assets, api, metrics, profiling, startup, changes
 
-# Chargement des variables d'environnement
-load_dotenv()
-SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
-
-# Clé secrète utilisée pour signer les tokens
-SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret')
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Cryptage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # Utilisation du token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Instancie FastAPI
-app = FastAPI()
-# Traitement des fichiers statics (HTML, CSS, JS, IMAGES ...)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Démarrage et arrêt de l'application
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engines, pools de connexions, templates et index prêts avant la première requête
+    await startup.warm_up(templates.env, streaming_templates.env, assets=app.state.static_assets)
+    if config.OVERDUE_SCAN_ENABLED:
+        overdue.scanner.start()
+    # Modifications faites par les autres workers (mode multi-workers)
+    if config.CHANGE_LOG_ENABLED:
+        changes.feed.start()
+    yield
+    await changes.feed.stop()
+    await overdue.scanner.stop()
+    await startup.shutdown()
+
+# Routes des pages HTML, incluses par create_app
+router = APIRouter()
 # Traitement des templates (Jinja2)
-templates = Jinja2Templates(directory="templates")
-
-# Vérification et hachage des mots de passe
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-# Création du token JWT
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-# Récupération de l'utilisateur dans la base de données
-def get_user(username: str):
-    return crud.connexion(username)
-
-# Authentification de l'utilisateur
-def authenticate_user(username: str, password: str):
-    if not username or not password:
-        raise HTTPException(status_code=400, detail="Nom d'utilisateur et mot de passe requis.")
-    user = get_user(username)
-    if not user or not verify_password(password, user.password):
-        return False
-    return user
-
-# Obtenir l'utilisateur actuel
-def get_current_user(access_token: str = Cookie(None)) -> schema.UserCreated:
-    if access_token is None:
-        raise HTTPException(status_code=401, detail="Token is missing")
-    try:
-        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token: missing username")
-        user = crud.connexion(username)
-        if user is None:
-            raise HTTPException(status_code=401, detail="Invalid token: user not found")
-    except JWTError as e:
-        raise HTTPException(status_code=401, detail=f"Token decoding error: {str(e)}")
-    return schema.UserCreated.model_validate(user, from_attributes=True)
+templates = rendering.Templates(directory="templates")
+# Rendu en flux des pages du catalogue (mêmes templates)
+streaming_templates = rendering.StreamingTemplates(templates)
 
+def catalog_response(name: str, context: dict):
+    '''
+    Réponse des pages listant le catalogue : rendue en flux si TEMPLATE_STREAMING,
+    sinon rendue en une fois (la page de livres est alors déjà lue)
+    '''
+    if config.TEMPLATE_STREAMING:
+        return streaming_templates.TemplateResponse(name, context)
+    return templates.TemplateResponse(name, context)
+
+# Tris proposés sous les listes de livres
+SORT_OPTIONS = [("id", "Ajout"), ("title", "Titre"), ("author", "Auteur"), ("publication_date", "Publication")]
+
+def search_sort_options() -> list:
+    # Tri par pertinence avec l'index seulement (config lue à chaque requête : create_app(settings) peut la changer)
+    return [("relevance", "Pertinence")] + SORT_OPTIONS if config.SEARCH_INDEX_ENABLED else SORT_OPTIONS
+
+# Récupération d'une page du catalogue
+async def get_books_page(
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        sort: str = "id",
+        limit: Optional[int] = None
+) -> schema.BookPage:
+    '''
+    Dépendance commune aux pages listant le catalogue
+    :param after: curseur de la page suivante
+    :param before: curseur de la page précédente
+    :param sort: colonne de tri (id, title, author, publication_date)
+    :param limit: nombre de livres par page
+    :return: schema BookPage, ou crud_async.LazyBookPage lue pendant le rendu si TEMPLATE_STREAMING
+    '''
+    try:
+        if config.TEMPLATE_STREAMING:
+            return await crud_async.books_page_stream(after=after, before=before, sort=sort, limit=limit)
+        return await crud_async.books_page(after=after, before=before, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Route pour la page d'accueil
 
-@app.get("/", response_class=HTMLResponse)
-def read_root(request: Request):
+@router.get("/", response_class=HTMLResponse)
+async def read_root(request: Request, page: schema.BookPage = Depends(get_books_page)):
     '''
     Traitement du GET /
     :param request: L'objet Request pour Jinja2
+    :param page: La page de livres à afficher
     :return: redirection vers /templates/index.html
     '''
-    books =  crud.all_books()
-    return templates.TemplateResponse("index.html", {"request": request, "books": books})
+    return catalog_response("index.html", {"request": request, "books": page.books, "page": page})
 
 # Route pour la page de connexion
-@app.get("/login", response_class=HTMLResponse, name="connexion")
+@router.get("/login", response_class=HTMLResponse, name="connexion")
 def connexion_page(request: Request):
     '''
     Traitement du GET /
@@ -101,7 +100,7 @@ def connexion_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 # Route pour la page d'inscription
-@app.get("/inscription", response_class=HTMLResponse, name="inscription_page")
+@router.get("/inscription", response_class=HTMLResponse, name="inscription_page")
 def inscription_page(request: Request):
     '''
     Traitement du GET /
@@ -111,31 +110,30 @@ def inscription_page(request: Request):
     return templates.TemplateResponse("registration.html", {"request": request})
 
 # Route de la page user connecté
-@app.get("/user/{username}", response_model=schema.UserCreated)
+@router.get("/user/{username}", response_model=schema.UserCreated)
 def user_page(
         request: Request,
-        current_user: schema.UserCreated = Depends(get_current_user)
+        current_user: schema.UserCreated = Depends(get_current_user),
+        page: schema.BookPage = Depends(get_books_page)
 ):
 
     '''
     Affiche la page d'accueil pour un utilisateur connecté avec la liste de livres
     :param request: L'objet Request pour Jinja2
     :param current_user: L'utilisateur actuellement connecté
+    :param page: La page de livres à afficher
     :return: redirection vers /templates/user.html
     '''
 
-    books = crud.all_books()
-    if books is None:
-        books = []
-
-    # Retourner le template avec la liste des livres
-    return templates.TemplateResponse("user.html", {"request": request, "user": current_user, "books": books})
+    # Retourner le template avec la page de livres
+    return catalog_response("user.html", {"request": request, "user": current_user, "books": page.books, "page": page})
 
 # Route pour afficher les livres empruntés et l'historique d'un utilisateur
-@app.get("/users/{username}/emprunts", name="gestion_emprunts")
+@router.get("/users/{username}/emprunts", name="gestion_emprunts")
 def read_emprunts(
         request: Request,
-        username: str
+        username: str,
+        db=Depends(crud.get_db)
 ):
     '''
 
@@ -145,21 +143,35 @@ def read_emprunts(
     '''
 
     # Récupérer l'utilisateur par son nom
-    user = crud.connexion(username)
+    user = crud.connexion(username, db)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    # Récupérer les emprunts de l'utilisateur depuis la base de données
-    user_emprunts = crud.get_loan_by_user(user.id)
+    # Récupérer les emprunts en cours et l'historique de l'utilisateur (une requête)
+    current_emprunts, history_emprunts = crud.get_loan_by_user(user.id, db)
+    overdue_count = sum(1 for emprunt in current_emprunts if emprunt.status == models.LOAN_OVERDUE)
 
     # Passer les emprunts et les informations au template HTML
     return templates.TemplateResponse("management_loans.html", {
         "request": request,
         "user": user,
-        "emprunts": user_emprunts
+        "current_emprunts": current_emprunts,
+        "history_emprunts": history_emprunts,
+        "overdue_count": overdue_count
     })
 
+# Route des emprunts en retard
+@router.get("/emprunts_en_retard", name="overdue_loans")
+def overdue_loans(db=Depends(crud.get_db)):
+    '''
+    Nombre d'emprunts en retard par utilisateur (marqués par le scanner des retards)
+    :return: dictionnaire JSON user_id -> nombre d'emprunts en retard
+    '''
+    return overdue.overdue_counts(db)
+
 # Route formulaire d'inscription
-@app.post("/submit_signup", response_class=HTMLResponse, name="submit_signup")
-def submit_signup(
+@router.post("/submit_signup", response_class=HTMLResponse, name="submit_signup")
+async def submit_signup(
         request: Request,
         name: str = Form(...),
         email: str = Form(...),
@@ -171,14 +183,21 @@ def submit_signup(
     if password != confirm_password:
         return templates.TemplateResponse("registration.html", {"request": request, "error": "Les mots de passe ne correspondent pas"})
 
-    # Utilisation du schéma Pydantic pour valider et créer l'utilisateur
+    # Utilisation du schéma Pydantic pour valider l'utilisateur (mot de passe en clair)
     try:
-        user = schema.UserCreate.create_user(name=name, email=email, phone=phone, password=password)
+        user = schema.UserCreate(name=name, email=email, phone=phone, password=password)
     except ValidationError as e:
         # Gestion des erreurs de validation
         return templates.TemplateResponse("registration.html", {"request": request, "error": "Erreur de validation des données : " + str(e.errors())})
 
-    new_user = crud.create_user(user)
+    # Hachage du mot de passe dans le pool dédié
+    try:
+        with profiling.section("hashing"):
+            user.password = await hashing.pool.hash(password)
+    except HashingPoolSaturated:
+        raise HTTPException(status_code=503, detail="Service surchargé, réessayez dans un instant", headers={"Retry-After": "1"})
+
+    new_user = await run_in_threadpool(crud.create_user, user)
 
     if new_user is None:
         return templates.TemplateResponse("registration.html", {"request": request, "error": "L'utilisateur existe déjà"})
@@ -187,8 +206,8 @@ def submit_signup(
     return RedirectResponse(url="/login", status_code=303)
 
 # Route pour la connexion
-@app.post("/login", response_class=HTMLResponse, name="connecte")
-def login(
+@router.post("/login", response_class=HTMLResponse, name="connecte")
+async def login(
         request: Request,
         user_data: UserLogin =  Depends(UserLogin.as_form)
 ):
@@ -200,13 +219,34 @@ def login(
     :return: Redirection vers la page user.html en cas de succès, ou renvoi sur la page de connexion avec erreur
     '''
 
-    user = crud.connexion(user_data.username)
-    if not user or not pwd_context.verify(user_data.password, user.password):
+    # Limitation des échecs répétés par adresse IP et par nom d'utilisateur
+    throttle_keys = (f"ip:{request.client.host if request.client else ''}", f"user:{user_data.username}")
+    retry_after = hashing.login_throttle.retry_after(*throttle_keys)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Trop de tentatives de connexion, réessayez plus tard", headers={"Retry-After": str(math.ceil(retry_after))})
+
+    user = await crud_async.connexion(user_data.username)
+
+    # bcrypt est coûteux en CPU : vérification dans le pool de hachage
+    valid, new_hash = False, None
+    if user:
+        try:
+            with profiling.section("hashing"):
+                valid, new_hash = await hashing.pool.verify(user_data.password, user.password)
+        except HashingPoolSaturated:
+            raise HTTPException(status_code=503, detail="Service surchargé, réessayez dans un instant", headers={"Retry-After": "1"})
+    if not valid:
+        hashing.login_throttle.failure(*throttle_keys)
         raise HTTPException(status_code=401, detail="Nom d'utilisateur ou mot de passe incorrect")
+    hashing.login_throttle.reset(throttle_keys[1])
+
+    # Hachage obsolète (coût bcrypt modifié) : remplacé de façon transparente
+    if new_hash:
+        await crud_async.update_user_password(user.id, new_hash)
 
     # Génération du token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.name}, expires_delta=access_token_expires)
+    access_token = create_access_token(data=auth.token_claims(user), expires_delta=access_token_expires)
 
     # Stockage du token dans un cookie
     response = RedirectResponse(url=f"/user/{user.name}", status_code=303)
@@ -214,30 +254,34 @@ def login(
     return response
 
 # Route de déconnexion
-@app.post("/logout", response_class=HTMLResponse, name="logout")
+@router.post("/logout", response_class=HTMLResponse, name="logout")
 def logout(request: Request):
     response = RedirectResponse(url="/", status_code=303)  # Rediriger vers la page de connexion
     response.delete_cookie("access_token")  # Supprimez le cookie contenant le token
     return response
 
 #Route pour la gestion des livres
-@app.get("/gestion_des_livres", response_class=HTMLResponse, name="gestion_livres")
-def gestion_livres(request: Request, current_user: schema.UserCreated = Depends(get_current_user)):
+@router.get("/gestion_des_livres", response_class=HTMLResponse, name="gestion_livres")
+def gestion_livres(
+        request: Request,
+        current_user: schema.UserCreated = Depends(get_current_user),
+        page: schema.BookPage = Depends(get_books_page)
+):
     '''
     Traitement du GET /
     :param request: L'objet Request pour Jinja2
+    :param page: La page de livres à afficher
     :return: redirection vers /templates/management_books.html
     '''
-    books =  crud.all_books()
-    return templates.TemplateResponse("management_books.html", {"request": request, "books": books, "user": current_user})
+    return catalog_response("management_books.html", {"request": request, "books": page.books, "page": page, "user": current_user})
 
 # Route pour afficher le formulaire d'ajout du book
-@app.get("/ajouter livre", response_class=HTMLResponse, name="ajoute livre")
+@router.get("/ajouter livre", response_class=HTMLResponse, name="ajoute livre")
 def add_book_page(request: Request):
     return templates.TemplateResponse("add_book.html", {"request": request})
 
 # Route création du book
-@app.post("/submit_add_book", response_class=HTMLResponse, name="submit_add_book")
+@router.post("/submit_add_book", response_class=HTMLResponse, name="submit_add_book")
 def create_book(
         request: Request,
         title: str = Form(...),
@@ -270,8 +314,83 @@ def create_book(
 
     return RedirectResponse(url="/gestion_des_livres", status_code=303)
 
+# Route import de livres en masse
+@router.post("/import_books", name="import_books")
+def import_books(
+        file: UploadFile = File(...),
+        format: Optional[str] = Form(None),
+        batch_size: Optional[int] = Form(None),
+        current_user: schema.UserCreated = Depends(get_current_user)
+):
+    '''
+    Importe un fichier CSV ou JSON Lines de livres (colonnes title, author, kind, publication_date, availability)
+    :param file: fichier envoyé (multipart)
+    :param format: "csv" ou "jsonl", déduit du nom du fichier sinon
+    :param batch_size: lignes par lot (IMPORT_BATCH_SIZE par défaut)
+    :return: flux NDJSON : une ligne d'avancement par lot, puis le bilan final (done=true) avec les erreurs par ligne
+    '''
+    try:
+        fmt = format or catalog_import.detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt not in catalog_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {fmt}")
+
+    # FastAPI ferme les fichiers du formulaire avant d'envoyer une réponse en flux :
+    # le fichier reçu (déjà sur disque au-delà de 1 Mo) est détaché de l'UploadFile et fermé par le générateur
+    stream, file.file = file.file, io.BytesIO()
+
+    def progress():
+        # Générateur synchrone : Starlette le parcourt dans le threadpool, lot par lot
+        with stream:
+            for report in catalog_import.import_batches(stream, fmt, batch_size):
+                yield report.model_dump_json(exclude={"errors"} if not report.done else None) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+# Route export en flux (livres, utilisateurs, emprunts)
+@router.get("/export/{entity}", name="export")
+def export_entity(
+        entity: str,
+        format: str = "csv",
+        gzip: bool = False,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        available: Optional[bool] = None,
+        returned: Optional[bool] = None,
+        current_user: schema.UserCreated = Depends(get_current_user)
+):
+    '''
+    Exporte une table en CSV ou NDJSON, ligne par paquet, sans la charger en mémoire
+    :param entity: "books", "users" (sans mot de passe) ou "emprunts" ; utilisateurs et emprunts limités
+                   au compte connecté, sauf pour EXPORT_ADMINS
+    :param format: "csv" ou "ndjson"
+    :param gzip: compresse le fichier exporté
+    :param date_from: date minimale (publication des livres, date d'emprunt)
+    :param date_to: date maximale
+    :param available: livres disponibles ou non
+    :param returned: emprunts retournés ou non
+    :return: fichier en flux
+    '''
+    if entity not in export.ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Entité inconnue : {entity}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {format}")
+    try:
+        owner = None if export.is_export_admin(current_user) else current_user.id
+        stmt = export.export_query(entity, date_from, date_to, available, returned, user_id=owner)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"{entity}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export.stream_export(stmt, format, compress=gzip),
+        media_type="application/gzip" if gzip else export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # Route pour afficher le formulaire de modification du book
-@app.get("/modifier_livre/{book_id}", response_class=HTMLResponse)
+@router.get("/modifier_livre/{book_id}", response_class=HTMLResponse)
 def modifier_livre(request: Request, book_id: int):
     '''
     Affiche la page de modification d'un livre
@@ -281,19 +400,18 @@ def modifier_livre(request: Request, book_id: int):
     '''
     # Récupérer le livre depuis la base de données
     book = crud.get_book_by_id(book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
 
     # Afficher la page avec les données actuelles du livre
     return templates.TemplateResponse("update_book.html", {"request": request, "book": book})
 
 # Route modifiaction book
-@app.put("/update_book/{book_id}", response_class=HTMLResponse)
+@router.put("/update_book/{book_id}", response_class=HTMLResponse)
 async def update_book(
         request: Request,
         book_id: int
 ):
-    # Récupérer le livre existant
-    book = crud.get_book_by_id(book_id)
-
     # Récupérer les données JSON depuis la requête
     data = await request.json()
 
@@ -311,32 +429,59 @@ async def update_book(
 
     # Logique pour mettre à jour le livre dans la base de données
     updated_book = crud.update_book(book_id, title, author, kind, pub_date)
+    if updated_book is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
 
     # Redirection vers la page de gestion des livres après modification
     return RedirectResponse(url="/gestion_des_livres", status_code=303)
 
 # Route suppression book
-@app.delete("/delete_book/{book_id}", response_class=HTMLResponse)
+@router.delete("/delete_book/{book_id}", response_class=HTMLResponse)
 def delete_book(request: Request, book_id: int):
     '''
     Route pour supprimer un livre
     :param request: L'objet Request pour Jinja2
     :param book_id: L'ID du livre à supprimer
-    :return: Redirection vers la page de gestion des livres
+    :return: 204 ; le livre est retiré de la page par delete_book.js, sans recharger la liste
     '''
     # Supprimer le livre
     deleted_book = crud.delete_book(book_id)
+    if deleted_book is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
+    return Response(status_code=204)
 
-    # Redirection vers la page de gestion des livres après la suppression
-    return RedirectResponse(url="/gestion_des_livres", status_code=303)
+# Route complétion de la barre de recherche
+@router.get("/autocomplete", response_class=ORJSONResponse)
+async def autocomplete(q: str = "", field: Optional[str] = None, limit: Optional[int] = None):
+    '''
+    Titres et auteurs commençant par le texte saisi, depuis l'index en mémoire (aucune requête SQL)
+    :param q: texte saisi
+    :param field: title, author ou les deux (par défaut)
+    :param limit: suggestions par champ (AUTOCOMPLETE_LIMIT par défaut)
+    :return: liste de {"field", "value", "count"}
+    '''
+    if field is not None and field not in ("title", "author"):
+        raise HTTPException(status_code=400, detail=f"Champ inconnu : {field}")
+    index = crud.autocomplete_index
+    if not index.ready:
+        index = await asyncio.to_thread(crud._load_autocomplete)
+    limit = max(1, min(limit or config.AUTOCOMPLETE_LIMIT, config.PAGE_SIZE_MAX))
+    return ORJSONResponse(index.complete(q, field, limit))
 
 # Route recherche book
-@app.get("/search_books", response_model=List[schema.BookCreated])
-def search_book(
+@router.get("/search_books", response_model=List[schema.BookCreated])
+async def search_book(
         request: Request,
         title: Optional[str] = None,
         author: Optional[str] = None,
-        kind: Optional[str] = None
+        kind: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        facet_kind: Optional[str] = None,
+        facet_author: Optional[str] = None,
+        available: Optional[bool] = None
 ):
     '''
     Route pour rechercher des livres par titre, auteur ou genre
@@ -344,20 +489,33 @@ def search_book(
     :param title: Titre du livre (optionnel)
     :param author: Auteur du livre (optionnel)
     :param kind: Genre du livre (optionnel)
+    :param after: curseur de la page suivante
+    :param before: curseur de la page précédente
+    :param sort: tri des résultats (pertinence par défaut)
+    :param limit: nombre de livres par page
+    :param facet_kind: genre exact choisi dans les facettes
+    :param facet_author: auteur exact choisi dans les facettes
+    :param available: livres disponibles (true) ou empruntés (false)
     :return: Liste de livres correspondant aux critères
     '''
-    # Rechercher les livres
-    books = crud.search_book(title=title, author=author, kind=kind)
+    # Rechercher les livres (une page à la fois)
+    try:
+        search_page = crud_async.search_book_page_stream if config.TEMPLATE_STREAMING else crud_async.search_book_page
+        page = await search_page(title=title, author=author, kind=kind, after=after, before=before, sort=sort, limit=limit,
+                                 facet_kind=facet_kind, facet_author=facet_author, available=available)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # Retourner le template avec la liste des livres trouvés
-    return templates.TemplateResponse("search_result.html", {"request": request, "books": books})
+    return catalog_response("search_result.html", {"request": request, "books": page.books, "page": page, "sort_options": search_sort_options()})
 
 # Route emprunt book
-@app.get("/user/{username}/loan_book/{book_title}", response_class=HTMLResponse, name="loan_book")
+@router.get("/user/{username}/loan_book/{book_title}", response_class=HTMLResponse, name="loan_book")
 def loan_book_page(
         request: Request,
         username: str,
-        book_title: str
+        book_title: str,
+        db=Depends(crud.get_db)
 ):
     '''
 
@@ -368,22 +526,32 @@ def loan_book_page(
     '''
 
     # Récupérer l'utilisateur par son nom
-    user = crud.connexion(username)
+    user = crud.connexion(username, db)
 
     # Récupérer le livre par son titre
     book = crud.get_book_by_title(book_title)
+    if user is None or book is None:
+        status_code, detail = BORROW_ERRORS[schema.BorrowStatus.not_found]
+        raise HTTPException(status_code=status_code, detail=detail)
 
-    # Vérifier combien de livres l'utilisateur a déjà empruntés
-    user_emprunts = crud.get_emprunts_by_user(user.id)
-    if len(user_emprunts) >= 6:
-        raise HTTPException(status_code=400, detail="Vous ne pouvez pas emprunter plus de 6 livres")
+    # Vérifier combien de livres l'utilisateur a en cours d'emprunt
+    if crud.active_loans_count(user.id, db) >= config.MAX_ACTIVE_LOANS:
+        raise HTTPException(status_code=400, detail=f"Vous ne pouvez pas emprunter plus de {config.MAX_ACTIVE_LOANS} livres")
     # Retourner la page avec les détails du livre et un formulaire pour l'emprunt
     return templates.TemplateResponse("loan_book.html", {"request": request, "user": user, "book": book, "max_days": 30})
 
 
+# Réponses d'erreur selon l'issue de l'emprunt
+BORROW_ERRORS = {
+    schema.BorrowStatus.not_found: (404, "Utilisateur ou livre introuvable"),
+    schema.BorrowStatus.already_borrowed: (409, "Ce livre est déjà emprunté"),
+    schema.BorrowStatus.limit_reached: (400, f"Vous ne pouvez pas emprunter plus de {config.MAX_ACTIVE_LOANS} livres"),
+    schema.BorrowStatus.not_borrowed: (404, "Aucun emprunt en cours pour ce livre"),
+}
+
 # route confirmer emprunt book
-@app.post("/user/{username}/loan_book/{book_title}", response_class=HTMLResponse)
-def emprunter_book(
+@router.post("/user/{username}/loan_book/{book_title}", response_class=HTMLResponse)
+async def emprunter_book(
         request: Request,
         username: str,
         book_title: str,
@@ -403,23 +571,22 @@ def emprunter_book(
     except ValueError:
         raise HTTPException(status_code=400, detail="Format de date invalide")
 
-    # Récupérer l'utilisateur et le livre comme dans la fonction précédente
-    user = crud.connexion(username)
-    book = crud.get_book_by_title(book_title)
-
     # Vérifier si la date de retour est valide
     max_return_date = date.today() + timedelta(days=30)
     if return_date > max_return_date:
         raise HTTPException(status_code=400, detail="La date de retour dépasse la limite de 30 jours")
 
-    # Emprunter le livre
-    emprunt = crud.borrow_book(user.id, book.id, return_date)
+    # Emprunter le livre (résolution de l'utilisateur et du livre, vérifications et insertion en une transaction)
+    result = await crud_async.borrow_book_by_title(username, book_title, return_date)
+    if result.status in BORROW_ERRORS:
+        status_code, detail = BORROW_ERRORS[result.status]
+        raise HTTPException(status_code=status_code, detail=detail)
 
     return RedirectResponse(url=f"/user/{username}", status_code=303)
 
 # Route rendu book emprunté
-@app.post("/user/{username}/return_book/{book_title}", response_class=HTMLResponse, name="return_book")
-def return_book(
+@router.post("/user/{username}/return_book/{book_title}", response_class=HTMLResponse, name="return_book")
+async def return_book(
         request: Request,
         username: str,
         book_title: str
@@ -432,10 +599,144 @@ def return_book(
     :return: Template de confirmation du retour
     '''
     # Récupérer l'utilisateur et le livre
-    user = crud.connexion(username)
-    book = crud.get_book_by_title(book_title)
+    user = await crud_async.connexion(username)
+    book = await crud_async.get_book_by_title(book_title)
 
     # Appeler la fonction pour retourner le livre
-    result = crud.return_book(user.id, book.id)
+    if user is None or book is None:
+        result = schema.BorrowResult(status=schema.BorrowStatus.not_found)
+    else:
+        result = await crud_async.return_book(user.id, book.id)
+    if result.status in BORROW_ERRORS:
+        status_code, detail = BORROW_ERRORS[result.status]
+        raise HTTPException(status_code=status_code, detail=detail)
 
     return RedirectResponse(url=f"/user/{username}", status_code=303)
+
+# Routes d'emprunt et de retour par ID de livre, pour l'utilisateur connecté :
+# une session par requête (get_async_db) partagée par l'authentification et l'opération
+
+# Route formulaire d'emprunt
+@router.get("/emprunts/{book_id}", response_class=HTMLResponse, name="loan_form")
+async def loan_form(
+        request: Request,
+        book_id: int,
+        current_user: schema.UserCreated = Depends(get_current_user),
+        db=Depends(crud_async.get_async_db)
+):
+    '''
+    Formulaire d'emprunt d'un livre
+    :param request: Objet Request pour Jinja2
+    :param book_id: ID du livre
+    :param current_user: L'utilisateur actuellement connecté
+    :return: Template avec les détails du livre et formulaire d'emprunt
+    '''
+    book = await crud_async.get_book_by_id(book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
+    if await crud_async.active_loans_count(current_user.id, db) >= config.MAX_ACTIVE_LOANS:
+        raise HTTPException(status_code=400, detail=f"Vous ne pouvez pas emprunter plus de {config.MAX_ACTIVE_LOANS} livres")
+    return templates.TemplateResponse("loan_book.html", {"request": request, "user": current_user, "book": book, "max_days": 30})
+
+# Route confirmer emprunt
+@router.post("/emprunts/{book_id}", response_class=HTMLResponse, name="borrow")
+async def borrow(
+        book_id: int,
+        return_date: date = Form(...),
+        current_user: schema.UserCreated = Depends(get_current_user),
+        db=Depends(crud_async.get_async_db)
+):
+    '''
+    Emprunt d'un livre par l'utilisateur connecté
+    :param book_id: ID du livre à emprunter
+    :param return_date: date de retour prévue (30 jours au plus)
+    :param current_user: L'utilisateur actuellement connecté
+    :return: redirection vers la page de l'utilisateur
+    '''
+    if return_date > date.today() + timedelta(days=30):
+        raise HTTPException(status_code=400, detail="La date de retour dépasse la limite de 30 jours")
+
+    result = await crud_async.borrow_book(current_user.id, book_id, return_date, db)
+    if result.status in BORROW_ERRORS:
+        status_code, detail = BORROW_ERRORS[result.status]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return RedirectResponse(url=f"/user/{current_user.name}", status_code=303)
+
+# Route rendu d'un livre
+@router.post("/emprunts/{book_id}/retour", response_class=HTMLResponse, name="give_back")
+async def give_back(
+        book_id: int,
+        current_user: schema.UserCreated = Depends(get_current_user),
+        db=Depends(crud_async.get_async_db)
+):
+    '''
+    Retour d'un livre emprunté par l'utilisateur connecté
+    :param book_id: ID du livre à retourner
+    :param current_user: L'utilisateur actuellement connecté
+    :return: redirection vers la page de l'utilisateur
+    '''
+    result = await crud_async.return_book(current_user.id, book_id, db)
+    if result.status in BORROW_ERRORS:
+        status_code, detail = BORROW_ERRORS[result.status]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return RedirectResponse(url=f"/user/{current_user.name}", status_code=303)
+
+# Métriques au format texte Prometheus
+@router.get("/metrics", name="metrics", include_in_schema=False)
+def metrics_page():
+    '''
+    Compteurs et histogrammes des requêtes HTTP et SQL, gauges des pools de connexions
+    :return: texte au format d'exposition Prometheus
+    '''
+    body = metrics.render(metrics.families() + metrics.pool_families(database.pool_stats()))
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Route des statistiques internes
+@router.get("/stats", name="stats")
+def stats():
+    '''
+    Statistiques des sous-systèmes (pool de hachage, caches, pools de connexions, journal des modifications, durées du démarrage)
+    :return: dictionnaire JSON
+    '''
+    return {"hashing": hashing.pool.stats(), "auth": auth.stats(), "catalog": crud.catalog_stats(), "pools": database.pool_stats(),
+            "overdue": overdue.scanner.stats(), "autocomplete": crud.autocomplete_index.stats(),
+            "changes": changes.feed.stats(),
+            "startup_ms": {step: round(seconds * 1000, 1) for step, seconds in startup.timings.items()}}
+
+def create_app(settings: Optional[dict] = None) -> FastAPI:
+    '''
+    Construit l'application (uvicorn main:app, ou uvicorn --factory main:create_app).
+    Aucune connexion n'est ouverte ici : les engines sont créés et préchauffés par le lifespan.
+    :param settings: paramètres de config à remplacer, par nom (ex. {"SQLALCHEMY_DATABASE_URL": "sqlite:///test.db"})
+    :return: application FastAPI
+    '''
+    with startup.timed("create_app"):
+        if settings:
+            config.configure(**settings)
+        app = FastAPI(lifespan=lifespan)
+        # ETag / 304 sur les pages du catalogue, avant toute requête SQL
+        app.add_middleware(conditional.ConditionalPagesMiddleware,
+                           public=("/", "/search_books", "/autocomplete"), personal=("/user/{username}", "/gestion_des_livres"))
+        # Profil des requêtes demandées (X-Profile) ou tirées au sort : en-tête Server-Timing
+        app.add_middleware(profiling.ProfilingMiddleware)
+        # Latence et nombre de requêtes par route (ajouté en dernier : mesure aussi les 304)
+        app.add_middleware(metrics.MetricsMiddleware)
+        # Traitement des fichiers statics (HTML, CSS, JS, IMAGES ...) : empreintés et précompressés au démarrage
+        assets = app.state.static_assets = static_assets.assets()
+        app.mount("/static", static_assets.PrecompressedStaticFiles(assets), name="static")
+        # URL empreintée d'un fichier statique : {{ static_url('css/index.css') }}
+        templates.env.globals["static_url"] = assets.url
+        # API JSON (/api/v1)
+        app.include_router(api.router)
+        app.include_router(router)
+    return app
+
+app = create_app()
+
+if __name__ == "__main__":
+    # Serveur : WORKERS processus uvicorn, caches tenus cohérents par le journal change_log (changes.py),
+    # même DEPLOY_ID dans les ETag de tous les workers
+    os.environ["DEPLOY_ID"] = config.DEPLOY_ID
+    uvicorn.run("main:app", host=config.SERVER_HOST, port=config.SERVER_PORT, workers=config.WORKERS)
@@ -0,0 +1,300 @@
+'''
+Métriques au format texte Prometheus (/metrics) : latence des requêtes HTTP par route,
+requêtes SQL par instruction normalisée, gauges des pools de connexions.
+
+Les compteurs sont écrits sans verrou : chaque thread (boucle d'événements, threads du threadpool)
+incrémente sa propre copie, et les copies ne sont additionnées qu'à la lecture de /metrics.
+'''
+import re, threading, time, functools
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+import config
+
+# Bornes des histogrammes (secondes)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+# Routes sans correspondance (404) : une seule valeur d'étiquette, quel que soit le chemin demandé
+UNMATCHED = "<unmatched>"
+# Instructions SQL au-delà de METRICS_MAX_STATEMENTS
+OTHER_STATEMENT = "<other>"
+
+class _Shards:
+    '''
+    Valeurs par thread : {étiquettes: valeur}, écrites par un seul thread, additionnées à la lecture
+    '''
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[dict] = []
+
+    def shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def snapshots(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy est atomique : pas d'erreur si un thread ajoute une étiquette pendant la lecture
+        return [shard.copy() for shard in shards]
+
+class Counter:
+    '''
+    Compteur par étiquettes (tuple de valeurs, dans l'ordre de labels)
+    '''
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._shards = _Shards()
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        values = self._shards.shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def collect(self) -> Dict[tuple, float]:
+        totals = {}
+        for snapshot in self._shards.snapshots():
+            for labels, value in snapshot.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self) -> Iterable[Tuple[str, dict, float]]:
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+class LiveGauge(Counter):
+    '''
+    Valeur incrémentée et décrémentée par les threads (ex. requêtes en cours)
+    '''
+    kind = "gauge"
+
+class Histogram:
+    '''
+    Histogramme par étiquettes : nombre d'observations par intervalle, somme et nombre total
+    '''
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = HTTP_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        values = self._shards.shard()
+        counts = values.get(labels)
+        if counts is None:
+            # Un intervalle par borne, un pour +Inf, puis la somme des valeurs
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self) -> Dict[tuple, list]:
+        totals = {}
+        for snapshot in self._shards.snapshots():
+            for labels, counts in snapshot.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        return totals
+
+    def samples(self) -> Iterable[Tuple[str, dict, float]]:
+        for labels, counts in sorted(self.collect().items()):
+            base = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**base, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", base, counts[-1]
+            yield f"{self.name}_count", base, cumulative
+
+class Gauge:
+    '''
+    Valeurs lues au moment de /metrics (famille construite à chaque lecture) ;
+    kind="counter" pour un total lu ailleurs (compteurs des pools)
+    '''
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), values: Optional[Dict[tuple, float]] = None,
+                 kind: str = "gauge"):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = values or {}
+
+    def samples(self) -> Iterable[Tuple[str, dict, float]]:
+        for labels, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render(families: Iterable) -> str:
+    '''
+    Format texte d'exposition Prometheus (version 0.0.4)
+    :param families: Counter, Histogram ou Gauge
+    '''
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for name, labels, value in family.samples():
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# Métriques de l'application
+http_requests = Counter("http_requests_total", "Requêtes HTTP par méthode, route et statut", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Durée des requêtes HTTP (jusqu'au dernier octet envoyé)",
+                         ("method", "route"), HTTP_BUCKETS)
+http_in_progress = LiveGauge("http_requests_in_progress", "Requêtes HTTP en cours", ("method",))
+sql_statements = Histogram("db_statement_duration_seconds", "Durée des requêtes SQL par instruction normalisée",
+                           ("engine", "statement"), SQL_BUCKETS)
+sql_errors = Counter("db_statement_errors_total", "Requêtes SQL en erreur", ("engine",))
+
+# Durée des étapes du dernier démarrage (startup.py)
+startup_seconds = Gauge("app_startup_seconds", "Durée des étapes du démarrage de l'application", ("step",))
+
+def families() -> list:
+    return [http_requests, http_latency, http_in_progress, sql_statements, sql_errors, startup_seconds]
+
+class MetricsMiddleware:
+    '''
+    Middleware ASGI : nombre et durée des requêtes par route (modèle de chemin, ex. /user/{username}),
+    y compris les réponses envoyées avant le routage (304 de ConditionalPagesMiddleware)
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        # endpoint -> modèle de chemin
+        self._templates: Dict[object, str] = {}
+
+    def _route(self, scope, path: str, root_path: str) -> str:
+        endpoint = scope.get("endpoint")
+        template = self._templates.get(endpoint) if endpoint is not None else None
+        if template is not None:
+            return template
+        if endpoint is None and scope.get("root_path", "") != root_path:
+            # Application montée (Mount, ex. /static) : son préfixe
+            return scope["root_path"][len(root_path):]
+        # Réponse sans routage (304, 404) ou première requête de la route : recherche dans la table des routes
+        from starlette.routing import Match
+        request_scope = {**scope, "path": path, "root_path": root_path}
+        for route in getattr(scope.get("app"), "routes", ()):
+            match, _ = route.matches(request_scope)
+            if match == Match.FULL:
+                template = getattr(route, "path", None) or UNMATCHED
+                if endpoint is not None:
+                    self._templates[endpoint] = template
+                return template
+        return UNMATCHED
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        # Le routage modifie path et root_path dans le scope (Mount)
+        path, root_path = scope["path"], scope.get("root_path", "")
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_progress.inc((method,))
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_progress.inc((method,), -1)
+            route = self._route(scope, path, root_path)
+            http_latency.observe((method, route), time.perf_counter() - started)
+            http_requests.inc((method, route, str(status)))
+
+_PARAMETER = r"(?:\?|:\w+|%\(\w+\)s)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAMETER}(?:\s*,\s*{_PARAMETER})*\s*\)")
+_SPACES = re.compile(r"\s+")
+_statements = set()
+_statements_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4096)
+def _normalize(statement: str) -> str:
+    # Espaces réduits, listes IN de longueur variable ramenées à (?)
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())[:300]
+
+def normalize_statement(statement: str) -> str:
+    '''
+    Étiquette d'une instruction SQL : normalisée, et OTHER_STATEMENT au-delà de METRICS_MAX_STATEMENTS distinctes
+    '''
+    normalized = _normalize(statement)
+    if normalized in _statements:
+        return normalized
+    with _statements_lock:
+        if len(_statements) >= config.METRICS_MAX_STATEMENTS:
+            return OTHER_STATEMENT
+        _statements.add(normalized)
+    return normalized
+
+def instrument_engine(engine, name: str) -> None:
+    '''
+    Mesure chaque requête SQL de l'engine (synchrone ou asyncio) : before/after_cursor_execute
+    '''
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        if config.METRICS_ENABLED:
+            sql_statements.observe((name, normalize_statement(statement)), time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("metrics_started"):
+            conn.info["metrics_started"].pop()
+        sql_errors.inc((name,))
+
+def pool_families(stats: dict) -> list:
+    '''
+    Gauges des pools de connexions, à partir de database.pool_stats()
+    '''
+    gauges = {
+        "size": Gauge("db_pool_size", "Connexions gardées par le pool", ("pool",)),
+        "in_use": Gauge("db_pool_in_use", "Connexions empruntées au pool", ("pool",)),
+        "overflow": Gauge("db_pool_overflow", "Connexions ouvertes au-delà de la taille du pool", ("pool",)),
+        "checkouts": Gauge("db_pool_checkouts_total", "Connexions empruntées depuis le démarrage", ("pool",), kind="counter"),
+        "timeouts": Gauge("db_pool_timeouts_total", "Attentes de connexion arrivées au timeout", ("pool",), kind="counter"),
+        "wait_total_ms": Gauge("db_pool_wait_seconds_total", "Temps total d'attente d'une connexion", ("pool",), kind="counter"),
+    }
+    for pool, entry in stats.items():
+        for key, gauge in gauges.items():
+            if key in entry:
+                gauge.values[(pool,)] = entry[key] / 1000 if key.endswith("_ms") else entry[key]
+    return list(gauges.values())
@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String, select, Date, Boolean, ForeignKey, Sequence, Numeric
+from sqlalchemy import create_engine, Column, Integer, String, select, Date, DateTime, Boolean, ForeignKey, Sequence, Numeric, Index
 from sqlalchemy.orm import declarative_base, relationship
-from datetime import date
+from datetime import date, datetime
 
 # Definition of the basis
 Base = declarative_base()
@@ -9,8 +9,8 @@ Base = declarative_base()
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, Sequence('users_seq'), primary_key=True)
-    name = Column(String(50), nullable=False)
-    email = Column(String(50), nullable=False)
+    name = Column(String(50), nullable=False, unique=True, index=True)
+    email = Column(String(50), nullable=False, unique=True, index=True)
     phone = Column(String(50), nullable=True)
     password = Column(String(255), nullable=False)
     # Relation avec les emprunts
@@ -23,7 +23,7 @@ class User(Base):
 class Book(Base):
     __tablename__ = 'books'
     id = Column(Integer, Sequence('books_seq'), primary_key=True)
-    title = Column(String(50))
+    title = Column(String(50), index=True)
     author = Column(String(50))
     kind = Column(String(50))
     publication_date = Column(Date)
@@ -34,18 +34,58 @@ class Book(Base):
     def __repr__(self) -> str:
         return f"Book[{self.id}] : {self.title}"
 
+# États d'un emprunt (colonne status)
+LOAN_ACTIVE = 'active'
+LOAN_OVERDUE = 'overdue'
+LOAN_RETURNED = 'returned'
+
 # Definition de la table emprunts
 class Emprunt(Base):
     __tablename__ = 'emprunts'
+    # Emprunts en cours d'un utilisateur, emprunt en cours d'un livre, emprunts en retard
+    __table_args__ = (
+        Index('ix_emprunts_user_returned', 'user_id', 'returned'),
+        Index('ix_emprunts_book_returned', 'book_id', 'returned'),
+        Index('ix_emprunts_status_return_date', 'status', 'return_date'),
+    )
     id = Column(Integer, Sequence('emprunts_seq'), primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
     borrow_date = Column(Date, default=date.today)
     return_date = Column(Date, nullable=False)
     returned = Column(Numeric(1), default=0)
+    # active, overdue (marqué par le scanner des retards) ou returned
+    status = Column(String(10), nullable=False, default=LOAN_ACTIVE, server_default=LOAN_ACTIVE)
     # Relations pour les utilisateurs et les livres
     user = relationship("User", back_populates="emprunts")
     book = relationship("Book", back_populates="emprunts")
 
     def __repr__(self) -> str:
-        return f"Emprunt[{self.id}] - User: {self.user_id}, Book: {self.book_id}, Returned: {self.returned}"
\ No newline at end of file
+        return f"Emprunt[{self.id}] - User: {self.user_id}, Book: {self.book_id}, Returned: {self.returned}"
+
+# Entités du journal des modifications (colonne entity)
+CHANGE_BOOK = 'book'
+CHANGE_USER = 'user'
+
+# Definition de la table change_log : modifications lues par les autres workers (changes.py)
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    seq = Column(Integer, Sequence('change_log_seq'), primary_key=True)
+    entity = Column(String(10), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    # Purge des lignes anciennes
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self) -> str:
+        return f"ChangeLog[{self.seq}] : {self.entity} {self.entity_id}"
+
+# Definition de la table leases : tâche de fond confiée à un seul processus (scanner des retards en mode multi-workers)
+class Lease(Base):
+    __tablename__ = 'leases'
+    name = Column(String(50), primary_key=True)
+    # Processus détenteur (hôte:pid) et fin du bail, renouvelé à chaque passage
+    holder = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Lease[{self.name}] : {self.holder} jusqu'à {self.expires_at}"
@@ -0,0 +1,221 @@
+'''
+Scanner des emprunts en retard : tâche asyncio lancée avec l'application, qui marque
+régulièrement status = 'overdue' sur les emprunts en cours dont la date de retour est passée.
+
+Chaque lot lit au plus batch_size IDs sur l'index (status, return_date) puis les marque
+par UPDATE ... WHERE id IN (...), dans sa propre transaction : le scan peut être interrompu et relancé sans effet de bord,
+et un emprunt déjà marqué ou retourné n'est plus jamais relu.
+
+En mode multi-workers (CHANGE_LOG_ENABLED), chaque worker lance le scanner mais seul le détenteur
+du bail 'overdue' (table leases) marque les emprunts : le bail est renouvelé à chaque passage et repris
+par un autre processus s'il expire (worker arrêté ou bloqué). Les autres workers ne font que relire les totaux.
+'''
+import asyncio, logging, os, socket, threading, time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.exc import IntegrityError
+import models, config, crud
+
+logger = logging.getLogger(__name__)
+
+def _late_ids(today: date, batch_size: int):
+    # Emprunts encore 'active' dont la date de retour est passée, au plus batch_size par lot.
+    # Même condition returned = 0 que _mark_overdue : une ligne lue est toujours marquée, le scan avance
+    return (select(models.Emprunt.id)
+            .where(models.Emprunt.status == models.LOAN_ACTIVE, models.Emprunt.return_date < today,
+                   models.Emprunt.returned == 0)
+            .limit(batch_size))
+
+def _mark_overdue(ids: list):
+    # La condition sur returned écarte un emprunt retourné entre la lecture des IDs et la mise à jour
+    # (une condition sur status ferait préférer l'index (status, return_date) à la clé primaire)
+    return (update(models.Emprunt)
+            .where(models.Emprunt.id.in_(ids), models.Emprunt.returned == 0)
+            .values(status=models.LOAN_OVERDUE)
+            .execution_options(synchronize_session=False))
+
+def mark_overdue_batch(today: date, batch_size: int) -> Tuple[int, int]:
+    '''
+    Marque un lot d'emprunts en retard, en une transaction
+    :return: tuple (emprunts lus, emprunts marqués)
+    '''
+    with crud.Session() as session:
+        ids = session.scalars(_late_ids(today, batch_size)).all()
+        marked = 0
+        for start in range(0, len(ids), crud.IN_CHUNK_SIZE):
+            marked += session.execute(_mark_overdue(ids[start:start + crud.IN_CHUNK_SIZE])).rowcount
+        session.commit()
+    return len(ids), marked
+
+def overdue_counts(session=None) -> Dict[int, int]:
+    '''
+    Nombre d'emprunts en retard par utilisateur
+    :return: dictionnaire user_id -> nombre d'emprunts en retard
+    '''
+    with crud._session_scope(session) as session:
+        rows = session.execute(select(models.Emprunt.user_id, func.count())
+                               .where(models.Emprunt.status == models.LOAN_OVERDUE)
+                               .group_by(models.Emprunt.user_id))
+        return {user_id: count for user_id, count in rows}
+
+LEASE_NAME = "overdue"
+
+def lease_holder() -> str:
+    # Identifiant du processus courant, unique entre les workers et les instances
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_lease(name: str, holder: str, seconds: float) -> bool:
+    '''
+    Prend ou renouvelle un bail : il est accordé s'il est libre, expiré ou déjà détenu par holder
+    :param name: nom du bail
+    :param holder: identifiant du processus demandeur
+    :param seconds: durée du bail
+    :return: True si holder détient le bail jusqu'à maintenant + seconds
+    '''
+    now = datetime.now()
+    with crud.Session() as session:
+        # Mise à jour conditionnelle : atomique entre processus, un seul UPDATE peut voler un bail expiré
+        taken = session.execute(update(models.Lease)
+                                .where(models.Lease.name == name,
+                                       or_(models.Lease.holder == holder, models.Lease.expires_at < now))
+                                .values(holder=holder, expires_at=now + timedelta(seconds=seconds))
+                                .execution_options(synchronize_session=False)).rowcount
+        if not taken:
+            if session.get(models.Lease, name) is not None:
+                return False
+            # Premier passage : la clé primaire départage deux processus qui créent le bail en même temps
+            session.add(models.Lease(name=name, holder=holder, expires_at=now + timedelta(seconds=seconds)))
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                return False
+            return True
+        session.commit()
+    return True
+
+def release_lease(name: str, holder: str) -> None:
+    '''
+    Libère un bail détenu par holder (il expire immédiatement, un autre processus le reprend au prochain passage)
+    '''
+    with crud.Session() as session:
+        session.execute(update(models.Lease)
+                        .where(models.Lease.name == name, models.Lease.holder == holder)
+                        .values(expires_at=datetime.min)
+                        .execution_options(synchronize_session=False))
+        session.commit()
+
+class OverdueScanner:
+    '''
+    Marque les emprunts en retard par lots, toutes les `interval` secondes
+    '''
+
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task = None
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.runs = 0
+        self.marked = 0
+        self.errors = 0
+        self.last_run = None
+        self.last_marked = 0
+        self.last_duration = 0.0
+        self.leader = False
+        self.skipped = 0
+        self._holder = None
+
+    @property
+    def holder(self) -> str:
+        # Calculé au premier usage : le pid est celui du worker, pas du processus qui a importé le module
+        if self._holder is None:
+            self._holder = lease_holder()
+        return self._holder
+
+    def lease_seconds(self) -> float:
+        # Couvre deux passages manqués avant qu'un autre worker ne reprenne le scan
+        return 2 * self.interval + 60
+
+    def _is_leader(self) -> bool:
+        # Un seul processus : pas de bail à prendre
+        if not config.CHANGE_LOG_ENABLED:
+            return True
+        return acquire_lease(LEASE_NAME, self.holder, self.lease_seconds())
+
+    def scan(self, today: Optional[date] = None) -> int:
+        '''
+        Marque tous les emprunts en retard (un lot par transaction) puis recalcule les totaux par utilisateur
+        :param today: date de référence (aujourd'hui par défaut)
+        :return: nombre d'emprunts marqués
+        '''
+        today = today or date.today()
+        started = time.perf_counter()
+        marked = 0
+        # Un seul scan à la fois dans ce processus
+        with self._lock:
+            # En mode multi-workers, seul le détenteur du bail marque les emprunts
+            self.leader = self._is_leader()
+            while self.leader:
+                found, count = mark_overdue_batch(today, self.batch_size)
+                marked += count
+                # Lot incomplet (fin du scan) ou aucune ligne marquée (rien ne changerait au lot suivant)
+                if found < self.batch_size or count == 0:
+                    break
+            if not self.leader:
+                self.skipped += 1
+            self.counts = overdue_counts()
+            self.runs += 1
+            self.marked += marked
+            self.last_marked = marked
+            self.last_run = datetime.now().isoformat(timespec="seconds")
+            self.last_duration = round(time.perf_counter() - started, 3)
+        return marked
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.scan)
+            except Exception:
+                self.errors += 1
+                logger.exception("Scanner des retards")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if self.leader and config.CHANGE_LOG_ENABLED:
+                # Le bail est libéré pour qu'un autre worker reprenne le scan sans attendre son expiration
+                try:
+                    await asyncio.to_thread(release_lease, LEASE_NAME, self.holder)
+                except Exception:
+                    logger.exception("Libération du bail du scanner des retards")
+                self.leader = False
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "leader": self.leader,
+            "skipped": self.skipped,
+            "interval_s": self.interval,
+            "runs": self.runs,
+            "marked": self.marked,
+            "errors": self.errors,
+            "last_run": self.last_run,
+            "last_marked": self.last_marked,
+            "last_duration_s": self.last_duration,
+            "users_with_overdue": len(self.counts),
+            "overdue_loans": sum(self.counts.values()),
+        }
+
+scanner = OverdueScanner(config.OVERDUE_SCAN_BATCH_SIZE, config.OVERDUE_SCAN_INTERVAL_SECONDS)
@@ -0,0 +1,217 @@
+'''
+Profil d'une requête : temps passé en SQL, en sérialisation (model_validate, JSON), en rendu de template
+et en hachage de mots de passe, renvoyé dans l'en-tête Server-Timing et écrit dans le journal "profiling".
+
+Le profil est activé par l'en-tête PROFILING_HEADER (X-Profile: 1) ou pour une fraction des requêtes
+(PROFILING_SAMPLE_RATE), si PROFILING_ENABLED. Il suit la requête dans une ContextVar (tâches et threads
+lancés par la requête compris). Les sections sont exclusives : une requête SQL exécutée pendant le rendu
+d'un template est comptée en SQL, pas dans le template.
+
+Indépendamment du profil, une requête SQL plus lente que SLOW_QUERY_MS est journalisée (texte sans valeurs).
+'''
+import logging, random, re, time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+import config, metrics
+
+logger = logging.getLogger(__name__)
+
+# Catégories rapportées dans Server-Timing (dans cet ordre)
+CATEGORIES = ("sql", "serialization", "template", "hashing")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+
+def redact(statement: str) -> str:
+    '''
+    Forme d'une instruction SQL : espaces réduits, listes IN ramenées à (?), littéraux remplacés par ?
+    '''
+    return _NUMBER_LITERAL.sub("?", _STRING_LITERAL.sub("?", metrics._normalize(statement)))
+
+def _parameter_types(parameters) -> str:
+    # Types des paramètres seulement, jamais leurs valeurs
+    if isinstance(parameters, dict):
+        values = parameters.values()
+    elif isinstance(parameters, (list, tuple)):
+        values = parameters
+    else:
+        return ""
+    return ", ".join(type(value).__name__ for value in values)
+
+class RequestProfile:
+    '''
+    Durées par catégorie et requêtes SQL par forme, pour une requête HTTP
+    '''
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {category: 0.0 for category in CATEGORIES}
+        self.counts: Dict[str, int] = {category: 0 for category in CATEGORIES}
+        # Forme de l'instruction -> [exécutions, durée totale]
+        self.statements: Dict[str, list] = {}
+        # Sections ouvertes : [catégorie, début de la partie en cours]
+        self._stack: List[list] = []
+
+    def enter(self, category: Optional[str]) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            # La section englobante est suspendue
+            parent = self._stack[-1]
+            self._add(parent[0], now - parent[1])
+        self._stack.append([category, now])
+
+    def exit(self) -> None:
+        now = time.perf_counter()
+        category, started = self._stack.pop()
+        self._add(category, now - started)
+        if category in self.counts:
+            self.counts[category] += 1
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def _add(self, category: Optional[str], seconds: float) -> None:
+        # Catégorie None : temps retiré de la section englobante sans être compté (attente du client)
+        if category is not None:
+            self.durations[category] = self.durations.get(category, 0.0) + seconds
+
+    def statement(self, shape: str, seconds: float) -> None:
+        entry = self.statements.get(shape)
+        if entry is None:
+            entry = self.statements[shape] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        '''
+        :return: valeur de l'en-tête Server-Timing (durées en millisecondes)
+        '''
+        parts = [f'{category};dur={self.durations[category] * 1000:.2f};desc="{self.counts[category]}"'
+                 for category in CATEGORIES if self.counts[category]]
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+    def report(self, status: int) -> None:
+        '''
+        Écrit le profil dans le journal, avec les instructions répétées (N+1 probable)
+        '''
+        breakdown = " ".join(f"{category}={self.durations[category] * 1000:.1f}ms/{self.counts[category]}" for category in CATEGORIES)
+        slowest = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:3]
+        logger.info("%s %s %s total=%.1fms %s%s", self.method, self.path, status, self.elapsed() * 1000, breakdown,
+                    "".join(f"\n  {count} x {total * 1000:.1f}ms {shape}" for shape, (count, total) in slowest))
+        for shape, (count, total) in self.statements.items():
+            if count > config.N_PLUS_ONE_THRESHOLD:
+                logger.warning("N+1 probable : %d exécutions (%.1fms) pendant %s %s de %s",
+                               count, total * 1000, self.method, self.path, shape)
+
+current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+class _Section:
+    __slots__ = ("profile", "category")
+
+    def __init__(self, profile: RequestProfile, category: Optional[str]):
+        self.profile = profile
+        self.category = category
+
+    def __enter__(self):
+        self.profile.enter(self.category)
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.exit()
+
+class _NoSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+_NO_SECTION = _NoSection()
+
+def section(category: Optional[str]):
+    '''
+    Bloc compté dans une catégorie du profil de la requête (sans effet hors d'une requête profilée) :
+    with profiling.section("serialization"): ...
+    :param category: "sql", "serialization", "template", "hashing", ou None pour exclure le bloc (attente)
+    '''
+    profile = current.get()
+    if profile is None:
+        return _NO_SECTION
+    return _Section(profile, category)
+
+def instrument_engine(engine) -> None:
+    '''
+    Temps SQL du profil et journal des requêtes lentes, sur l'engine (synchrone ou asyncio)
+    '''
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        profile = current.get()
+        if profile is not None:
+            profile.enter("sql")
+        conn.info.setdefault("profiling_started", []).append((time.perf_counter(), profile))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started, profile = conn.info["profiling_started"].pop()
+        seconds = time.perf_counter() - started
+        if profile is not None:
+            profile.exit()
+            profile.statement(redact(statement), seconds)
+        if config.SLOW_QUERY_MS and seconds * 1000 >= config.SLOW_QUERY_MS:
+            where = f" pendant {profile.method} {profile.path}" if profile is not None else ""
+            logger.warning("Requête lente (%.1fms)%s : %s [paramètres : %s]", seconds * 1000, where,
+                           redact(statement), "lots" if executemany else _parameter_types(parameters))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("profiling_started"):
+            _, profile = conn.info["profiling_started"].pop()
+            if profile is not None:
+                profile.exit()
+
+def _sampled(scope) -> bool:
+    header = config.PROFILING_HEADER.lower().encode("latin-1")
+    for name, value in scope["headers"]:
+        if name == header:
+            return value.strip() not in (b"", b"0", b"false")
+    return config.PROFILING_SAMPLE_RATE > 0 and random.random() < config.PROFILING_SAMPLE_RATE
+
+class ProfilingMiddleware:
+    '''
+    Middleware ASGI : profil des requêtes demandées (en-tête) ou tirées au sort, en-tête Server-Timing.
+    Pour une page rendue en flux, l'en-tête couvre le temps jusqu'au premier octet ; le journal couvre toute la requête.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.PROFILING_ENABLED or not _sampled(scope):
+            return await self.app(scope, receive, send)
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = current.set(profile)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", profile.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current.reset(token)
+            profile.report(status)
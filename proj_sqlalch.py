@@ -1,24 +1,20 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
 from models import Base, User, Book, Emprunt
-import os
+import config
 
 
+def create_tables(url: str = None) -> None:
+    '''
+    Création des tables (sans effet sur les tables existantes)
+    :param url: URL de la base, SQLALCHEMY_DATABASE_URL par défaut
+    '''
+    engine = create_engine(url or config.SQLALCHEMY_DATABASE_URL)
+    try:
+        Base.metadata.create_all(engine)
+    finally:
+        engine.dispose()
 
-load_dotenv()  # take environment variables from .env (do not overver already defined vars)
 
-# Connexion à la base de données
-SQLALCHEMY_DATABASE_URL=os.getenv("SQLALCHEMY_DATABASE_URL")
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-
-
-# Création de la table
-Base.metadata.create_all(engine)
-
-# Gestion des sessions
-Session = sessionmaker(bind=engine)
-session = Session()
-
-session.commit()
\ No newline at end of file
+# Script seulement : importer ce module ne touche pas à la base
+if __name__ == "__main__":
+    create_tables()
@@ -0,0 +1,90 @@
+'''
+Rendu des templates en flux : la page est envoyée par morceaux pendant son rendu (Template.generate_async)
+au lieu d'être rendue en une seule chaîne avant le premier octet.
+
+Les pages du catalogue reçoivent une crud_async.LazyBookPage : les livres sont lus quand la boucle
+du template les parcourt, l'en-tête de la page part donc avant la requête en base.
+'''
+import asyncio
+from typing import AsyncIterator, Optional
+from starlette.responses import StreamingResponse
+from starlette.templating import Jinja2Templates
+import config, profiling
+
+# Fin du rendu, dans la file entre le rendu et l'envoi
+_END = object()
+
+class Templates(Jinja2Templates):
+    '''
+    Jinja2Templates dont le rendu est compté dans le profil de la requête (section "template")
+    '''
+
+    def TemplateResponse(self, *args, **kwargs):
+        with profiling.section("template"):
+            return super().TemplateResponse(*args, **kwargs)
+
+class StreamingTemplates:
+    '''
+    Même appel que Jinja2Templates.TemplateResponse(name, context), réponse envoyée en flux
+    '''
+
+    def __init__(self, templates: Jinja2Templates, chunk_bytes: Optional[int] = None, queue_size: int = 256):
+        # Environnement asyncio qui partage le chargeur, les filtres et les globales (url_for) de templates.
+        # Cache propre : les templates compilés pour le rendu synchrone ne peuvent pas être rendus en asyncio.
+        self.env = templates.env.overlay(enable_async=True, cache_size=400)
+        self.chunk_bytes = chunk_bytes or config.TEMPLATE_STREAM_CHUNK_BYTES
+        self.queue_size = queue_size
+
+    def TemplateResponse(self, name: str, context: dict, status_code: int = 200, headers: Optional[dict] = None) -> StreamingResponse:
+        '''
+        :param name: nom du template
+        :param context: contexte du template (doit contenir request)
+        :return: StreamingResponse text/html
+        '''
+        template = self.env.get_template(name)
+        return StreamingResponse(self.render(template, context), status_code=status_code, headers=headers, media_type="text/html")
+
+    async def render(self, template, context: dict) -> AsyncIterator[bytes]:
+        '''
+        Rend le template dans une tâche et envoie le texte produit par morceaux :
+        dès que chunk_bytes sont prêts, ou quand le rendu attend la base (rien de nouveau après un tour de boucle)
+        '''
+        queue = asyncio.Queue(self.queue_size)
+
+        async def produce():
+            try:
+                with profiling.section("template"):
+                    async for piece in template.generate_async(context):
+                        # L'attente de l'envoi au client n'est pas du rendu
+                        with profiling.section(None):
+                            await queue.put(piece)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(_END)
+
+        task = asyncio.create_task(produce())
+        buffer, size = [], 0
+        try:
+            while True:
+                if buffer and queue.empty():
+                    # Laisse le rendu avancer ; s'il n'a toujours rien produit, il attend la base
+                    await asyncio.sleep(0)
+                    if queue.empty():
+                        yield "".join(buffer).encode()
+                        buffer, size = [], 0
+                piece = await queue.get()
+                if piece is _END:
+                    break
+                if isinstance(piece, Exception):
+                    raise piece
+                buffer.append(piece)
+                size += len(piece)
+                if size >= self.chunk_bytes:
+                    yield "".join(buffer).encode()
+                    buffer, size = [], 0
+            if buffer:
+                yield "".join(buffer).encode()
+        finally:
+            # Client déconnecté ou erreur : le rendu (et sa lecture en base) s'arrête
+            task.cancel()
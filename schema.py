@@ -1,18 +1,9 @@
+from enum import Enum
 from pydantic import BaseModel, PositiveInt, EmailStr, constr, ValidationError
 from datetime import date
-from typing import Optional, List
+from typing import Optional, List, Dict, Union
 from fastapi import Form
 
-
-from passlib.context import CryptContext
-
-# Configuration pour le hachage des mots de passe avec bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Fonction pour hacher le mot de passe
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
 # Schéma de base pour les utilisateurs
 class User(BaseModel):
     name: str
@@ -36,10 +27,6 @@ class UserLogin(BaseModel):
 class UserCreate(User):
     password: constr(min_length=6)
 
-    @classmethod
-    def create_user(cls, name: str, email: EmailStr, phone: Optional[str], password: str) -> 'UserCreate':
-        hashed_password = hash_password(password)  # Hachage du mot de passe avant de le stocker
-        return cls(name=name, email=email, phone=phone, password=hashed_password)
 # Schéma pour retourner un utilisateur (incluant l'ID)
 class UserCreated(User):
     id: int
@@ -66,6 +53,21 @@ class BookCreated(Book):
     class Config:
         from_attributes = True
 
+# Nombre de résultats pour une valeur de facette (genre, auteur, disponibilité)
+class FacetCount(BaseModel):
+    value: Union[bool, str]
+    count: int
+
+# Schéma pour une page de livres (pagination par curseur)
+class BookPage(BaseModel):
+    books: List[BookCreated]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    sort: str = "id"
+    limit: int
+    # Recherche avec l'index : résultats par facette (kind, author, availability)
+    facets: Optional[Dict[str, List[FacetCount]]] = None
+
 # Schéma de base pour les emprunts
 class Emprunt(BaseModel):
     borrow_date: date
@@ -80,6 +82,7 @@ class EmpruntCreate(Emprunt):
 # Schéma pour retourner un emprunt (incluant l'ID et les relations)
 class EmpruntCreated(Emprunt):
     id: int
+    status: str = "active"
     user: UserCreated
     book: BookCreated
 
@@ -117,3 +120,35 @@ class EmpruntCreated(Emprunt):
     #EmpruntOut(id=5, user=users[2], book=books[4], borrow_date=datetime.now() - timedelta(days=2), return_date=datetime.now() + timedelta(days=12), returned=False),
     #EmpruntOut(id=6, user=users[2], book=books[5], borrow_date=datetime.now() - timedelta(days=6), return_date=datetime.now() + timedelta(days=8), returned=False),
 #]
+
+# Issue d'une demande d'emprunt ou de retour
+class BorrowStatus(str, Enum):
+    borrowed = "borrowed"
+    already_borrowed = "already_borrowed"
+    limit_reached = "limit_reached"
+    not_found = "not_found"
+    returned = "returned"
+    not_borrowed = "not_borrowed"
+
+# Schéma du résultat d'un emprunt
+class BorrowResult(BaseModel):
+    status: BorrowStatus
+    user_id: Optional[int] = None
+    book_id: Optional[int] = None
+    emprunt_id: Optional[int] = None
+
+# Erreur sur une ligne d'un import de livres
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+# Schéma du bilan (et de l'avancement) d'un import de livres
+class ImportReport(BaseModel):
+    rows: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    done: bool = False
+    errors: List[ImportRowError] = []
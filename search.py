@@ -0,0 +1,375 @@
+import heapq, re, threading, unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Champs indexés et leur poids dans le score de pertinence
+FIELDS = ("title", "author", "kind")
+FIELD_WEIGHTS = {"title": 3, "author": 2, "kind": 1}
+
+# Tris possibles sur les résultats de l'index
+SORTS = ("relevance", "id", "title", "author", "publication_date")
+
+# Facettes comptées sur les résultats (genre et auteur normalisés, disponibilité)
+FACETS = ("kind", "author", "availability")
+
+# Tris dont l'ordre de tout le catalogue est entretenu (tableau d'ids) ; le tri par pertinence sans terme suit l'ordre des ids
+ORDERED_SORTS = ("id", "title", "author", "publication_date")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def normalize(text: Optional[str]) -> str:
+    '''
+    Normalise un texte pour la recherche : minuscules, sans accents ni ponctuation
+    :param text: texte brut ("L'Étranger")
+    :return: texte normalisé ("l etranger")
+    '''
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    # Texte ASCII : aucun accent à retirer
+    stripped = decomposed if decomposed.isascii() else "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_NON_ALNUM.sub(" ", stripped).split())
+
+def trigrams(text: str, padded: bool = False) -> set:
+    '''
+    Découpe un texte normalisé en trigrammes
+    :param text: texte normalisé
+    :param padded: ajoute un espace en début et fin (indexation des documents)
+    :return: ensemble de trigrammes
+    '''
+    if padded:
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _match_score(term: str, value: str) -> int:
+    '''
+    Qualité d'une correspondance : valeur exacte > début de valeur > début de mot > sous-chaîne
+    '''
+    if value == term:
+        return 4
+    if value.startswith(term):
+        return 3
+    if f" {term}" in value:
+        return 2
+    return 1
+
+class SearchIndex:
+    '''
+    Index inversé de trigrammes sur le titre, l'auteur et le genre des livres.
+    Les textes sont normalisés (casse, accents) : "etranger" trouve "L'Étranger".
+    L'index est construit depuis la base au premier usage puis tenu à jour par crud.
+
+    Les listes de trigrammes sont des tableaux d'ids triés (array('I'), 4 octets par id) : intersection par
+    recherche dichotomique quand un côté est court. Pour chaque tri hors pertinence, l'ordre de tout le
+    catalogue est entretenu : une page se lit à partir du curseur au lieu de trier tous les résultats.
+
+    Les facettes sont des listes d'ids par valeur (genre, auteur, disponible ou non), tenues à jour
+    avec l'index : filtrer est une intersection d'ensembles, compter se fait sur les seuls résultats.
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._init()
+        self.ready = False
+
+    def _init(self):
+        self._docs = {}
+        self._postings = {field: {} for field in FIELDS}
+        # Tri -> ids de tout le catalogue dans l'ordre de leur clé de tri
+        self._orders = {sort: array("I") for sort in ORDERED_SORTS}
+        self._facets = {facet: {} for facet in FACETS}
+        # (facette, valeur normalisée) -> libellé affiché ; id -> valeurs de facettes du livre
+        self._labels = {}
+        self._doc_facets = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def build(self, loader: Callable[[], Iterable]) -> None:
+        '''
+        Construit l'index (une seule fois) à partir des lignes (id, title, author, kind, publication_date, availability)
+        :param loader: fonction retournant les lignes à indexer
+        '''
+        with self._lock:
+            if self.ready:
+                return
+            # Ids regroupés par valeur (auteurs et genres se répètent) : trigrammes découpés une fois par valeur,
+            # listes remplies en vrac puis triées une fois
+            by_value = {field: defaultdict(list) for field in FIELDS}
+            for row in loader():
+                book_id, values = self._add_doc(*row)
+                for field, value in zip(FIELDS, values):
+                    by_value[field][value].append(book_id)
+            for field, groups in by_value.items():
+                postings = defaultdict(list)
+                for value, ids in groups.items():
+                    for gram in trigrams(value, padded=True):
+                        postings[gram].extend(ids)
+                self._postings[field] = {gram: array("I", sorted(ids)) for gram, ids in postings.items()}
+            for sort in ORDERED_SORTS:
+                self._orders[sort] = array("I", sorted(self._docs, key=self._order_key(sort)))
+            self.ready = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._init()
+            self.ready = False
+
+    def add(self, book_id: int, title: str, author: str, kind: str, publication_date=None, availability=None) -> None:
+        '''
+        Ajoute ou remplace un livre dans l'index (sans effet tant que l'index n'est pas construit)
+        '''
+        with self._lock:
+            if not self.ready:
+                return
+            self._remove(book_id)
+            self._add(book_id, title, author, kind, publication_date, availability)
+
+    def set_availability(self, book_id: int, available: bool) -> None:
+        '''
+        Déplace un livre emprunté ou rendu dans la facette de disponibilité
+        '''
+        with self._lock:
+            values = self._doc_facets.get(book_id)
+            if values is None or values[2] == bool(available):
+                return
+            # Seule la facette de disponibilité change : genre et auteur gardent leurs listes et leurs libellés
+            ids = self._facets["availability"].get(values[2])
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self._facets["availability"][values[2]]
+            self._facets["availability"].setdefault(bool(available), set()).add(book_id)
+            self._labels.setdefault(("availability", bool(available)), bool(available))
+            self._doc_facets[book_id] = (values[0], values[1], bool(available))
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            if self.ready:
+                self._remove(book_id)
+
+    def _add_doc(self, book_id, title, author, kind, publication_date=None, availability=None) -> tuple:
+        # Document et facettes d'un livre ; listes de trigrammes et ordres de tri à la charge de l'appelant
+        values = (normalize(title), normalize(author), normalize(kind))
+        self._docs[book_id] = values + (publication_date.toordinal() if publication_date else 0,)
+        # Un livre sans disponibilité connue est compté disponible (valeur par défaut de la colonne)
+        facets = (values[2], values[1], bool(availability) if availability is not None else True)
+        self._index_facets(book_id, facets, {"kind": kind, "author": author})
+        return book_id, values
+
+    def _add(self, book_id, title, author, kind, publication_date=None, availability=None):
+        book_id, values = self._add_doc(book_id, title, author, kind, publication_date, availability)
+        for field, value in zip(FIELDS, values):
+            postings = self._postings[field]
+            for gram in trigrams(value, padded=True):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = array("I", (book_id,))
+                elif not ids or ids[-1] < book_id:
+                    ids.append(book_id)
+                else:
+                    insort(ids, book_id)
+        for sort, order in self._orders.items():
+            insort(order, book_id, key=self._order_key(sort))
+
+    def _index_facets(self, book_id, values: tuple, labels: dict):
+        self._doc_facets[book_id] = values
+        for facet, value in zip(FACETS, values):
+            self._facets[facet].setdefault(value, set()).add(book_id)
+            self._labels.setdefault((facet, value), labels.get(facet) or value)
+
+    def _unindex_facets(self, book_id, values: tuple):
+        for facet, value in zip(FACETS, values):
+            ids = self._facets[facet].get(value)
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self._facets[facet][value]
+                    self._labels.pop((facet, value), None)
+
+    def _remove(self, book_id):
+        values = self._docs.get(book_id)
+        if values is None:
+            return
+        # Position dans chaque ordre cherchée avec la clé du livre, avant de l'oublier
+        for sort, order in self._orders.items():
+            key = self._order_key(sort)
+            position = bisect_left(order, key(book_id), key=key)
+            if position < len(order) and order[position] == book_id:
+                del order[position]
+        del self._docs[book_id]
+        self._unindex_facets(book_id, self._doc_facets.pop(book_id))
+        for field, value in zip(FIELDS, values):
+            postings = self._postings[field]
+            for gram in trigrams(value, padded=True):
+                ids = postings.get(gram)
+                if ids is not None:
+                    position = bisect_left(ids, book_id)
+                    if position < len(ids) and ids[position] == book_id:
+                        del ids[position]
+                    if not ids:
+                        del postings[gram]
+
+    def _candidates(self, field: str, term: str, candidates: Optional[set]) -> set:
+        '''
+        Livres dont le champ contient le terme : intersection des listes de trigrammes
+        (de la plus courte à la plus longue) puis vérification de la sous-chaîne.
+        '''
+        position = FIELDS.index(field)
+        grams = trigrams(term)
+        if grams:
+            postings = self._postings[field]
+            lists = sorted((postings.get(gram, ()) for gram in grams), key=len)
+            found = set(lists[0]) if candidates is None else candidates.intersection(lists[0])
+            for ids in lists[1:]:
+                if not found:
+                    break
+                if len(found) * 16 < len(ids):
+                    # Peu d'ids restants : recherche dichotomique dans la longue liste triée
+                    found = {book_id for book_id in found if _contains(ids, book_id)}
+                else:
+                    found.intersection_update(ids)
+        else:
+            # Terme trop court pour les trigrammes : parcours des candidats
+            found = candidates if candidates is not None else self._docs.keys()
+        return {book_id for book_id in found if term in self._docs[book_id][position]}
+
+    def search(self, title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+               sort: str = "relevance", filters: Optional[dict] = None) -> List[Tuple[tuple, int]]:
+        '''
+        Recherche les livres correspondant à tous les critères renseignés (tous les résultats, triés)
+        :param sort: relevance, id, title, author ou publication_date
+        :param filters: valeurs de facettes imposées, ex. {"kind": "roman", "availability": True}
+        :return: liste triée de (clé de tri, id du livre)
+        '''
+        terms = _terms(title, author, kind, sort)
+        with self._lock:
+            candidates = self._match(terms, filters)
+            if candidates is None:
+                candidates = self._docs.keys()
+            return sorted((self._sort_key(book_id, terms, sort), book_id) for book_id in candidates)
+
+    def search_page(self, title: Optional[str] = None, author: Optional[str] = None, kind: Optional[str] = None,
+                    sort: str = "relevance", filters: Optional[dict] = None, after: Optional[tuple] = None,
+                    before: Optional[tuple] = None, limit: int = 20, facet_limit: Optional[int] = 20) -> tuple:
+        '''
+        Page de résultats au-delà d'un curseur et nombre de résultats par valeur de facette.
+        Seuls limit + 1 résultats sont classés : lus dans l'ordre entretenu du tri à partir du curseur,
+        ou gardés par un tas borné parmi les résultats (pertinence, recherche sélective).
+        :param after: clé de tri du dernier résultat vu (page suivante)
+        :param before: clé de tri du premier résultat vu (page précédente)
+        :param facet_limit: valeurs gardées par facette (les plus fréquentes) ; None : pas de comptage
+        :return: tuple (page [(clé de tri, id du livre)], il existe une page au-delà dans le sens de lecture,
+                 {facette: [(libellé, nombre)]} ou None) ; TypeError si le curseur n'est pas une clé de ce tri
+        '''
+        terms = _terms(title, author, kind, sort)
+        backward = before is not None
+        cursor = tuple(before) if backward else (tuple(after) if after is not None else None)
+        count = limit + 1
+
+        with self._lock:
+            candidates = self._match(terms, filters)
+            counts = self._facet_counts(candidates, facet_limit) if facet_limit is not None else None
+            key = lambda book_id: self._sort_key(book_id, terms, sort)
+            # Sans terme, la pertinence (score nul partout) suit l'ordre des ids
+            order = self._orders.get("id" if sort == "relevance" and not terms else sort)
+            if order is not None and (candidates is None or len(candidates) ** 2 >= count * len(self._docs)):
+                # Résultats assez nombreux : quelques pas dans l'ordre entretenu suffisent
+                if backward:
+                    start = len(order) - bisect_left(order, cursor, key=key)
+                    ids = islice(reversed(order), start, None)
+                else:
+                    ids = islice(order, bisect_right(order, cursor, key=key) if cursor is not None else 0, None)
+                if candidates is not None:
+                    ids = filter(candidates.__contains__, ids)
+                found = [(key(book_id), book_id) for book_id in islice(ids, count)]
+            else:
+                if candidates is None:
+                    candidates = self._docs.keys()
+                entries = ((key(book_id), book_id) for book_id in candidates)
+                if backward:
+                    found = heapq.nlargest(count, (entry for entry in entries if entry[0] < cursor))
+                elif cursor is not None:
+                    found = heapq.nsmallest(count, (entry for entry in entries if entry[0] > cursor))
+                else:
+                    found = heapq.nsmallest(count, entries)
+
+        page = found[:limit]
+        if backward:
+            page.reverse()
+        return page, len(found) > limit, counts
+
+    def _match(self, terms: list, filters: Optional[dict]) -> Optional[set]:
+        # Ids des livres correspondant aux filtres et à tous les termes (None : tout le catalogue)
+        candidates = self._filtered(filters or {})
+        for field, term in terms:
+            if candidates is not None and not candidates:
+                break
+            candidates = self._candidates(field, term, candidates)
+        return candidates
+
+    def _filtered(self, filters: dict) -> Optional[set]:
+        # Intersection des listes des facettes imposées (None : aucun filtre) ; une liste seule est rendue telle quelle
+        candidates = None
+        for facet, value in filters.items():
+            if value is None:
+                continue
+            key = bool(value) if facet == "availability" else normalize(value)
+            ids = self._facets[facet].get(key, set())
+            candidates = ids if candidates is None else candidates & ids
+        return candidates
+
+    def _facet_counts(self, candidates: Optional[set], limit: int) -> dict:
+        '''
+        Comptes par valeur de facette : tailles des listes entretenues si tout le catalogue correspond,
+        sinon intersection avec chaque liste quand la facette a moins de valeurs que de résultats,
+        ou un passage sur les résultats
+        '''
+        counts = {}
+        for position, facet in enumerate(FACETS):
+            if candidates is None:
+                values = {value: len(ids) for value, ids in self._facets[facet].items()}
+            elif len(self._facets[facet]) < len(candidates):
+                values = {value: len(candidates & ids) for value, ids in self._facets[facet].items()}
+            else:
+                values = {}
+                for book_id in candidates:
+                    value = self._doc_facets[book_id][position]
+                    values[value] = values.get(value, 0) + 1
+            top = heapq.nsmallest(limit, ((-count, str(value), value) for value, count in values.items() if count))
+            counts[facet] = [(self._labels.get((facet, value), value), -count) for count, _, value in top]
+        return counts
+
+    def _sort_key(self, book_id: int, terms: list, sort: str) -> tuple:
+        doc = self._docs[book_id]
+        if sort == "relevance":
+            score = sum(FIELD_WEIGHTS[field] * _match_score(term, doc[FIELDS.index(field)]) for field, term in terms)
+            return (-score, book_id)
+        if sort == "id":
+            return (book_id,)
+        if sort == "publication_date":
+            return (doc[3], book_id)
+        return (doc[FIELDS.index(sort)], book_id)
+
+    def _order_key(self, sort: str) -> Callable[[int], tuple]:
+        # Clé de tri d'un id dans l'ordre entretenu du tri
+        return lambda book_id: self._sort_key(book_id, (), sort)
+
+def _terms(title: Optional[str], author: Optional[str], kind: Optional[str], sort: str) -> list:
+    '''
+    Termes normalisés renseignés, les plus longs (les plus sélectifs) en premier ; ValueError si le tri est inconnu
+    '''
+    if sort not in SORTS:
+        raise ValueError(f"Tri inconnu : {sort}")
+    terms = [(field, normalize(value)) for field, value in zip(FIELDS, (title, author, kind))]
+    terms = [(field, term) for field, term in terms if term]
+    terms.sort(key=lambda item: -len(item[1]))
+    return terms
+
+def _contains(ids: array, book_id: int) -> bool:
+    # Appartenance à une liste d'ids triée
+    position = bisect_left(ids, book_id)
+    return position < len(ids) and ids[position] == book_id
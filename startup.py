@@ -0,0 +1,102 @@
+'''
+Démarrage de l'application (lifespan de main.create_app) : les engines sont créés et les fichiers statiques
+construits (empreintes, variantes compressées), puis, si STARTUP_PREWARM,
+les pools de connexions sont remplis, les templates compilés, les index en mémoire construits et les processus
+de hachage démarrés, en parallèle, avant que le serveur n'accepte des requêtes.
+
+Chaque étape est chronométrée : durées journalisées, exposées dans /metrics (app_startup_seconds) et /stats.
+Une étape de préchauffage en échec est journalisée sans arrêter le démarrage (elle sera faite au premier usage) ;
+une URL de base de données invalide arrête le démarrage, comme une table change_log absente en mode multi-workers.
+'''
+import asyncio, inspect, logging, time
+from contextlib import contextmanager
+from typing import Dict
+import changes, config, crud, crud_async, database, hashing, metrics
+
+logger = logging.getLogger(__name__)
+
+# Étape -> durée du dernier démarrage (secondes)
+timings: Dict[str, float] = {}
+
+def record(step: str, seconds: float) -> None:
+    timings[step] = seconds
+    metrics.startup_seconds.values[(step,)] = seconds
+
+@contextmanager
+def timed(step: str):
+    '''
+    Bloc chronométré comme une étape du démarrage
+    '''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(step, time.perf_counter() - started)
+
+def compile_templates(*environments) -> int:
+    '''
+    Charge et compile chaque template dans le cache des environnements Jinja (rendu synchrone et en flux)
+    :return: templates compilés
+    '''
+    count = 0
+    for env in environments:
+        for name in env.list_templates(extensions=("html",)):
+            env.get_template(name)
+            count += 1
+    return count
+
+async def _prewarm(step: str, func, *args) -> None:
+    # Étape de préchauffage : coroutine dans la boucle, fonction bloquante dans un thread
+    with timed(step):
+        try:
+            if inspect.iscoroutinefunction(func):
+                await func(*args)
+            else:
+                await asyncio.to_thread(func, *args)
+        except Exception:
+            logger.exception("Démarrage : étape %s en échec, faite au premier usage", step)
+
+async def warm_up(*environments, assets=None) -> Dict[str, float]:
+    '''
+    Étapes du démarrage, avant la première requête
+    :param environments: environnements Jinja dont les templates sont compilés
+    :param assets: static_assets.StaticAssets à construire
+    :return: durée de chaque étape et total (secondes)
+    '''
+    started = time.perf_counter()
+    with timed("engines"):
+        engine = crud.get_engine()
+        async_engine = crud_async.get_async_engine()
+    if assets is not None:
+        # Indispensable aux pages (static_url) : une erreur arrête le démarrage
+        with timed("static"):
+            await asyncio.to_thread(assets.build, config.STATIC_PRECOMPRESS)
+    if config.CHANGE_LOG_ENABLED:
+        # Position dans le journal des modifications prise avant la construction des index : rien n'est manqué
+        with timed("change_log"):
+            await asyncio.to_thread(changes.feed.prime)
+
+    if config.STARTUP_PREWARM:
+        steps = [
+            _prewarm("pool", database.prewarm_pool, engine, config.DB_POOL_PREWARM),
+            _prewarm("async_pool", database.prewarm_async_pool, async_engine, config.DB_POOL_PREWARM),
+            _prewarm("templates", compile_templates, *environments),
+            _prewarm("autocomplete", crud._load_autocomplete),
+            _prewarm("hashing", hashing.pool.warm_up),
+        ]
+        if config.SEARCH_INDEX_ENABLED:
+            steps.append(_prewarm("search_index", crud._load_search_index))
+        await asyncio.gather(*steps)
+
+    record("total", time.perf_counter() - started)
+    logger.info("Démarrage en %.0f ms (%s)", timings["total"] * 1000,
+                ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items() if step != "total"))
+    return dict(timings)
+
+async def shutdown() -> None:
+    '''
+    Ferme le pool de hachage et les connexions des engines
+    '''
+    hashing.pool.shutdown()
+    crud.dispose_engine()
+    await crud_async.dispose_engine()
@@ -0,0 +1,28 @@
+// Suggestions de titres et d'auteurs pendant la saisie (route /autocomplete, index en mémoire)
+document.querySelectorAll('input[data-autocomplete]').forEach(input => {
+    const list = document.getElementById(input.getAttribute('list'));
+    let pending = null;
+
+    input.addEventListener('input', () => {
+        const q = input.value.trim();
+        // Annule la requête de la frappe précédente
+        if (pending) {
+            pending.abort();
+        }
+        if (!q) {
+            list.replaceChildren();
+            return;
+        }
+        pending = new AbortController();
+        fetch(`/autocomplete?field=${input.dataset.autocomplete}&q=${encodeURIComponent(q)}`, {signal: pending.signal})
+        .then(response => response.ok ? response.json() : [])
+        .then(suggestions => {
+            list.replaceChildren(...suggestions.map(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.value;
+                return option;
+            }));
+        })
+        .catch(() => {});  // Requête annulée par une frappe suivante
+    });
+});
@@ -1,15 +1,16 @@
-function deleteBook(bookId) {
+function deleteBook(bookId, form) {
     if (confirm('Êtes-vous sûr de vouloir supprimer ce livre ?')) {
         fetch(`/delete_book/${bookId}`, {
             method: 'DELETE',
         })
         .then(response => {
             if (response.ok) {
-                window.location.reload();  // Recharger la page après la suppression
+                // Retirer le livre de la liste, sans recharger toute la page
+                form.closest('.book-item').remove();
             } else {
                 alert('Erreur lors de la suppression du livre');
             }
         });
     }
     return false;  // Empêche le rechargement de la page
-}
\ No newline at end of file
+}
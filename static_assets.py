@@ -0,0 +1,173 @@
+'''
+Fichiers statiques empreintés et précompressés.
+
+Au démarrage (startup.warm_up), StaticAssets.build copie chaque fichier de static/ dans le répertoire de build sous un nom qui contient
+l'empreinte de son contenu (css/index.css -> css/index.3f2a9c1b7d.css), avec ses variantes gzip et brotli
+(si le module brotli est installé). Les templates obtiennent l'URL empreintée par static_url('css/index.css') :
+le contenu d'une URL ne change jamais, elle est servie avec Cache-Control: immutable.
+PrecompressedStaticFiles sert la variante compressée acceptée par le navigateur (Accept-Encoding).
+'''
+import gzip, hashlib, mimetypes, os, tempfile
+from typing import Dict, Optional, Set
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+import config
+
+# brotli est dans requirements.txt ; sans le paquet, seules les variantes gzip sont écrites
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Types de fichiers compressés (les images et polices le sont déjà)
+COMPRESSIBLE = (".css", ".js", ".html", ".svg", ".json", ".txt", ".map")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Fichiers appelés par leur nom d'origine : toujours revalidés (ETag de StaticFiles)
+REVALIDATE = "no-cache"
+
+def _encoders() -> Dict[str, tuple]:
+    # Content-Encoding -> (extension, fonction de compression), par ordre de préférence
+    encoders = {}
+    if brotli is not None:
+        encoders["br"] = (".br", lambda data: brotli.compress(data, quality=11))
+    encoders["gzip"] = (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+    return encoders
+
+def _write(path: str, data: bytes, replace: bool = False) -> None:
+    # Écriture atomique (plusieurs workers peuvent construire en même temps), ignorée si le fichier existe
+    if not replace and os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def fingerprint(name: str, data: bytes) -> str:
+    '''
+    :return: nom empreinté (css/index.css -> css/index.<10 caractères hexadécimaux>.css)
+    '''
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+class StaticAssets:
+    '''
+    Manifeste des fichiers statiques construits : nom d'origine -> nom empreinté, et variantes compressées
+    '''
+
+    def __init__(self, source: str, build_dir: str, prefix: str = "/static"):
+        self.source = source
+        self.build_dir = build_dir
+        self.prefix = prefix.rstrip("/")
+        self.manifest: Dict[str, str] = {}
+        # Noms empreintés (servis avec Cache-Control: immutable)
+        self.hashed: Set[str] = set()
+        # Nom servi -> {Content-Encoding: nom de la variante}
+        self.variants: Dict[str, Dict[str, str]] = {}
+
+    def build(self, precompress: bool = True) -> "StaticAssets":
+        '''
+        Copie les fichiers sous leur nom d'origine et leur nom empreinté, et écrit leurs variantes compressées
+        (un fichier empreinté et ses variantes déjà construits ne sont ni réécrits ni recompressés)
+        :param precompress: écrit les variantes gzip / brotli des fichiers texte
+        :return: self
+        '''
+        encoders = _encoders() if precompress else {}
+        for directory, _, files in os.walk(self.source):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.source).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                hashed = fingerprint(name, data)
+                # Le nom d'origine est recopié à chaque démarrage (son contenu peut changer), le nom empreinté jamais
+                _write(os.path.join(self.build_dir, name), data, replace=True)
+                _write(os.path.join(self.build_dir, hashed), data)
+                self.manifest[name] = hashed
+                self.hashed.add(hashed)
+
+                if not name.endswith(COMPRESSIBLE):
+                    continue
+                for encoding, (extension, compress) in encoders.items():
+                    variant = os.path.join(self.build_dir, hashed + extension)
+                    # Même empreinte, même variante : construite à un démarrage précédent
+                    if not os.path.exists(variant):
+                        compressed = compress(data)
+                        # Variante inutile si elle n'est pas plus petite
+                        if len(compressed) >= len(data):
+                            continue
+                        _write(variant, compressed)
+                    self.variants.setdefault(hashed, {})[encoding] = hashed + extension
+        return self
+
+    def url(self, name: str) -> str:
+        '''
+        Helper Jinja static_url : URL empreintée d'un fichier de static/ (nom d'origine si inconnu)
+        :param name: chemin relatif à static/, ex. css/index.css
+        '''
+        return f"{self.prefix}/{self.manifest.get(name, name)}"
+
+    def stats(self) -> dict:
+        return {"files": len(self.manifest), "precompressed": len(self.variants), "brotli": brotli is not None}
+
+def _accepted(accept_encoding: str) -> set:
+    # Codages acceptés par le navigateur (q=0 : refusé)
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class PrecompressedStaticFiles(StaticFiles):
+    '''
+    StaticFiles servant le répertoire de build : variante br ou gzip selon Accept-Encoding,
+    Cache-Control: immutable sur les noms empreintés. Le répertoire est construit au démarrage, après le montage.
+    '''
+
+    def __init__(self, assets: StaticAssets, **kwargs):
+        super().__init__(directory=assets.build_dir, check_dir=False, **kwargs)
+        self.assets = assets
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        name = os.path.relpath(full_path, self.assets.build_dir).replace(os.sep, "/")
+        immutable = name in self.assets.hashed
+        headers = {"Cache-Control": IMMUTABLE if immutable else REVALIDATE}
+
+        variants = self.assets.variants.get(name)
+        if variants:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = _accepted(request_headers.get("accept-encoding", ""))
+            for encoding, variant in variants.items():
+                if encoding in accepted:
+                    headers["Content-Encoding"] = encoding
+                    variant_path = os.path.join(self.assets.build_dir, variant)
+                    # Type du fichier d'origine ; ETag et taille de la variante
+                    response = FileResponse(variant_path, status_code=status_code, stat_result=os.stat(variant_path),
+                                            headers=headers, media_type=mimetypes.guess_type(name)[0] or "text/plain")
+                    break
+            else:
+                response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+def assets(source: Optional[str] = None, build_dir: Optional[str] = None) -> StaticAssets:
+    '''
+    Fichiers statiques de l'application, construits par startup.warm_up (aucune écriture ici)
+    :return: StaticAssets à monter avec PrecompressedStaticFiles et à exposer aux templates (static_url)
+    '''
+    return StaticAssets(source or "static", build_dir or config.STATIC_BUILD_DIR)
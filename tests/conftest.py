@@ -0,0 +1,91 @@
+'''
+Fixtures communes : base SQLite temporaire créée par les migrations Alembic (schéma et index de production),
+compteur de requêtes SQL (database.count_queries) sur l'engine de crud.
+'''
+import asyncio, os, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules de l'application à la racine du dépôt
+sys.path.insert(0, ROOT)
+
+import config, crud, crud_async, database
+
+def migrate(url: str) -> None:
+    '''
+    alembic upgrade head sur la base donnée
+    '''
+    from alembic import command
+    from alembic.config import Config
+    alembic_config = Config(os.path.join(ROOT, "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    previous = os.environ.get("SQLALCHEMY_DATABASE_URL")
+    # alembic/env.py lit l'URL dans l'environnement
+    os.environ["SQLALCHEMY_DATABASE_URL"] = url
+    try:
+        command.upgrade(alembic_config, "head")
+    finally:
+        if previous is None:
+            os.environ.pop("SQLALCHEMY_DATABASE_URL")
+        else:
+            os.environ["SQLALCHEMY_DATABASE_URL"] = previous
+
+def _reset_engines() -> None:
+    crud.dispose_engine()
+    asyncio.run(crud_async.dispose_engine())
+
+@pytest.fixture
+def migrated_db(tmp_path, monkeypatch):
+    '''
+    Base SQLite vide au schéma de alembic upgrade head, utilisée par crud et crud_async pendant le test.
+    Cache du catalogue désactivé : chaque appel crud atteint la base.
+    :return: URL de la base
+    '''
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    migrate(url)
+    _reset_engines()
+    monkeypatch.setattr(config, "SQLALCHEMY_DATABASE_URL", url)
+    monkeypatch.setattr(config, "SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    monkeypatch.setattr(config, "CATALOG_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", False)
+    crud.reset_caches()
+    crud.own_changes.clear()
+    yield url
+    _reset_engines()
+
+@pytest.fixture
+def count_queries(migrated_db):
+    '''
+    database.count_queries sur l'engine de crud :
+    with count_queries(expected=1) as queries: crud.get_emprunts_by_user(1)
+    '''
+    return lambda expected=None: database.count_queries(crud.engine, expected)
+
+@pytest.fixture
+def client(migrated_db, tmp_path, monkeypatch):
+    '''
+    Client HTTP de l'application (lifespan compris) sur la base de migrated_db, sans préchauffage,
+    scanner des retards ni processus de hachage
+    '''
+    from fastapi.testclient import TestClient
+    import main
+    for name, value in {"STARTUP_PREWARM": False, "OVERDUE_SCAN_ENABLED": False, "PASSWORD_HASH_WORKERS": 0,
+                        "STATIC_BUILD_DIR": str(tmp_path / "static"), "STATIC_PRECOMPRESS": False}.items():
+        monkeypatch.setattr(config, name, value)
+    with TestClient(main.create_app()) as client:
+        yield client
+
+@pytest.fixture
+def login(migrated_db):
+    '''
+    Crée un utilisateur et retourne ses cookies : client.get(url, cookies=login("alice"))
+    '''
+    import auth, models
+
+    def login(name: str) -> dict:
+        with crud.Session() as session:
+            if crud.connexion(name, session) is None:
+                session.add(models.User(name=name, email=f"{name}@example.com", password="-"))
+                session.commit()
+        return {"access_token": auth.create_access_token({"sub": name})}
+    return login
@@ -0,0 +1,28 @@
+'''
+Modification d'un livre : 404 pour un ID inconnu, sans avertissement de l'API Query.get
+'''
+import warnings
+from datetime import date
+from sqlalchemy.exc import LegacyAPIWarning
+import crud, schema
+
+def test_get_book_by_id(migrated_db):
+    book = crud.create_book(schema.BookCreate(title="Livre", author="Auteur", kind="roman", publication_date=date(2000, 1, 1)))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", LegacyAPIWarning)
+        assert crud.get_book_by_id(book.id).title == "Livre"
+        assert crud.get_book_by_id(book.id + 1) is None
+
+def test_unknown_book_404(client):
+    assert client.get("/modifier_livre/999").status_code == 404
+    response = client.put("/update_book/999", json={"title": "Titre", "author": "Auteur", "kind": "roman",
+                                                    "publication_date": "2000-01-01"})
+    assert response.status_code == 404
+
+def test_update_book(client):
+    book = crud.create_book(schema.BookCreate(title="Livre", author="Auteur", kind="roman", publication_date=date(2000, 1, 1)))
+    assert client.get(f"/modifier_livre/{book.id}").status_code == 200
+    response = client.put(f"/update_book/{book.id}", json={"title": "Nouveau titre", "author": "Auteur", "kind": "roman",
+                                                           "publication_date": "2001-02-03"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert crud.get_book_by_id(book.id).title == "Nouveau titre"
@@ -0,0 +1,30 @@
+'''
+Emprunts concurrents (crud synchrone dans des threads, crud_async) : aucun livre prêté deux fois,
+aucun utilisateur au-delà de MAX_ACTIVE_LOANS, disponibilité des livres cohérente avec les emprunts en cours
+'''
+import asyncio
+from argparse import Namespace
+import anyio
+import pytest
+import config, crud, crud_async
+from benchmarks import borrow_concurrency
+
+# Peu d'utilisateurs pour beaucoup de livres : la limite d'emprunts est atteinte
+ARGS = Namespace(books=60, users=4, attempts=400, concurrency=50)
+
+async def _borrow(mode: str) -> dict:
+    borrow = crud_async.borrow_book if mode == "async" else lambda *a: anyio.to_thread.run_sync(crud.borrow_book, *a)
+    try:
+        return await borrow_concurrency.run(borrow, ARGS)
+    finally:
+        await crud_async.dispose_engine()
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_concurrent_borrows(migrated_db, mode):
+    result = asyncio.run(_borrow(mode))
+    assert result["problems"] == []
+    statuses = result["statuses"]
+    assert set(statuses) <= {"borrowed", "already_borrowed", "limit_reached"}, statuses
+    assert statuses.get("limit_reached", 0) > 0
+    assert statuses.get("already_borrowed", 0) > 0
+    assert statuses["borrowed"] <= ARGS.users * config.MAX_ACTIVE_LOANS
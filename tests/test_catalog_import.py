@@ -0,0 +1,32 @@
+'''
+Import en masse : un fichier illisible (encodage, CSV mal formé) termine le flux par un bilan final avec l'erreur
+'''
+import io, json
+import catalog_import, crud
+
+VALID = "title,author,kind,publication_date\nLivre 1,Auteur,roman,2000-01-01\nLivre 2,Auteur,roman,2000-01-01\n"
+
+def test_invalid_utf8_reported(migrated_db):
+    reports = list(catalog_import.import_batches(io.BytesIO(VALID.encode() + b"Livre \xff\xfe,Auteur,roman,2000-01-01\n"), "csv"))
+    final = reports[-1]
+    assert final.done
+    assert final.errors and "UTF-8" in final.errors[-1].error
+    assert final.errors[-1].line == 4
+    # Lignes lues avant l'erreur importées
+    assert final.inserted == 2 == len(crud.search_book())
+
+def test_invalid_utf8_after_committed_batches(migrated_db):
+    rows = "".join(f"Livre {i},Auteur,roman,2000-01-01\n" for i in range(3000))
+    data = ("title,author,kind,publication_date\n" + rows).encode() + b"\xff\xfe\n"
+    final = list(catalog_import.import_batches(io.BytesIO(data), "csv", batch_size=500))[-1]
+    assert final.done
+    assert final.inserted == 3000
+    assert final.errors[-1].line == final.rows + 2
+
+def test_upload_stream_ends_with_report(client, login):
+    files = {"file": ("livres.csv", VALID.encode() + b"\xff\xfe\n", "text/csv")}
+    response = client.post("/import_books", files=files, cookies=login("alice"))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["done"] is True
+    assert "UTF-8" in lines[-1]["errors"][-1]["error"]
@@ -0,0 +1,42 @@
+'''
+Journal des modifications : un worker saute ses propres lignes et sa version (ETag) rejoint celle des autres une fois relue
+'''
+from datetime import date
+from sqlalchemy import insert
+import pytest
+import changes, config, crud, models, schema
+
+@pytest.fixture
+def feed(migrated_db, monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", True)
+    feed = changes.ChangeFeed(interval=1.0, retention=3600)
+    feed.prime()
+    return feed
+
+def _create_book(title: str) -> schema.BookCreated:
+    return crud.create_book(schema.BookCreate(title=title, author="Auteur", kind="roman", publication_date=date(2000, 1, 1)))
+
+def test_own_changes_skipped(feed):
+    version = crud.catalog_version
+    book = _create_book("Livre local")
+    seq = max(crud.own_changes)
+    # Modification locale pas encore relue : version propre à ce worker
+    assert feed.version() == f"0+{seq}"
+    assert feed.poll() == 0
+    assert feed.skipped == 1
+    assert crud.catalog_version == version + 1
+    assert feed.version() == str(seq)
+    assert not crud.own_changes
+    assert crud.get_book_by_id(book.id).title == "Livre local"
+
+def test_other_worker_changes_applied(feed):
+    book = _create_book("Livre distant")
+    feed.poll()
+    # Ligne écrite par un autre worker : relue et appliquée
+    with crud.Session() as session:
+        session.execute(insert(models.ChangeLog), [{"entity": models.CHANGE_BOOK, "entity_id": book.id}])
+        session.commit()
+    version = crud.catalog_version
+    assert feed.poll() == 1
+    assert crud.catalog_version == version + 1
+    assert feed.version() == "2"
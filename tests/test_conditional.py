@@ -0,0 +1,67 @@
+'''
+Requêtes conditionnelles (conditional.ConditionalPagesMiddleware) : 304 sur un ETag inchangé, nouvel ETag
+après une modification du catalogue, ETag propre à chaque utilisateur sur les pages personnelles
+'''
+from datetime import date
+from email.utils import formatdate
+import time
+import crud, schema
+
+def _create_book(title: str) -> schema.BookCreated:
+    return crud.create_book(schema.BookCreate(title=title, author="Auteur", kind="roman", publication_date=date(2000, 1, 1)))
+
+def _get(client, path: str, cookies: dict = None, **headers):
+    client.cookies.clear()
+    for name, value in (cookies or {}).items():
+        client.cookies.set(name, value)
+    return client.get(path, headers=headers)
+
+def test_not_modified(client):
+    _create_book("Livre")
+    response = _get(client, "/")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public")
+    response = _get(client, "/", **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+def test_new_etag_after_change(client):
+    book = _create_book("Livre")
+    etag = _get(client, "/").headers["etag"]
+    _create_book("Autre livre")
+    response = _get(client, "/", **{"If-None-Match": etag})
+    assert response.status_code == 200
+    created = response.headers["etag"]
+    assert created != etag
+    crud.update_book(book.id, "Nouveau titre", "Auteur", "roman", date(2000, 1, 1))
+    response = _get(client, "/", **{"If-None-Match": created})
+    assert response.status_code == 200
+    assert response.headers["etag"] not in (etag, created)
+
+def test_personal_etag_per_user(client, login):
+    alice, bob = login("alice"), login("bob")
+    response = _get(client, "/user/alice", alice)
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private")
+    assert response.headers["vary"] == "Cookie"
+    other = _get(client, "/user/alice", bob)
+    assert other.status_code == 200
+    assert other.headers["etag"] != response.headers["etag"]
+    # L'ETag d'un utilisateur ne vaut pas 304 pour un autre
+    assert _get(client, "/user/alice", bob, **{"If-None-Match": response.headers["etag"]}).status_code == 200
+    assert _get(client, "/user/alice", alice, **{"If-None-Match": response.headers["etag"]}).status_code == 304
+
+def test_personal_without_user_passes_through(client, login):
+    etag = _get(client, "/user/alice", login("alice")).headers["etag"]
+    for cookies in (None, {"access_token": "invalide"}):
+        response = _get(client, "/user/alice", cookies, **{"If-None-Match": etag})
+        assert response.status_code == 401
+        assert "etag" not in response.headers
+
+def test_if_modified_since_public_only(client, login):
+    later = formatdate(time.time() + 3600, usegmt=True)
+    assert _get(client, "/", **{"If-Modified-Since": later}).status_code == 304
+    # La date ne distingue pas les utilisateurs : jamais de 304 sur une page personnelle
+    assert _get(client, "/user/alice", login("alice"), **{"If-Modified-Since": later}).status_code == 200
@@ -0,0 +1,40 @@
+'''
+Export : utilisateurs et emprunts limités au compte connecté, sauf pour les administrateurs de l'export
+'''
+import json
+from datetime import date, timedelta
+import pytest
+import config, crud, models
+
+@pytest.fixture
+def accounts(client, login):
+    cookies = {name: login(name) for name in ("alice", "bob", "root")}
+    with crud.Session() as session:
+        session.add(models.Book(title="Livre", author="Auteur", kind="roman", publication_date=date(2000, 1, 1), availability=1))
+        session.flush()
+        for name in ("alice", "bob"):
+            user = crud.connexion(name, session)
+            session.add(models.Emprunt(user_id=user.id, book_id=1, borrow_date=date.today(),
+                                       return_date=date.today() + timedelta(days=7), returned=1))
+        session.commit()
+    return cookies
+
+def _export(client, cookies, entity) -> list:
+    response = client.get(f"/export/{entity}?format=ndjson", cookies=cookies)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_users_export_limited_to_own_account(client, accounts):
+    assert [user["name"] for user in _export(client, accounts["alice"], "users")] == ["alice"]
+
+def test_loans_export_limited_to_own_loans(client, accounts):
+    alice = crud.connexion("alice")
+    assert [loan["user_id"] for loan in _export(client, accounts["alice"], "emprunts")] == [alice.id]
+
+def test_export_admin_sees_all_accounts(client, accounts, monkeypatch):
+    monkeypatch.setattr(config, "EXPORT_ADMINS", {"root"})
+    assert {user["name"] for user in _export(client, accounts["root"], "users")} == {"alice", "bob", "root"}
+    assert len(_export(client, accounts["root"], "emprunts")) == 2
+
+def test_books_export_unrestricted(client, accounts):
+    assert len(_export(client, accounts["bob"], "books")) == 1
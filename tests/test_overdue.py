@@ -0,0 +1,48 @@
+'''
+Scanner des retards en mode multi-workers : seul le détenteur du bail 'overdue' marque les emprunts
+'''
+from datetime import date, datetime, timedelta
+import pytest
+import config, crud, models, overdue
+
+@pytest.fixture
+def late_loan(migrated_db, monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_LOG_ENABLED", True)
+    with crud.Session() as session:
+        user = models.User(name="lecteur", email="lecteur@example.com", password="-")
+        book = models.Book(title="Livre", author="Auteur", kind="roman", publication_date=date(2000, 1, 1))
+        session.add_all([user, book])
+        session.flush()
+        session.add(models.Emprunt(user_id=user.id, book_id=book.id, return_date=date.today() - timedelta(days=1)))
+        session.commit()
+
+def _scanner(holder: str) -> overdue.OverdueScanner:
+    scanner = overdue.OverdueScanner(batch_size=100, interval=300)
+    scanner._holder = holder
+    return scanner
+
+def test_one_holder(late_loan):
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "a:1", 60)
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "a:1", 60)
+    assert not overdue.acquire_lease(overdue.LEASE_NAME, "b:2", 60)
+
+def test_expired_or_released_lease_taken_over(late_loan):
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "a:1", 60)
+    with crud.Session() as session:
+        session.get(models.Lease, overdue.LEASE_NAME).expires_at = datetime.now() - timedelta(seconds=1)
+        session.commit()
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "b:2", 60)
+    overdue.release_lease(overdue.LEASE_NAME, "b:2")
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "a:1", 60)
+
+def test_only_leader_marks(late_loan):
+    leader, follower = _scanner("a:1"), _scanner("b:2")
+    assert overdue.acquire_lease(overdue.LEASE_NAME, "a:1", 60)
+    assert follower.scan() == 0
+    assert not follower.leader and follower.skipped == 1
+    assert follower.counts == {}
+    assert leader.scan() == 1
+    assert leader.stats()["leader"]
+    # Les totaux relus par les autres workers incluent les emprunts marqués par le détenteur
+    follower.scan()
+    assert sum(follower.counts.values()) == 1
@@ -0,0 +1,51 @@
+'''
+Nombre de requêtes SQL des fonctions crud : le même pour un utilisateur avec un emprunt et avec beaucoup
+(pas de chargement paresseux N+1)
+'''
+from datetime import date, timedelta
+import pytest
+import crud, models
+
+LOANS = 25
+
+def seed(loans: int) -> None:
+    with crud.Session() as session:
+        session.add_all([models.User(name="few", email="few@example.com", password="-"),
+                         models.User(name="many", email="many@example.com", password="-")])
+        session.add_all(models.Book(title=f"Livre {i}", author="Auteur", kind="roman", publication_date=date(2000, 1, 1), availability=1)
+                        for i in range(loans + 1))
+        session.flush()
+        # Emprunts insérés directement : "many" en a beaucoup, en cours et retournés
+        session.add(models.Emprunt(user_id=1, book_id=1, borrow_date=date.today(), return_date=date.today() + timedelta(days=7), returned=0))
+        session.add_all(models.Emprunt(user_id=2, book_id=i + 2, borrow_date=date.today(), return_date=date.today() + timedelta(days=7), returned=i % 2)
+                        for i in range(loans))
+        session.commit()
+
+# Chaque scénario : (appel pour un utilisateur donné, nombre de requêtes attendu)
+SCENARIOS = {
+    "get_emprunts_by_user": (lambda user_id, name: crud.get_emprunts_by_user(user_id), 1),
+    "get_loan_by_user": (lambda user_id, name: crud.get_loan_by_user(user_id), 1),
+    "active_loans_count": (lambda user_id, name: crud.active_loans_count(user_id), 1),
+    "connexion": (lambda user_id, name: crud.connexion(name), 1),
+}
+
+@pytest.fixture
+def loans_db(migrated_db):
+    seed(LOANS)
+    return migrated_db
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_query_count_independent_of_loans(loans_db, count_queries, scenario):
+    call, expected = SCENARIOS[scenario]
+    counts = []
+    for user_id, username in ((1, "few"), (2, "many")):
+        with count_queries(expected) as queries:
+            call(user_id, username)
+        counts.append(queries.count)
+    assert counts[0] == counts[1], f"{scenario} : {counts[0]} requêtes pour 1 emprunt, {counts[1]} pour {LOANS}"
+
+def test_loans_loaded_with_books(loans_db, count_queries):
+    # Les livres des emprunts sont chargés avec eux : les lire n'ajoute pas de requête
+    with count_queries(1):
+        titles = [loan.book.title for loan in crud.get_emprunts_by_user(2)]
+    assert len(titles) == LOANS
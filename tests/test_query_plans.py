@@ -0,0 +1,73 @@
+'''
+Plans d'exécution des requêtes crud sur une base SQLite créée par les migrations Alembic : chaque requête
+des chemins chauds (connexion, inscription, emprunt, retour, emprunts d'un utilisateur) et du scanner
+des retards doit passer par un index, sans parcours complet de table.
+'''
+import re
+from datetime import date, timedelta
+import pytest
+import crud, models, overdue, schema
+
+# Parcours complet d'une table dans EXPLAIN QUERY PLAN (SQLite) : "SCAN users" sans "USING ... INDEX"
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?!.*\bUSING\b)")
+
+RETURN_DATE = date.today() + timedelta(days=7)
+
+def seed() -> None:
+    with crud.Session() as session:
+        session.add_all(models.User(name=f"user{i}", email=f"user{i}@example.com", password="-") for i in range(50))
+        session.add_all(models.Book(title=f"Livre {i}", author="Auteur", kind="roman", publication_date=date(2000, 1, 1), availability=1)
+                        for i in range(200))
+        session.flush()
+        # Un emprunt en retard, pour le scanner des retards
+        session.add(models.Emprunt(user_id=2, book_id=10, borrow_date=date.today() - timedelta(days=40),
+                                   return_date=date.today() - timedelta(days=1), returned=0))
+        session.commit()
+
+def _loan_ids():
+    with crud.Session() as session:
+        return session.execute(crud._loan_ids("user1", "Livre 3")).all()
+
+# Requêtes des chemins chauds, exécutées telles que les routes les appellent : (préparation, appel mesuré)
+SCENARIOS = {
+    "connexion": (None, lambda: crud.connexion("user1")),
+    "create_user": (None, lambda: crud.create_user(schema.UserCreate(name="user2", email="new@example.com", phone=None, password="Secret123!"))),
+    "get_book_by_title": (None, lambda: crud.get_book_by_title("Livre 3")),
+    "active_loans_count": (None, lambda: crud.active_loans_count(1)),
+    "borrow_book": (None, lambda: crud.borrow_book(1, 3, RETURN_DATE)),
+    "get_emprunts_by_user": (None, lambda: crud.get_emprunts_by_user(1)),
+    "return_book": (lambda: crud.borrow_book(1, 3, RETURN_DATE), lambda: crud.return_book(1, 3)),
+    "loan_ids": (lambda: crud.borrow_book(1, 3, RETURN_DATE), _loan_ids),
+    "overdue_scan": (None, lambda: overdue.OverdueScanner(batch_size=100, interval=0).scan()),
+}
+
+def explain(statement: str, parameters) -> list:
+    connection = crud.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+@pytest.fixture
+def plans_db(migrated_db):
+    seed()
+    return migrated_db
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_no_full_table_scan(plans_db, count_queries, scenario):
+    prepare, call = SCENARIOS[scenario]
+    if prepare is not None:
+        prepare()
+    with count_queries() as queries:
+        call()
+    checked = 0
+    for statement, parameters in zip(queries.statements, queries.parameters):
+        if parameters is None or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            continue
+        plan = explain(statement, parameters)
+        checked += 1
+        scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+        assert not scans, f"{scenario} : {', '.join(scans)}\n    {' '.join(statement.split())}\n    {' | '.join(plan)}"
+    assert checked, f"{scenario} : aucune requête exécutée"
@@ -0,0 +1,66 @@
+'''
+Pages de SearchIndex.search_page (ordre entretenu ou tas borné) identiques au tri complet de search,
+dans les deux sens de lecture, après ajouts, suppressions et changements de disponibilité
+'''
+import random
+from datetime import date
+import pytest
+import search
+
+WORDS = ["mer", "merle", "amer", "ciel", "été", "ete", "nuit", "roi", "a", "le"]
+
+def _row(rng, book_id):
+    return (book_id, " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))), f"Aut {rng.choice(WORDS)} {rng.randint(0, 30)}",
+            rng.choice(["roman", "essai", "bd"]), date(1900 + rng.randint(0, 50), 1, 1) if rng.random() < 0.9 else None,
+            rng.random() < 0.7)
+
+@pytest.fixture(scope="module")
+def index():
+    rng = random.Random(3)
+    index = search.SearchIndex()
+    index.build(lambda: [_row(rng, book_id) for book_id in range(1, 600)])
+    for book_id in rng.sample(range(1, 600), 60):
+        index.remove(book_id)
+    for book_id in rng.sample(range(1, 700), 60):
+        index.add(*_row(rng, book_id))
+    for book_id in rng.sample(range(1, 700), 60):
+        index.set_availability(book_id, rng.random() < 0.5)
+    return index
+
+def _pages(index, cursor_name, cursor, limit, query):
+    pages = []
+    while True:
+        page, more, _ = index.search_page(limit=limit, facet_limit=None, **{cursor_name: cursor}, **query)
+        pages.append(page)
+        if not more or not page:
+            return pages
+        cursor = page[-1][0] if cursor_name == "after" else page[0][0]
+
+@pytest.mark.parametrize("sort", search.SORTS)
+@pytest.mark.parametrize("title,author,filters", [
+    (None, None, None), ("mer", None, None), ("e", "aut", None), ("nuit roi", None, {"availability": False}),
+    (None, "3", {"kind": "roman"}), ("zzz", None, None), (None, None, {"kind": "essai", "availability": True}),
+])
+@pytest.mark.parametrize("limit", [3, 500])
+def test_pages_match_full_sort(index, sort, title, author, filters, limit):
+    query = {"title": title, "author": author, "sort": sort, "filters": filters}
+    expected = index.search(**query)
+    forward = _pages(index, "after", None, limit, query)
+    assert [entry for page in forward for entry in page] == expected
+    if expected:
+        backward = _pages(index, "before", forward[-1][0][0], limit, query)
+        assert [entry for page in reversed(backward) for entry in page] + forward[-1] == expected
+
+def test_facet_counts_on_results(index):
+    query = {"title": "mer", "filters": {"availability": True}}
+    expected = {book_id for _, book_id in index.search(**query)}
+    _, _, counts = index.search_page(limit=1, facet_limit=1000, **query)
+    kinds = {}
+    for book_id in expected:
+        kinds[index._doc_facets[book_id][0]] = kinds.get(index._doc_facets[book_id][0], 0) + 1
+    assert {label.lower(): count for label, count in counts["kind"]} == kinds
+    assert counts["availability"] == [(True, len(expected))]
+
+def test_invalid_cursor(index):
+    with pytest.raises(TypeError):
+        index.search_page(sort="id", after=("abc",))
@@ -0,0 +1,40 @@
+'''
+Fichiers statiques : construits au démarrage (pas à l'import de main), variantes compressées une seule fois
+'''
+import os, subprocess, sys
+from datetime import date
+import pytest
+import config, crud, schema, static_assets
+from conftest import ROOT
+
+def test_import_main_writes_nothing(tmp_path):
+    # Import depuis un autre répertoire : aucun build/static créé
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import main"], cwd=tmp_path, check=True,
+                   env=dict(os.environ, SQLALCHEMY_DATABASE_URL="sqlite://"))
+    assert not (tmp_path / "build").exists()
+
+def test_built_at_startup(client):
+    assert os.path.isdir(config.STATIC_BUILD_DIR)
+    name, hashed = next(iter(client.app.state.static_assets.manifest.items()))
+    response = client.get(f"/static/{hashed}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == static_assets.IMMUTABLE
+
+def test_variants_compressed_once(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(static_assets, "_encoders", lambda: {"gzip": (".gz", lambda data: calls.append(data) or b"x")})
+    source = os.path.join(ROOT, "static")
+    first = static_assets.StaticAssets(source, str(tmp_path)).build()
+    compressed = len(calls)
+    assert compressed and first.variants
+    second = static_assets.StaticAssets(source, str(tmp_path)).build()
+    assert len(calls) == compressed
+    assert second.variants == first.variants
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_search_sort_options_follow_config(client, monkeypatch, enabled):
+    crud.create_book(schema.BookCreate(title="Livre", author="Auteur", kind="roman", publication_date=date(2000, 1, 1)))
+    monkeypatch.setattr(config, "SEARCH_INDEX_ENABLED", enabled)
+    response = client.get("/search_books?title=livre")
+    assert response.status_code == 200
+    assert ("Pertinence" in response.text) == enabled